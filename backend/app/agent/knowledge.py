@@ -0,0 +1,263 @@
+"""Indexed knowledge store behind the MCP info tools.
+
+Project data lives in files under ``data/``:
+
+- ``repos.json``: the repository manifest (name, description, language,
+  topics and optional lookup ``aliases``),
+- ``projects/<name>.md``: the long-form description of one project,
+- ``resume.md``: the resume returned by ``get_resume``.
+
+The files are loaded into an immutable :class:`KnowledgeIndex` whose tool
+payloads are serialized once, so a tool call is a dict lookup. Project
+names resolve by exact name or alias, then by unique prefix, then by
+trigram similarity. The files are re-stat'ed at most every
+KNOWLEDGE_RECHECK_INTERVAL seconds and the index is rebuilt when any of
+them changed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from app.config import KNOWLEDGE_RECHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+_REPOS_PATH = _DATA_DIR / "repos.json"
+_PROJECTS_DIR = _DATA_DIR / "projects"
+_RESUME_PATH = _DATA_DIR / "resume.md"
+
+# Minimum Dice coefficient between trigram sets for a fuzzy name match.
+_MIN_SIMILARITY = 0.5
+_MAX_SUGGESTIONS = 5
+
+
+def compact_name(name: str) -> str:
+    """Lower-case ``name`` and drop separators: "TPU Training" -> "tputraining"."""
+    return re.sub(r"[^a-z0-9]+", "", name.lower())
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class LookupResult:
+    """Outcome of a project lookup: a name, or suggestions when unresolved."""
+
+    name: str | None
+    details: str | None = None
+    suggestions: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class KnowledgeIndex:
+    """An immutable snapshot of the knowledge files and their lookup index."""
+
+    repos: tuple[dict, ...]
+    repos_payload: str
+    resume_payload: str
+    details: dict[str, str]
+    # Comma-separated project names for "not found" replies.
+    available: str
+    signature: tuple
+    # Content hash, equal on every machine serving the same files.
+    version: str = ""
+    # Compact name or alias -> canonical project name.
+    aliases: dict[str, str] = field(default_factory=dict)
+    # Sorted compact aliases, for prefix lookup by bisection.
+    sorted_aliases: tuple[str, ...] = ()
+    # Trigram -> compact aliases containing it.
+    trigrams: dict[str, frozenset[str]] = field(default_factory=dict)
+    # Compact alias -> size of its trigram set.
+    gram_counts: dict[str, int] = field(default_factory=dict)
+
+    def lookup(self, query: str) -> LookupResult:
+        """Resolve ``query`` to a project name.
+
+        Tries an exact name or alias, then a prefix shared by a single
+        project, then the most similar name by trigrams. Ambiguous queries
+        return the candidates as suggestions instead of guessing.
+        """
+        key = compact_name(query)
+        if not key:
+            return LookupResult(None)
+
+        name = self.aliases.get(key)
+        if name is not None:
+            return LookupResult(name, self.details[name])
+
+        matches: set[str] = set()
+        i = bisect_left(self.sorted_aliases, key)
+        while i < len(self.sorted_aliases) and self.sorted_aliases[i].startswith(key):
+            matches.add(self.aliases[self.sorted_aliases[i]])
+            i += 1
+        if len(matches) == 1:
+            name = matches.pop()
+            return LookupResult(name, self.details[name])
+        if matches:
+            return LookupResult(None, suggestions=tuple(sorted(matches, key=str.lower)))
+
+        grams = _trigrams(key)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for alias in self.trigrams.get(gram, ()):
+                shared[alias] = shared.get(alias, 0) + 1
+        scores: dict[str, float] = {}
+        for alias, count in shared.items():
+            score = 2 * count / (len(grams) + self.gram_counts[alias])
+            name = self.aliases[alias]
+            scores[name] = max(score, scores.get(name, 0.0))
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        if ranked and ranked[0][1] >= _MIN_SIMILARITY:
+            if len(ranked) == 1 or ranked[1][1] < ranked[0][1]:
+                name = ranked[0][0]
+                return LookupResult(name, self.details[name])
+        suggestions = tuple(name for name, _ in ranked[:_MAX_SUGGESTIONS])
+        return LookupResult(None, suggestions=suggestions)
+
+
+_index: KnowledgeIndex | None = None
+_checked_at: float = 0.0
+_listeners: list[Callable[[KnowledgeIndex], None]] = []
+
+
+def _mtime_ns(path: Path) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _signature() -> tuple:
+    """Identify the current state of every knowledge file."""
+    try:
+        projects = sorted(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in os.scandir(_PROJECTS_DIR)
+            if entry.name.endswith(".md")
+        )
+    except OSError:
+        projects = []
+    return (_mtime_ns(_REPOS_PATH), _mtime_ns(_RESUME_PATH), tuple(projects))
+
+
+def _load_repos() -> list[dict]:
+    try:
+        repos = json.loads(_REPOS_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    except Exception:
+        logger.warning("Could not load %s", _REPOS_PATH, exc_info=True)
+        return []
+    return [repo for repo in repos if isinstance(repo, dict) and repo.get("name")]
+
+
+def _load_details() -> dict[str, str]:
+    """Read projects/*.md, keyed by file stem, without the leading heading."""
+    details: dict[str, str] = {}
+    for path in sorted(_PROJECTS_DIR.glob("*.md")):
+        try:
+            text = path.read_text(encoding="utf-8").strip()
+        except Exception:
+            logger.warning("Could not load %s", path, exc_info=True)
+            continue
+        if text.startswith("# "):
+            text = text.partition("\n")[2].strip()
+        details[path.stem] = text
+    return details
+
+
+def _build_index() -> KnowledgeIndex:
+    signature = _signature()
+    repos = _load_repos()
+    details = _load_details()
+
+    for repo in repos:
+        if repo["name"] not in details and repo.get("description"):
+            details[repo["name"]] = repo["description"]
+
+    aliases: dict[str, str] = {}
+    for name in details:
+        aliases[compact_name(name)] = name
+    for repo in repos:
+        if repo["name"] not in details:
+            continue
+        for alias in repo.get("aliases", ()):
+            aliases.setdefault(compact_name(alias), repo["name"])
+    aliases.pop("", None)
+
+    postings: dict[str, set[str]] = {}
+    gram_counts: dict[str, int] = {}
+    for alias in aliases:
+        grams = _trigrams(alias)
+        gram_counts[alias] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, set()).add(alias)
+
+    listing = [{k: v for k, v in repo.items() if k != "aliases"} for repo in repos]
+    try:
+        resume = _RESUME_PATH.read_text(encoding="utf-8").strip()
+    except OSError:
+        resume = ""
+    content = json.dumps([repos, sorted(details.items()), resume], sort_keys=True)
+
+    return KnowledgeIndex(
+        repos=tuple(listing),
+        repos_payload=json.dumps(listing, indent=2),
+        resume_payload=resume,
+        details=details,
+        available=", ".join(sorted(details, key=str.lower)),
+        signature=signature,
+        version=hashlib.sha256(content.encode("utf-8")).hexdigest()[:16],
+        aliases=aliases,
+        sorted_aliases=tuple(sorted(aliases)),
+        trigrams={gram: frozenset(names) for gram, names in postings.items()},
+        gram_counts=gram_counts,
+    )
+
+
+def add_reload_listener(callback: Callable[[KnowledgeIndex], None]) -> None:
+    """Register a callback invoked whenever the knowledge files change."""
+    _listeners.append(callback)
+
+
+def reload_knowledge() -> KnowledgeIndex:
+    """Rebuild the index now and notify listeners if the files changed."""
+    global _index, _checked_at
+    previous = _index
+    _index = _build_index()
+    _checked_at = time.monotonic()
+    if previous is not None and previous.signature != _index.signature:
+        logger.info("Knowledge store reloaded (%d projects)", len(_index.details))
+        for callback in _listeners:
+            try:
+                callback(_index)
+            except Exception:
+                logger.exception("Knowledge reload listener failed")
+    return _index
+
+
+def get_knowledge() -> KnowledgeIndex:
+    """Return the cached index, rebuilding it if a data file was modified.
+
+    The files are stat'ed at most once per KNOWLEDGE_RECHECK_INTERVAL seconds.
+    """
+    global _checked_at
+    if _index is None:
+        return reload_knowledge()
+    now = time.monotonic()
+    if now - _checked_at >= KNOWLEDGE_RECHECK_INTERVAL:
+        _checked_at = now
+        if _signature() != _index.signature:
+            return reload_knowledge()
+    return _index
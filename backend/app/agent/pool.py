@@ -0,0 +1,299 @@
+"""Warm pool of pre-connected ClaudeSDKClient workers.
+
+Connecting a ClaudeSDKClient spawns a CLI subprocess and hands it the MCP
+server, which dominates time-to-first-token on a small VM. The pool keeps a
+bounded number of clients connected ahead of time, refills itself in the
+background and recycles clients after a configurable number of uses or as
+soon as one fails.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient
+
+from app import tracing
+from app.agent.sdk_compat import client_process
+from app.agent.watchdog import watchdog
+from app.config import AGENT_DISCONNECT_TIMEOUT
+from app.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_CONNECT_SECONDS = Histogram(
+    "agent_connect_seconds", "Time spent in ClaudeSDKClient.connect()."
+)
+_DISCONNECT_SECONDS = Histogram(
+    "agent_disconnect_seconds", "Time spent in ClaudeSDKClient.disconnect()."
+)
+
+_REFILL_BACKOFF_INITIAL = 1.0
+_REFILL_BACKOFF_MAX = 30.0
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no client could be checked out of the pool in time."""
+
+
+@dataclass
+class PooledClient:
+    """A connected client together with its pool bookkeeping."""
+
+    client: ClaudeSDKClient
+    generation: int
+    uses: int = 0
+
+
+class ClientPool:
+    """Bounded pool of connected ClaudeSDKClient instances.
+
+    ``size`` caps the number of live clients owned by the pool (idle,
+    checked out or still connecting). A size of 0 disables pre-connecting:
+    every checkout connects a fresh client and every release disconnects it.
+    """
+
+    def __init__(
+        self,
+        options_factory: Callable[[], ClaudeAgentOptions],
+        size: int,
+        max_uses: int = 1,
+        acquire_timeout: float = 30.0,
+        max_waiters: int = 20,
+    ) -> None:
+        self._options_factory = options_factory
+        self._size = max(size, 0)
+        self._max_uses = max(max_uses, 1)
+        self._acquire_timeout = acquire_timeout
+        self._max_waiters = max_waiters
+
+        self._idle: asyncio.Queue[PooledClient] = asyncio.Queue()
+        self._live = 0
+        self._generation = 0
+        self._waiters = 0
+        self._refill_needed = asyncio.Event()
+        self._refill_task: asyncio.Task | None = None
+        self._background: set[asyncio.Task] = set()
+        self._closed = False
+        self._warm = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    @property
+    def saturated(self) -> bool:
+        """True when the checkout wait queue is already at its limit."""
+        return self._waiters >= self._max_waiters
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self._size,
+            "live": self._live,
+            "idle": self._idle.qsize(),
+            "waiters": self._waiters,
+        }
+
+    async def start(self) -> None:
+        """Start the background refill task; it fills the pool to ``size``."""
+        if not self.enabled or self._refill_task is not None:
+            return
+        self._closed = False
+        self._refill_needed.set()
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def close(self) -> None:
+        """Stop refilling and disconnect every idle client."""
+        self._closed = True
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        while not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            self._live -= 1
+            await disconnect_client(pooled.client)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def warm_up(self) -> None:
+        """Wait until a client has connected at least once.
+
+        Without a pool nothing connects ahead of time, so one client is
+        connected and dropped to check that the CLI starts (and to get its
+        files into the page cache).
+        """
+        if self.enabled:
+            await self._warm.wait()
+        elif not self._warm.is_set():
+            await disconnect_client(await self._connect())
+
+    async def acquire(self) -> PooledClient:
+        """Check a connected client out of the pool.
+
+        Raises PoolExhaustedError if the wait queue is full or no client
+        becomes available within the acquire timeout. Without a pool the
+        client is connected here, within the same timeout.
+        """
+        if not self.enabled:
+            return PooledClient(
+                client=await self._connect(), generation=self._generation
+            )
+
+        if self.saturated:
+            raise PoolExhaustedError("Too many requests waiting for an agent")
+
+        self._waiters += 1
+        try:
+            return await asyncio.wait_for(self._idle.get(), self._acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhaustedError("Timed out waiting for an agent") from None
+        finally:
+            self._waiters -= 1
+
+    def release(self, pooled: PooledClient, failed: bool = False) -> None:
+        """Return a client to the pool, or recycle it.
+
+        Clients are recycled when the run failed, when they reached
+        ``max_uses``, when they predate the last flush, or when the pool is
+        disabled or closing.
+        """
+        pooled.uses += 1
+        recycle = (
+            failed
+            or not self.enabled
+            or self._closed
+            or pooled.uses >= self._max_uses
+            or pooled.generation != self._generation
+        )
+        if not recycle:
+            self._idle.put_nowait(pooled)
+            return
+
+        if self.enabled:
+            self._live -= 1
+            self._refill_needed.set()
+        self._spawn(disconnect_client(pooled.client))
+
+    def flush(self) -> None:
+        """Recycle every client connected with outdated options.
+
+        Idle clients are disconnected right away and replaced; checked-out
+        clients are recycled when they are released.
+        """
+        self._generation += 1
+        while not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            self._live -= 1
+            self._spawn(disconnect_client(pooled.client))
+        self._refill_needed.set()
+
+    def detach(self, pooled: PooledClient) -> ClaudeSDKClient:
+        """Take ownership of a checked-out client away from the pool.
+
+        The pool stops counting the client and refills its slot; the caller
+        becomes responsible for disconnecting it.
+        """
+        if self.enabled:
+            self._live -= 1
+            self._refill_needed.set()
+        return pooled.client
+
+    async def _connect(self) -> ClaudeSDKClient:
+        client = ClaudeSDKClient(options=self._options_factory())
+        started = time.perf_counter()
+        # Tasks the client spawns while connecting inherit its trace slot.
+        tracing.bind_client(client)
+        watchdog.track(client)
+        try:
+            with tracing.span("agent.connect"):
+                await asyncio.wait_for(client.connect(), self._acquire_timeout)
+        except asyncio.TimeoutError:
+            # A CLI that hangs while starting would not disconnect either.
+            logger.warning("Agent client connect timed out, killing subprocess")
+            _kill(client_process(client))
+            await disconnect_client(client)
+            raise PoolExhaustedError("Timed out connecting an agent") from None
+        except BaseException:
+            await disconnect_client(client)
+            raise
+        _CONNECT_SECONDS.observe(time.perf_counter() - started)
+        self._warm.set()
+        return client
+
+    async def _refill_loop(self) -> None:
+        backoff = _REFILL_BACKOFF_INITIAL
+        while not self._closed:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            while not self._closed and self._live < self._size:
+                self._live += 1
+                generation = self._generation
+                try:
+                    client = await self._connect()
+                except asyncio.CancelledError:
+                    self._live -= 1
+                    raise
+                except Exception:
+                    self._live -= 1
+                    logger.warning(
+                        "Failed to pre-connect agent client, retrying in %.0fs",
+                        backoff,
+                        exc_info=True,
+                    )
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, _REFILL_BACKOFF_MAX)
+                    continue
+                backoff = _REFILL_BACKOFF_INITIAL
+                if generation != self._generation:
+                    # Flushed while connecting: options are already stale.
+                    self._live -= 1
+                    self._spawn(disconnect_client(client))
+                    continue
+                self._idle.put_nowait(
+                    PooledClient(client=client, generation=generation)
+                )
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+async def disconnect_client(client: ClaudeSDKClient) -> None:
+    """Disconnect a client, logging instead of raising on failure.
+
+    If disconnect() does not finish within AGENT_DISCONNECT_TIMEOUT seconds
+    the CLI subprocess is killed so a stuck run cannot linger. Either way
+    the watchdog makes sure the subprocess is gone shortly after.
+    """
+    process = client_process(client)
+    started = time.perf_counter()
+    failed = True
+    try:
+        with tracing.span("agent.disconnect"):
+            await asyncio.wait_for(client.disconnect(), AGENT_DISCONNECT_TIMEOUT)
+        failed = False
+    except asyncio.TimeoutError:
+        logger.warning("Agent client disconnect timed out, killing subprocess")
+        _kill(process)
+    except Exception:
+        logger.warning("Error disconnecting agent client", exc_info=True)
+    finally:
+        watchdog.release(client, failed=failed)
+    _DISCONNECT_SECONDS.observe(time.perf_counter() - started)
+
+
+def _kill(process) -> None:
+    """Kill a CLI subprocess if it is still running."""
+    if process is not None and process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,142 @@
+"""BM25 search over the resume and project documents.
+
+data/resume.md and data/projects/*.md are split into one chunk per
+markdown section and indexed into an in-memory inverted index. The
+``search_knowledge`` tool returns the top-scoring chunks, so the agent can
+pull in the few paragraphs a question needs instead of the whole resume.
+
+The index is rebuilt whenever the knowledge store reloads its files.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+
+from app.agent.knowledge import KnowledgeIndex, get_knowledge
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+
+# Words too common in these documents (or in questions) to rank by.
+_STOPWORDS = frozenset(
+    """
+    a an the is are was were be been do does did can could would will should
+    you your me i please tell show give about of for on in at to with by
+    from and or as it its this that these has have had any some what which
+    who how his him he dingkang wang
+    """.split()
+)
+
+# Standard BM25 parameters.
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case word tokens of ``text`` without stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """One markdown section: its heading path and full text."""
+
+    source: str
+    title: str
+    text: str
+
+
+def chunk_markdown(source: str, markdown: str) -> list[Chunk]:
+    """Split ``markdown`` at headings into chunks titled by their heading path."""
+    chunks: list[Chunk] = []
+    path: list[tuple[int, str]] = []
+    lines: list[str] = []
+
+    def flush() -> None:
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if body:
+            title = " > ".join(heading for _, heading in path) or source
+            chunks.append(Chunk(source, title, body))
+
+    for line in markdown.splitlines():
+        match = _HEADING_RE.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+        flush()
+        level = len(match.group(1))
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, match.group(2)))
+    flush()
+    return chunks
+
+
+class SearchIndex:
+    """Inverted index with BM25 scoring over a fixed list of chunks."""
+
+    def __init__(self, chunks: list[Chunk], signature: tuple = ()) -> None:
+        self.chunks = chunks
+        self.signature = signature
+        self._lengths: list[int] = []
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+
+        for doc_id, chunk in enumerate(chunks):
+            # The heading path is searchable too: "Tesla" should find the
+            # Tesla section even if the body never names the company.
+            tokens = tokenize(f"{chunk.title}\n{chunk.text}")
+            self._lengths.append(len(tokens))
+            counts: dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self._postings.setdefault(token, []).append((doc_id, tf))
+
+        n = len(chunks)
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 3) -> list[tuple[Chunk, float]]:
+        """Return up to ``top_k`` (chunk, score) pairs, best first."""
+        scores: dict[int, float] = {}
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for doc_id, tf in self._postings[token]:
+                norm = 1 - _B + _B * self._lengths[doc_id] / self._avg_length
+                score = idf * tf * (_K1 + 1) / (tf + _K1 * norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[: max(top_k, 0)]
+        return [(self.chunks[doc_id], score) for doc_id, score in ranked]
+
+
+_index: SearchIndex | None = None
+
+
+def _build(knowledge: KnowledgeIndex) -> SearchIndex:
+    chunks: list[Chunk] = []
+    if knowledge.resume_payload:
+        chunks.extend(chunk_markdown("resume", knowledge.resume_payload))
+    for name, details in knowledge.details.items():
+        chunks.extend(chunk_markdown(name, f"# {name}\n\n{details}"))
+    return SearchIndex(chunks, knowledge.signature)
+
+
+def get_search_index() -> SearchIndex:
+    """Return the search index, rebuilding it if the knowledge files changed."""
+    global _index
+    knowledge = get_knowledge()
+    if _index is None or _index.signature != knowledge.signature:
+        _index = _build(knowledge)
+    return _index
+
+
+def format_results(results: list[tuple[Chunk, float]]) -> str:
+    """Render search results as markdown sections for a tool reply."""
+    sections = (f"## {chunk.title}\n\n{chunk.text}" for chunk, _ in results)
+    return "\n\n---\n\n".join(sections)
@@ -0,0 +1,695 @@
+"""Single entry point for agent runs.
+
+:class:`AgentRunner` owns everything between "a message was admitted" and
+"the reply was relayed as SSE frames": admission control, the client
+lifecycle and the message loop. The client lifecycle is a pluggable
+strategy:
+
+- ``per_request``: connect a fresh client for every turn,
+- ``pooled``: one-shot turns on pre-connected pool clients,
+- ``session``: follow-up turns reuse the session's own client.
+
+Agent options are built once per prompt version and budget profile and
+shared by every client; the allowed tools are derived from the tools
+registered on the MCP server. A run is reported, charged and cached under
+the options its client was connected with, which can be older than the
+ones in force when the run was admitted.
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncContextManager, AsyncIterator, Callable
+
+from claude_agent_sdk import (
+    AssistantMessage,
+    ClaudeAgentOptions,
+    ResultMessage,
+    StreamEvent,
+    TextBlock,
+    ToolResultBlock,
+    ToolUseBlock,
+    UserMessage,
+)
+
+from app import tracing
+from app.logs import StderrBatcher
+from app.agent import knowledge
+from app.agent.pool import ClientPool, PooledClient, PoolExhaustedError
+from app.agent.sessions import SessionLease, SessionManager
+from app.agent.system_prompt import (
+    PromptSnapshot,
+    add_reload_listener,
+    get_prompt_snapshot,
+    get_prompt_version,
+    get_slim_prompt_snapshot,
+)
+from app.agent.tools import INFO_TOOLS, info_tools_server
+from app.config import (
+    AGENT_LIFECYCLE,
+    AGENT_MAX_CONCURRENT,
+    AGENT_POOL_ACQUIRE_TIMEOUT,
+    AGENT_POOL_MAX_USES,
+    AGENT_POOL_MAX_WAITERS,
+    AGENT_POOL_SIZE,
+    AGENT_QUEUE_MAX,
+    AGENT_QUEUE_TIMEOUT,
+    AGENT_RUN_TIMEOUT,
+    LOG_STDERR_MAX_LINES,
+    SESSION_IDLE_TTL,
+    SESSION_MAX,
+    SESSION_MIN_AVAILABLE_MB,
+    STREAM_FLUSH_CHARS,
+    STREAM_FLUSH_INTERVAL,
+    STREAM_PARTIAL,
+)
+from app.metrics import Counter, Histogram
+from app.services import sse
+from app.services.admission import AdmissionController, AdmissionRejectedError
+from app.services.budget import BudgetPolicy, RunProfile, billable_tokens, budget
+from app.services.cancellation import record_cancellation
+
+logger = logging.getLogger(__name__)
+
+_MCP_SERVER_KEY = "info"
+_DEADLINE_FRAME = sse.error("The response took too long and was stopped.")
+_USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+_FIRST_TEXT_SECONDS = Histogram(
+    "agent_first_text_seconds", "Time from query to the first TextBlock."
+)
+_STREAM_SECONDS = Histogram(
+    "agent_stream_seconds", "Time from query to the end of the agent response."
+)
+_AGENT_RUNS = Counter("agent_runs_total", "Agent runs by outcome.", ["outcome"])
+_TOOL_CALLS = Counter(
+    "agent_tool_calls_total", "Tool calls made by the agent.", ["tool"]
+)
+_COST_USD = Counter("agent_cost_usd_total", "Total cost reported by ResultMessage.")
+_TOKENS = Counter("agent_tokens_total", "Tokens reported by ResultMessage.", ["type"])
+_PROFILE_RUNS = Counter(
+    "agent_profile_runs_total",
+    "Agent runs by the budget profile their client was connected with.",
+    ["profile"],
+)
+_PROMPT_TOKENS = Histogram(
+    "agent_prompt_tokens",
+    "Approximate system prompt tokens sent with each agent run, by profile.",
+    ["profile"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+
+
+# ---------------------------------------------------------------------------
+# Options
+# ---------------------------------------------------------------------------
+
+ALLOWED_TOOLS: tuple[str, ...] = tuple(
+    f"mcp__{_MCP_SERVER_KEY}__{tool.name}" for tool in INFO_TOOLS
+)
+
+
+@dataclass(frozen=True)
+class OptionsVersion:
+    """What a set of agent options was built from."""
+
+    prompt_version: str
+    prompt_tokens: int
+    profile: RunProfile
+
+
+_options: ClaudeAgentOptions | None = None
+_options_version: OptionsVersion | None = None
+# Recently built options, to tell what a connected client was built with.
+# Older clients have been flushed from the pool by then.
+_built: deque[tuple[ClaudeAgentOptions, OptionsVersion]] = deque(maxlen=8)
+
+
+_log_stderr = StderrBatcher(logger, max_lines=LOG_STDERR_MAX_LINES)
+
+
+def _prompt_for(profile: RunProfile) -> PromptSnapshot:
+    if profile.slim_prompt:
+        return get_slim_prompt_snapshot()
+    return get_prompt_snapshot()
+
+
+def get_agent_options() -> ClaudeAgentOptions:
+    """Return the shared ClaudeAgentOptions for the current budget profile.
+
+    They are rebuilt when the prompt or the profile changes.
+    """
+    global _options, _options_version
+    profile = budget.profile
+    snapshot = _prompt_for(profile)
+    version = OptionsVersion(snapshot.version, snapshot.tokens, profile)
+    if _options is None or _options_version != version:
+        _options = ClaudeAgentOptions(
+            system_prompt=snapshot.text,
+            max_turns=profile.max_turns,
+            model=profile.model,
+            mcp_servers={_MCP_SERVER_KEY: info_tools_server},
+            allowed_tools=list(ALLOWED_TOOLS),
+            permission_mode="bypassPermissions",
+            include_partial_messages=STREAM_PARTIAL,
+            stderr=_log_stderr,
+        )
+        _options_version = version
+        _built.append((_options, version))
+    return _options
+
+
+def options_version(client: object) -> OptionsVersion | None:
+    """Return what ``client``'s options were built from, if known."""
+    options = getattr(client, "options", None)
+    for built, version in _built:
+        if built is options:
+            return version
+    return None
+
+
+def is_current(client: object) -> bool:
+    """True if ``client`` was connected with the options now in force."""
+    return getattr(client, "options", None) is get_agent_options()
+
+
+def is_cacheable(version: OptionsVersion) -> bool:
+    """True if answers from clients built with ``version`` may be cached.
+
+    That is the full profile on the current prompt; degraded answers would
+    otherwise be served in place of full ones once the pressure is gone.
+    """
+    current = _prompt_for(version.profile).version
+    return version.profile.level == 0 and version.prompt_version == current
+
+
+def answer_version() -> str:
+    """Identify what answers depend on: the prompt and the knowledge content.
+
+    Cached and precomputed answers are keyed on it.
+    """
+    return f"{get_prompt_version()}:{knowledge.get_knowledge().version}"
+
+
+# ---------------------------------------------------------------------------
+# Lifecycle strategies
+# ---------------------------------------------------------------------------
+
+
+class Lifecycle(ABC):
+    """How a turn gets a connected client and what happens to it afterwards."""
+
+    name: str
+
+    def __init__(self, pool: ClientPool) -> None:
+        self.pool = pool
+
+    @property
+    def saturated(self) -> bool:
+        return self.pool.saturated
+
+    @property
+    def session_count(self) -> int:
+        return 0
+
+    @property
+    def session_evictions(self) -> dict[str, int]:
+        """Sessions evicted so far, by reason (lru, idle, memory)."""
+        return {}
+
+    @property
+    def sticky(self) -> bool:
+        """True if turns should return to the worker that ran the last one."""
+        return False
+
+    def has_history(self, session_id: str) -> bool:
+        """True if turns for ``session_id`` continue an earlier conversation."""
+        return False
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        """Note a turn of ``session_id`` that was answered without the agent."""
+
+    async def start(self) -> None:
+        await self.pool.start()
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def warm_up(self) -> None:
+        await self.pool.warm_up()
+
+    @abstractmethod
+    def lease(self, session_id: str) -> AsyncContextManager[SessionLease]:
+        """Check out a connected client for one turn of ``session_id``."""
+
+
+class PooledLifecycle(Lifecycle):
+    """One-shot turns on pre-connected pool clients."""
+
+    name = "pooled"
+
+    @asynccontextmanager
+    async def lease(self, session_id: str) -> AsyncIterator[SessionLease]:
+        pooled: PooledClient = await self.pool.acquire()
+        lease = SessionLease(client=pooled.client, turns=0)
+        try:
+            yield lease
+        except BaseException:
+            lease.failed = True
+            raise
+        finally:
+            self.pool.release(pooled, failed=lease.failed)
+
+
+class PerRequestLifecycle(PooledLifecycle):
+    """One-shot turns on a client connected for the turn (a pool of size 0)."""
+
+    name = "per_request"
+
+
+class SessionLifecycle(Lifecycle):
+    """Each session keeps its client across turns (see SessionManager)."""
+
+    name = "session"
+
+    def __init__(self, pool: ClientPool, sessions: SessionManager) -> None:
+        super().__init__(pool)
+        self.sessions = sessions
+
+    @property
+    def session_count(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def session_evictions(self) -> dict[str, int]:
+        return dict(self.sessions.evictions)
+
+    @property
+    def sticky(self) -> bool:
+        return self.sessions.enabled
+
+    def has_history(self, session_id: str) -> bool:
+        return self.sessions.has_history(session_id)
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        self.sessions.record(session_id, message, answer)
+
+    async def start(self) -> None:
+        await super().start()
+        await self.sessions.start()
+
+    async def close(self) -> None:
+        await self.sessions.close()
+        await super().close()
+
+    def lease(self, session_id: str) -> AsyncContextManager[SessionLease]:
+        return self.sessions.checkout(session_id)
+
+
+def create_lifecycle(name: str) -> Lifecycle:
+    """Build the lifecycle strategy called ``name`` from the pool settings."""
+    pool_size = 0 if name == "per_request" else AGENT_POOL_SIZE
+    pool = ClientPool(
+        get_agent_options,
+        size=pool_size,
+        max_uses=AGENT_POOL_MAX_USES,
+        acquire_timeout=AGENT_POOL_ACQUIRE_TIMEOUT,
+        max_waiters=AGENT_POOL_MAX_WAITERS,
+    )
+    # Pre-connected clients were built with the old prompt or budget
+    # profile; replace them.
+    add_reload_listener(lambda _snapshot: pool.flush())
+    budget.add_listener(lambda _profile: pool.flush())
+
+    if name == "per_request":
+        return PerRequestLifecycle(pool)
+    if name == "pooled":
+        return PooledLifecycle(pool)
+    if name != "session":
+        logger.warning("Unknown AGENT_LIFECYCLE %r, using 'session'", name)
+    sessions = SessionManager(
+        pool,
+        max_sessions=SESSION_MAX,
+        idle_ttl=SESSION_IDLE_TTL,
+        min_available_mb=SESSION_MIN_AVAILABLE_MB,
+        current=is_current,
+    )
+    return SessionLifecycle(pool, sessions)
+
+
+# ---------------------------------------------------------------------------
+# Message loop
+# ---------------------------------------------------------------------------
+
+
+def _record_result(msg: ResultMessage) -> None:
+    if msg.total_cost_usd:
+        _COST_USD.inc(amount=msg.total_cost_usd)
+    usage = msg.usage or {}
+    for field in _USAGE_FIELDS:
+        value = usage.get(field)
+        if isinstance(value, (int, float)) and value:
+            _TOKENS.inc(field.removesuffix("_tokens"), amount=value)
+
+
+class _TextBuffer:
+    """Coalesces small text deltas into fewer, larger SSE frames."""
+
+    __slots__ = ("_parts", "_size", "_first_at", "_interval", "_max_chars")
+
+    def __init__(self, interval: float, max_chars: int) -> None:
+        self._parts: list[str] = []
+        self._size = 0
+        self._first_at = 0.0
+        self._interval = interval
+        self._max_chars = max_chars
+
+    def __bool__(self) -> bool:
+        return bool(self._parts)
+
+    def add(self, text: str) -> bool:
+        """Buffer ``text``; returns True once the buffer should be flushed."""
+        if not self._parts:
+            self._first_at = time.perf_counter()
+        self._parts.append(text)
+        self._size += len(text)
+        return self._size >= self._max_chars
+
+    def due_in(self, now: float) -> float | None:
+        """Seconds until the buffered text must be flushed, or None if empty."""
+        if not self._parts:
+            return None
+        return self._first_at + self._interval - now
+
+    def take(self) -> str:
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return text
+
+
+def _text_delta(msg: StreamEvent) -> str | None:
+    """Return the text of a top-level text_delta stream event."""
+    if msg.parent_tool_use_id is not None:
+        return None
+    event = msg.event
+    if event.get("type") != "content_block_delta":
+        return None
+    delta = event.get("delta") or {}
+    if delta.get("type") != "text_delta":
+        return None
+    return delta.get("text") or None
+
+
+def _with_history(message: str, history: list[tuple[str, str]]) -> str:
+    """Prefix ``message`` with earlier turns the client has not seen."""
+    if not history:
+        return message
+    turns = "\n\n".join(f"User: {q}\n\nAssistant: {a}" for q, a in history)
+    return (
+        "Earlier turns of this conversation:\n\n"
+        f"{turns}\n\nCurrent message:\n\n{message}"
+    )
+
+
+async def relay_response(
+    lease: SessionLease,
+    message: str,
+    on_result: Callable[[ResultMessage], None] | None = None,
+) -> AsyncIterator[bytes]:
+    """Send ``message`` on the leased client and relay the reply as SSE.
+
+    With STREAM_PARTIAL the CLI emits text deltas as the model produces
+    them; they are coalesced into ``text`` frames every
+    STREAM_FLUSH_INTERVAL seconds or STREAM_FLUSH_CHARS characters. The
+    complete TextBlocks that follow are then skipped, so each piece of text
+    is sent once.
+
+    The run is stopped (and the session dropped) once it exceeds
+    AGENT_RUN_TIMEOUT seconds, whatever the turn count. ``on_result`` is
+    called with the run's ResultMessage.
+    """
+    started = time.perf_counter()
+    deadline = started + AGENT_RUN_TIMEOUT
+    first_text = True
+    buffer = _TextBuffer(STREAM_FLUSH_INTERVAL, STREAM_FLUSH_CHARS)
+    streamed = False  # deltas were sent for the current assistant message
+    pending: asyncio.Future | None = None
+    run_span = tracing.current_span()
+    tool_calls: dict[str, tuple[str, int]] = {}  # tool_use_id -> (name, start)
+
+    def text_frame() -> bytes:
+        nonlocal first_text
+        if first_text:
+            first_text = False
+            _FIRST_TEXT_SECONDS.observe(time.perf_counter() - started)
+        return sse.text(buffer.take())
+
+    try:
+        with tracing.span("agent.query"):
+            await lease.client.query(_with_history(message, lease.history))
+        waiting_since = time.time_ns()
+
+        responses = lease.client.receive_response()
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(responses))
+            now = time.perf_counter()
+            timeout = deadline - now
+            flush_in = buffer.due_in(now)
+            if flush_in is not None:
+                timeout = min(timeout, flush_in)
+            done, _ = await asyncio.wait({pending}, timeout=max(timeout, 0))
+
+            if not done:
+                if buffer:
+                    yield text_frame()
+                if time.perf_counter() < deadline:
+                    continue
+                lease.failed = True
+                record_cancellation("deadline")
+                logger.warning("Agent run exceeded %gs, stopping", AGENT_RUN_TIMEOUT)
+                yield _DEADLINE_FRAME
+                break
+
+            try:
+                msg = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            if isinstance(msg, StreamEvent):
+                text = _text_delta(msg)
+                if text:
+                    streamed = True
+                    if buffer.add(text):
+                        yield text_frame()
+            elif isinstance(msg, AssistantMessage):
+                received = time.time_ns()
+                tools = []
+                for block in msg.content:
+                    if isinstance(block, TextBlock):
+                        if not streamed:
+                            buffer.add(block.text)
+                    elif isinstance(block, ToolUseBlock):
+                        _TOOL_CALLS.inc(block.name)
+                        tools.append(block.name)
+                        if run_span is not None:
+                            tool_calls[block.id] = (block.name, received)
+                if run_span is not None:
+                    tracing.record_span(
+                        "agent.message",
+                        waiting_since,
+                        received,
+                        model=msg.model,
+                        tools=",".join(tools),
+                    )
+                    waiting_since = received
+                streamed = False
+                if buffer:
+                    yield text_frame()
+            elif isinstance(msg, UserMessage) and tool_calls:
+                # Tool results, as seen by the CLI after it called the tool.
+                received = time.time_ns()
+                for block in msg.content if isinstance(msg.content, list) else ():
+                    if isinstance(block, ToolResultBlock):
+                        name, called = tool_calls.pop(block.tool_use_id, ("", 0))
+                        if called:
+                            tracing.record_span(
+                                "agent.tool_call",
+                                called,
+                                received,
+                                tool=name,
+                                is_error=bool(block.is_error),
+                            )
+                waiting_since = received
+            elif isinstance(msg, ResultMessage):
+                _record_result(msg)
+                if on_result is not None:
+                    on_result(msg)
+                if run_span is not None:
+                    run_span.set(
+                        num_turns=msg.num_turns,
+                        cost_usd=msg.total_cost_usd or 0.0,
+                        **{
+                            f"usage.{name}": (msg.usage or {}).get(name, 0)
+                            for name in _USAGE_FIELDS
+                        },
+                    )
+                if buffer:
+                    yield text_frame()
+                if msg.is_error:
+                    lease.failed = True
+                    yield sse.error(msg.result or "Unknown error")
+                break
+
+    except Exception as e:
+        lease.failed = True
+        logger.exception("Error in agent")
+        yield sse.error(str(e))
+
+    finally:
+        if pending is not None:
+            pending.cancel()
+        _STREAM_SECONDS.observe(time.perf_counter() - started)
+        _AGENT_RUNS.inc("error" if lease.failed else "ok")
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+class AgentRunner:
+    """Runs agent turns under admission control on a lifecycle strategy."""
+
+    def __init__(
+        self,
+        lifecycle: Lifecycle,
+        admission: AdmissionController,
+        budget: BudgetPolicy,
+    ) -> None:
+        self.lifecycle = lifecycle
+        self.admission = admission
+        self.budget = budget
+
+    @property
+    def busy(self) -> bool:
+        """True when a new run could neither start nor queue."""
+        return self.admission.full or self.lifecycle.saturated
+
+    def has_history(self, session_id: str) -> bool:
+        return self.lifecycle.has_history(session_id)
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        """Add a cached or templated answer to the session's history."""
+        self.lifecycle.record(session_id, message, answer)
+
+    async def start(self) -> None:
+        await self.lifecycle.start()
+
+    async def close(self) -> None:
+        await self.lifecycle.close()
+
+    async def warm_up(self) -> None:
+        """Wait until an agent client has connected once."""
+        await self.lifecycle.warm_up()
+
+    async def stream(
+        self,
+        message: str,
+        session_id: str,
+        client_key: str | None = None,
+        on_options: Callable[[OptionsVersion], None] | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Run one turn and yield its SSE frames, always ending with ``done``.
+
+        The run first waits for an admission slot, reporting its queue
+        position as ``queued`` events. Its token usage is charged to the
+        global budget and to ``client_key``'s. ``on_options`` is called with
+        what the leased client's options were built from, once it is known.
+        Clients use the explicit
+        connect()/disconnect() lifecycle (not async-with) following the
+        pattern from ai-oncall-bots, which avoids event-loop conflicts when
+        running inside uvicorn.
+        """
+        with tracing.span(
+            "agent.run", lifecycle=self.lifecycle.name, session_id=session_id
+        ) as run_span:
+            results: list[ResultMessage] = []
+            version: OptionsVersion | None = None
+            try:
+                await self.budget.refresh(self.admission.queue_fill)
+                ticket = self.admission.enqueue()
+                try:
+                    with tracing.span("agent.admission"):
+                        async for position in self.admission.wait(ticket):
+                            yield sse.queued(position)
+                    # Pick up a profile change that happened while queued.
+                    await self.budget.refresh(self.admission.queue_fill)
+
+                    leased_at = time.time_ns()
+                    async with self.lifecycle.lease(session_id) as lease:
+                        tracing.record_span(
+                            "agent.lease", leased_at, turn=lease.turns
+                        )
+                        version = options_version(lease.client)
+                        if version is not None:
+                            run_span.set(profile=version.profile.name)
+                            if on_options is not None:
+                                on_options(version)
+                        sent: list[bytes] = []
+                        with tracing.client_span(lease.client):
+                            async for frame in relay_response(
+                                lease, message, results.append
+                            ):
+                                sent.append(frame)
+                                yield frame
+                        if lease.failed:
+                            run_span.fail("agent run failed")
+                        elif self.lifecycle.sticky:
+                            answer = sse.text_content(sse.batch(sent))
+                            lease.exchange = (message, answer)
+                finally:
+                    self.admission.release(ticket)
+                if version is not None:
+                    _PROFILE_RUNS.inc(version.profile.name)
+                    _PROMPT_TOKENS.observe(
+                        version.prompt_tokens, version.profile.name
+                    )
+                for result in results:
+                    await self.budget.charge(
+                        client_key,
+                        billable_tokens(result.usage),
+                        result.total_cost_usd or 0.0,
+                    )
+
+            except Exception as e:
+                if isinstance(e, (AdmissionRejectedError, PoolExhaustedError)):
+                    logger.warning("Could not start agent run: %s", e)
+                else:
+                    logger.exception("Error connecting agent client")
+                run_span.fail(str(e))
+                yield sse.error(str(e))
+
+        yield sse.DONE
+
+
+def create_runner() -> AgentRunner:
+    """Build the runner described by the AGENT_* settings."""
+    admission = AdmissionController(
+        max_concurrent=AGENT_MAX_CONCURRENT,
+        max_queue=AGENT_QUEUE_MAX,
+        timeout=AGENT_QUEUE_TIMEOUT,
+    )
+    return AgentRunner(create_lifecycle(AGENT_LIFECYCLE), admission, budget)
@@ -0,0 +1,50 @@
+"""Access to ClaudeSDKClient internals the SDK does not expose.
+
+The SDK has no public handle on the CLI child process behind a client.
+Everything that needs it goes through here, so an SDK upgrade that moves
+the attributes only has to be followed in one place. :func:`check` is run
+at startup: without the handle, the pool cannot kill a CLI that hangs and
+the watchdog cannot tell which children belong to live clients.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def client_process(client: object):
+    """Return the CLI child process behind ``client``, if it is reachable."""
+    transport = getattr(client, "_transport", None)
+    return getattr(transport, "_process", None)
+
+
+def client_pid(client: object) -> int | None:
+    """Return the PID of the CLI child process behind ``client``, if known."""
+    return getattr(client_process(client), "pid", None)
+
+
+def check() -> bool:
+    """Return True if this SDK version keeps the attributes used above.
+
+    Logs an error otherwise. Neither object started here spawns anything.
+    """
+    try:
+        from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient
+        from claude_agent_sdk._internal.transport.subprocess_cli import (
+            SubprocessCLITransport,
+        )
+
+        options = ClaudeAgentOptions()
+        client = ClaudeSDKClient(options=options)
+        transport = SubprocessCLITransport(prompt="", options=options)
+        reachable = hasattr(client, "_transport") and hasattr(transport, "_process")
+    except Exception:
+        logger.debug("SDK compatibility check failed", exc_info=True)
+        reachable = False
+    if not reachable:
+        logger.error(
+            "Cannot reach the agent CLI subprocess with this claude-agent-sdk "
+            "version; hung clients will not be killed and the process "
+            "watchdog cannot match children to clients"
+        )
+    return reachable
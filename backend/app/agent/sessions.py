@@ -0,0 +1,352 @@
+"""Multi-turn chat sessions keyed by ChatRequest.session_id.
+
+Each session keeps its own connected ClaudeSDKClient, so follow-up turns
+continue the conversation the CLI already holds instead of paying for a
+fresh subprocess, system prompt and tool round trips. Sessions are evicted
+after an idle TTL, when the session cap is reached (least recently used
+first), or when the machine runs low on memory.
+
+Turns answered without the agent (cached, precomputed or templated) are
+kept apart from the sessions, in a bounded map of their own: they hold no
+client, so they neither count toward the cap nor push a live session out.
+
+A session whose client was connected with options that are no longer in
+force (the prompt or budget profile changed) gets a new client before its
+next turn, which is sent the session's recent turns to keep the context.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter as Tally
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from claude_agent_sdk import ClaudeSDKClient
+
+from app.agent.pool import ClientPool, PooledClient, disconnect_client
+
+logger = logging.getLogger(__name__)
+
+_SWEEP_INTERVAL = 30.0
+_MEMINFO_PATH = "/proc/meminfo"
+# Available memory is re-read at most this often.
+_MEMINFO_INTERVAL = 5.0
+# Sessions whose turns so far were all answered without the agent.
+_MAX_UNSEEN = 1024
+# Turns replayed to a session's replacement client.
+_MAX_TRANSCRIPT = 10
+
+
+@dataclass
+class SessionLease:
+    """A client checked out for one turn. Set ``failed`` to drop the session."""
+
+    client: ClaudeSDKClient
+    turns: int
+    failed: bool = False
+    # Earlier turns the client has not seen: (message, answer) pairs.
+    history: list[tuple[str, str]] = field(default_factory=list)
+    # This turn's (message, answer), set by the caller once it succeeded.
+    exchange: tuple[str, str] | None = None
+
+
+@dataclass
+class _Session:
+    client: ClaudeSDKClient | None = None
+    turns: int = 0
+    busy: bool = False
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # The last _MAX_TRANSCRIPT turns, for a replacement client.
+    transcript: list[tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass
+class _Unseen:
+    """Turns answered without the agent (see SessionManager.record)."""
+
+    turns: list[tuple[str, str]] = field(default_factory=list)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _available_memory_mb() -> float | None:
+    """Return MemAvailable from /proc/meminfo in MiB, or None if unknown."""
+    try:
+        with open(_MEMINFO_PATH, encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class SessionManager:
+    """Registry of live per-session agent clients.
+
+    New sessions take a pre-connected client out of ``pool`` and own it
+    until they are evicted. With ``max_sessions`` set to 0 sessions are
+    disabled and every turn is a one-shot run on a pooled client.
+    ``current`` tells whether a client was connected with the options in
+    force; stale session clients are replaced before their next turn.
+    """
+
+    def __init__(
+        self,
+        pool: ClientPool,
+        max_sessions: int,
+        idle_ttl: float,
+        min_available_mb: float = 0,
+        current: Callable[[ClaudeSDKClient], bool] | None = None,
+    ) -> None:
+        self._pool = pool
+        self._current = current
+        self._max_sessions = max(max_sessions, 0)
+        self._idle_ttl = idle_ttl
+        self._min_available_mb = min_available_mb
+
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._unseen: OrderedDict[str, _Unseen] = OrderedDict()
+        self._sweep_task: asyncio.Task | None = None
+        self._background: set[asyncio.Task] = set()
+        self._pressure = False
+        self._pressure_read_at = -math.inf
+        self.evictions: Tally[str] = Tally()
+        self.reconnects = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_sessions > 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def has_history(self, session_id: str) -> bool:
+        """True if the session already holds conversation context."""
+        if session_id in self._unseen:
+            return True
+        session = self._sessions.get(session_id)
+        return session is not None and session.turns > 0
+
+    async def start(self) -> None:
+        if self.enabled and self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        self._unseen.clear()
+        for session in sessions:
+            if session.client is not None:
+                await disconnect_client(session.client)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    @asynccontextmanager
+    async def checkout(self, session_id: str) -> AsyncIterator[SessionLease]:
+        """Check out the session's client for a single turn.
+
+        Turns on the same session are serialized. If the turn fails or is
+        cancelled the session is dropped and the next turn starts fresh.
+        """
+        if not self.enabled:
+            async with self._one_shot() as lease:
+                yield lease
+            return
+
+        while True:
+            session = self._session(session_id)
+
+            async with session.lock:
+                if self._sessions.get(session_id) is not session:
+                    # Evicted while this turn waited for the lock.
+                    continue
+
+                session.busy = True
+                replay: list[tuple[str, str]] = []
+                if session.client is not None and not self._is_current(session):
+                    logger.debug("Reconnecting session %s (stale)", session_id)
+                    self.reconnects += 1
+                    self._spawn(disconnect_client(session.client))
+                    session.client = None
+                    replay = list(session.transcript)
+                if session.client is None:
+                    try:
+                        pooled = await self._pool.acquire()
+                    except BaseException:
+                        session.busy = False
+                        self._forget(session_id, session)
+                        raise
+                    session.client = self._pool.detach(pooled)
+
+                unseen = self._unseen.get(session_id)
+                recorded = list(unseen.turns) if unseen else []
+                lease = SessionLease(
+                    client=session.client,
+                    turns=session.turns,
+                    history=replay + recorded,
+                )
+                try:
+                    yield lease
+                except BaseException:
+                    lease.failed = True
+                    raise
+                finally:
+                    session.busy = False
+                    session.last_used = time.monotonic()
+                    if lease.failed:
+                        self.discard(session_id)
+                    else:
+                        session.turns += 1 + len(recorded)
+                        self._seen(session_id, len(recorded))
+                        session.transcript.extend(recorded)
+                        if lease.exchange is not None:
+                            session.transcript.append(lease.exchange)
+                        del session.transcript[:-_MAX_TRANSCRIPT]
+                return
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        """Note a turn of ``session_id`` answered without the agent.
+
+        Cached and templated answers never reach the session's client; the
+        client is shown them with the next turn it runs, so follow-ups keep
+        their context. Only the _MAX_UNSEEN most recent sessions are kept.
+        """
+        if not self.enabled:
+            return
+        unseen = self._unseen.get(session_id)
+        if unseen is None:
+            unseen = self._unseen[session_id] = _Unseen()
+            if len(self._unseen) > _MAX_UNSEEN:
+                self._unseen.popitem(last=False)
+        self._unseen.move_to_end(session_id)
+        unseen.turns.append((message, answer))
+        unseen.last_used = time.monotonic()
+
+    def _seen(self, session_id: str, count: int) -> None:
+        """Drop the first ``count`` unseen turns; the client has them now."""
+        unseen = self._unseen.get(session_id)
+        if unseen is None or not count:
+            return
+        del unseen.turns[:count]
+        if not unseen.turns:
+            del self._unseen[session_id]
+
+    def _session(self, session_id: str) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session()
+            self._sessions[session_id] = session
+            self._enforce_limits(keep=session_id)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def discard(self, session_id: str) -> None:
+        """Drop a session and disconnect its client in the background."""
+        session = self._sessions.pop(session_id, None)
+        if session is not None and session.client is not None:
+            self._spawn(disconnect_client(session.client))
+            session.client = None
+
+    @asynccontextmanager
+    async def _one_shot(self) -> AsyncIterator[SessionLease]:
+        pooled: PooledClient = await self._pool.acquire()
+        lease = SessionLease(client=pooled.client, turns=0)
+        try:
+            yield lease
+        except BaseException:
+            lease.failed = True
+            raise
+        finally:
+            self._pool.release(pooled, failed=lease.failed)
+
+    def _is_current(self, session: _Session) -> bool:
+        return self._current is None or self._current(session.client)
+
+    def _forget(self, session_id: str, session: _Session) -> None:
+        if self._sessions.get(session_id) is session and session.client is None:
+            del self._sessions[session_id]
+
+    def _idle_lru(self, keep: str | None = None) -> str | None:
+        for session_id, session in self._sessions.items():
+            if session_id != keep and not session.busy:
+                return session_id
+        return None
+
+    def _enforce_limits(self, keep: str | None = None) -> None:
+        """Evict idle sessions, least recently used first, over the cap.
+
+        Under memory pressure one extra idle session is evicted as well.
+        """
+        over = len(self._sessions) - self._max_sessions
+        reason = "lru"
+        if over <= 0 and self._under_pressure():
+            over, reason = 1, "memory"
+        for _ in range(over):
+            victim = self._idle_lru(keep)
+            if victim is None:
+                break
+            self._evict(victim, reason)
+            self.discard(victim)
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        # Routine at capacity, so counted rather than logged at INFO.
+        self.evictions[reason] += 1
+        logger.debug("Evicting session %s (%s)", session_id, reason)
+
+    def _under_pressure(self) -> bool:
+        if self._min_available_mb <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._pressure_read_at >= _MEMINFO_INTERVAL:
+            self._pressure_read_at = now
+            available = _available_memory_mb()
+            self._pressure = (
+                available is not None and available < self._min_available_mb
+            )
+        return self._pressure
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(_SWEEP_INTERVAL)
+            await self.sweep()
+
+    async def sweep(self) -> None:
+        """Evict idle sessions, and one more if memory is low."""
+        cutoff = time.monotonic() - self._idle_ttl
+        expired = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if not session.busy and session.last_used < cutoff
+        ]
+        for session_id in expired:
+            self._evict(session_id, "idle")
+            self.discard(session_id)
+        while self._unseen:
+            session_id, unseen = next(iter(self._unseen.items()))
+            if unseen.last_used >= cutoff:
+                break
+            del self._unseen[session_id]
+        if self._under_pressure():
+            victim = self._idle_lru()
+            if victim is not None:
+                self._evict(victim, "memory")
+                session = self._sessions.pop(victim)
+                if session.client is not None:
+                    await disconnect_client(session.client)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
@@ -1,15 +1,63 @@
-"""System prompt for the Dingkang Wang personal assistant chatbot."""
+"""System prompt for the Dingkang Wang personal assistant chatbot.
 
+The prompt is built once and cached as an immutable snapshot. The snapshot
+is rebuilt when data/resume.md changes (detected by mtime, checked at most
+every few seconds, or pushed by the optional file watcher), and carries a
+content hash that other layers can use to key caches on the prompt version.
+
+The text is assembled from named sections in a fixed order and normalised,
+so an unchanged prompt is byte-identical across rebuilds and processes,
+which is what lets the provider's prompt cache hit. ``python -m
+app.prompt_report`` shows the approximate token count of every section.
+"""
+
+import asyncio
+import hashlib
 import logging
+import os
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
+
+from app.config import PROMPT_RECHECK_INTERVAL, SLIM_PROMPT
 
 logger = logging.getLogger(__name__)
 
-_BASE_PROMPT = """\
+_RESUME_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "resume.md"
+
+# The prompt is assembled from named sections, always in this order. The
+# sections that do not depend on data/ come first, so edits to resume.md
+# leave the longest possible prefix of the prompt byte-identical.
+_ROLE = """\
 You are an AI assistant on Dingkang Wang's personal homepage. Your role is to help \
 visitors learn about Dingkang's background, skills, projects, and experience. You are \
 NOT Dingkang -- you are a friendly and knowledgeable AI assistant that knows about him.
+"""
+
+_BEHAVIOR = """\
+## Your Behavior
+
+1. Be friendly, professional, and helpful.
+2. Answer questions about Dingkang's background, projects, skills, and experience \
+accurately.
+3. Use the available tools to look up detailed information when needed:
+   - Use `get_github_repos` to list Dingkang's projects.
+   - Use `get_project_details` to get detailed info about a specific project.
+   - Use `get_resume` to get full resume/background information.
+   - Use `search_knowledge` to find specific facts in the resume and project notes.
+4. If you don't know something about Dingkang, say so honestly rather than making \
+things up.
+5. Keep responses concise but informative. Use markdown formatting when helpful.
+6. You can also engage in general conversation, but always be ready to redirect to \
+information about Dingkang when relevant.
+7. Never pretend to be Dingkang. Always refer to him in the third person.
+"""
 
+# A summary of resume.md, used only when the resume itself is left out.
+# Project descriptions are served by the tools from data/repos.json, so
+# only the names are listed.
+_PROFILE = """\
 ## About Dingkang Wang
 
 Dingkang Wang is a Software Engineer at Tesla where he builds AI agents and \
@@ -40,58 +88,223 @@ learning research, focusing on point cloud processing and 3D perception.
 - **Robotics/AV**: ROS, OpenCV
 
 ### Key Projects
-- **claude-pr-review-team**: AI-powered code review tool using Claude for automated \
-pull request reviews, integrated with GitHub Actions.
-- **podcastcut-skills**: AI-driven podcast editing tool for automatically identifying \
-and cutting segments of interest.
-- **deepagents-quickstarts**: Quickstart templates for building AI agents with deep \
-learning.
-- **tpu_training**: Framework for training models on Google TPUs with distributed \
-training support.
-- **FMCW-DopplerPointTransformerNet**: Transformer-based neural network for FMCW \
-radar Doppler point clouds in autonomous driving perception.
-- **dinov2-with-rope**: DINOv2 vision transformer extended with Rotary Position \
-Embedding (RoPE).
-- **podcast-transcriber-mcp**: MCP server for podcast transcription as an AI tool.
+claude-pr-review-team, podcastcut-skills, deepagents-quickstarts, tpu_training, \
+FMCW-DopplerPointTransformerNet, dinov2-with-rope, podcast-transcriber-mcp. \
+`get_project_details` describes each of them.
+"""
 
-## Your Behavior
+_SLIM_NOTE = """\
+## Detailed Background
 
-1. Be friendly, professional, and helpful.
-2. Answer questions about Dingkang's background, projects, skills, and experience \
-accurately.
-3. Use the available tools to look up detailed information when needed:
-   - Use `get_github_repos` to list Dingkang's projects.
-   - Use `get_project_details` to get detailed info about a specific project.
-   - Use `get_resume` to get full resume/background information.
-4. If you don't know something about Dingkang, say so honestly rather than making \
-things up.
-5. Keep responses concise but informative. Use markdown formatting when helpful.
-6. You can also engage in general conversation, but always be ready to redirect to \
-information about Dingkang when relevant.
-7. Never pretend to be Dingkang. Always refer to him in the third person.
+The full resume is not included in this prompt. Before answering questions \
+about specific roles, responsibilities, skills, or project features, call \
+`search_knowledge` with a few keywords and answer from the sections it returns.
 """
 
+_BACKGROUND_INTRO = """\
+## Background
 
-def get_system_prompt() -> str:
-    """Build and return the full system prompt.
+Dingkang's resume follows. It is the reference for questions about his \
+experience, skills, and projects.
 
-    Loads additional context from data/resume.md if it exists.
-    """
-    prompt = _BASE_PROMPT
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text`` (about four characters a token)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass(frozen=True)
+class PromptSection:
+    """One named part of the system prompt."""
+
+    name: str
+    text: str
+    static: bool  # does not depend on the files in data/
 
-    # Try to load additional resume data
-    resume_path = Path(__file__).resolve().parent.parent.parent / "data" / "resume.md"
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass(frozen=True)
+class PromptSnapshot:
+    """An immutable, fully built system prompt."""
+
+    text: str
+    version: str
+    resume_mtime_ns: int | None
+    sections: tuple[PromptSection, ...] = ()
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @property
+    def static_tokens(self) -> int:
+        """Tokens in the leading sections that do not depend on data/."""
+        prefix = 0
+        for section in self.sections:
+            if not section.static:
+                break
+            prefix += section.tokens
+        return prefix
+
+
+_snapshot: PromptSnapshot | None = None
+_slim_snapshot: PromptSnapshot | None = None
+_checked_at: float = 0.0
+_listeners: list[Callable[[PromptSnapshot], None]] = []
+
+
+def _resume_mtime_ns() -> int | None:
     try:
-        if resume_path.is_file():
-            extra = resume_path.read_text(encoding="utf-8").strip()
-            if extra:
-                prompt += (
-                    "\n\n## Additional Background Information\n\n"
-                    "The following is additional detailed information about Dingkang "
-                    "that you can reference:\n\n"
-                    f"{extra}\n"
-                )
+        return os.stat(_RESUME_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _normalize(text: str) -> str:
+    """Canonical bytes for a section: LF line ends, no trailing whitespace."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def _load_resume() -> str:
+    try:
+        return _RESUME_PATH.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return ""
     except Exception:
-        logger.warning("Could not load resume data from %s", resume_path, exc_info=True)
+        logger.warning("Could not load resume data from %s", _RESUME_PATH, exc_info=True)
+        return ""
+
+
+def _build_sections(slim: bool) -> list[PromptSection]:
+    """The prompt's sections, static ones first.
+
+    With the resume in the prompt, the built-in profile would only repeat
+    it and is left out; without it (``slim`` or a missing resume.md) the
+    profile stands in for it.
+    """
+    sections = [
+        PromptSection("role", _ROLE, static=True),
+        PromptSection("behavior", _BEHAVIOR, static=True),
+    ]
+    resume = "" if slim else _normalize(_load_resume())
+    if resume:
+        sections.append(
+            PromptSection("background", _BACKGROUND_INTRO + resume, static=False)
+        )
+    else:
+        sections.append(PromptSection("profile", _PROFILE, static=True))
+        if slim:
+            sections.append(PromptSection("slim_note", _SLIM_NOTE, static=True))
+    return [
+        PromptSection(section.name, _normalize(section.text), section.static)
+        for section in sections
+    ]
+
+
+def build_snapshot(slim: bool = SLIM_PROMPT) -> PromptSnapshot:
+    """Build the full system prompt.
+
+    Includes data/resume.md if it exists, unless ``slim`` (SLIM_PROMPT) is
+    set, in which case the agent retrieves it with ``search_knowledge``
+    instead. The same inputs always give the same bytes, and so the same
+    version.
+    """
+    mtime_ns = _resume_mtime_ns()
+    sections = tuple(_build_sections(slim))
+    prompt = "\n\n".join(section.text for section in sections) + "\n"
+    version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    return PromptSnapshot(
+        text=prompt, version=version, resume_mtime_ns=mtime_ns, sections=sections
+    )
+
+
+def add_reload_listener(callback: Callable[[PromptSnapshot], None]) -> None:
+    """Register a callback invoked whenever the prompt content changes."""
+    _listeners.append(callback)
+
+
+def reload_prompt() -> PromptSnapshot:
+    """Rebuild the prompt now and notify listeners if its content changed."""
+    global _snapshot, _checked_at
+    previous = _snapshot
+    _snapshot = build_snapshot()
+    _checked_at = time.monotonic()
+    if previous is not None and previous.version != _snapshot.version:
+        logger.info(
+            "System prompt changed (%s -> %s)", previous.version, _snapshot.version
+        )
+        for callback in _listeners:
+            try:
+                callback(_snapshot)
+            except Exception:
+                logger.exception("Prompt reload listener failed")
+    return _snapshot
+
+
+def get_prompt_snapshot() -> PromptSnapshot:
+    """Return the cached prompt, rebuilding it if resume.md was modified.
+
+    The file is stat'ed at most once per PROMPT_RECHECK_INTERVAL seconds.
+    """
+    global _checked_at
+    if _snapshot is None:
+        return reload_prompt()
+    now = time.monotonic()
+    if now - _checked_at >= PROMPT_RECHECK_INTERVAL:
+        _checked_at = now
+        if _resume_mtime_ns() != _snapshot.resume_mtime_ns:
+            return reload_prompt()
+    return _snapshot
+
+
+def get_slim_prompt_snapshot() -> PromptSnapshot:
+    """Return the prompt without data/resume.md, used for degraded runs.
+
+    It does not depend on resume.md, so it is built once.
+    """
+    global _slim_snapshot
+    if SLIM_PROMPT:
+        return get_prompt_snapshot()
+    if _slim_snapshot is None:
+        _slim_snapshot = build_snapshot(slim=True)
+    return _slim_snapshot
+
+
+def get_system_prompt() -> str:
+    """Return the full system prompt text."""
+    return get_prompt_snapshot().text
+
+
+def get_prompt_version() -> str:
+    """Return a short content hash identifying the current prompt."""
+    return get_prompt_snapshot().version
+
+
+async def watch_prompt_file(poll_interval: float = 2.0) -> None:
+    """Reload the prompt whenever data/resume.md changes on disk.
+
+    Uses watchfiles (installed with uvicorn[standard]) when available and
+    falls back to polling the file's mtime. Runs until cancelled.
+    """
+    get_prompt_snapshot()
+    try:
+        from watchfiles import awatch
+    except ImportError:
+        awatch = None
+
+    if awatch is not None and _RESUME_PATH.parent.is_dir():
+        async for _changes in awatch(_RESUME_PATH.parent):
+            if _resume_mtime_ns() != _snapshot.resume_mtime_ns:
+                reload_prompt()
+        return
 
-    return prompt
+    while True:
+        await asyncio.sleep(poll_interval)
+        if _resume_mtime_ns() != _snapshot.resume_mtime_ns:
+            reload_prompt()
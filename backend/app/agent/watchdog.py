@@ -0,0 +1,242 @@
+"""Resource watchdog for the agent CLI subprocesses.
+
+Every ClaudeSDKClient runs a CLI child process. The watchdog reads every
+child of this process from /proc every AGENT_WATCHDOG_INTERVAL seconds
+(RSS, CPU time, age, state) and kills the ones that
+
+- exceed AGENT_CHILD_MAX_RSS_MB, AGENT_CHILD_MAX_CPU_SECONDS or
+  AGENT_CHILD_MAX_AGE (0 disables a limit),
+- are still running a while after their client disconnected, or
+- belong to no live client (the client was dropped without a disconnect).
+
+Killing a child that is serving a run fails that run, and the client is
+recycled like after any other failure. Zombies that nobody waits for are
+reaped. Without /proc (not Linux) the watchdog does nothing.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import Counter as Tally
+from dataclasses import dataclass
+from weakref import WeakSet
+
+from app.agent.sdk_compat import client_pid
+from app.config import (
+    AGENT_CHILD_MAX_AGE,
+    AGENT_CHILD_MAX_CPU_SECONDS,
+    AGENT_CHILD_MAX_RSS_MB,
+    AGENT_DISCONNECT_TIMEOUT,
+    AGENT_WATCHDOG_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROC = "/proc"
+# A child that is not (yet) matched to a client, e.g. while it connects,
+# is left alone this long.
+_UNTRACKED_GRACE = 60.0
+_KILL_REASONS = ("rss", "cpu", "age", "leaked")
+
+
+@dataclass
+class ChildProcess:
+    pid: int
+    state: str
+    rss_mb: float
+    cpu_seconds: float
+    age: float
+
+
+def _clock() -> tuple[int, float, int]:
+    with open(f"{_PROC}/uptime", encoding="ascii") as f:
+        uptime = float(f.read().split()[0])
+    return os.sysconf("SC_CLK_TCK"), uptime, os.sysconf("SC_PAGE_SIZE")
+
+
+def list_children(parent: int | None = None) -> list[ChildProcess]:
+    """Read the direct children of ``parent`` (default: this process)."""
+    parent = os.getpid() if parent is None else parent
+    ticks, uptime, page_size = _clock()
+    children = []
+    for entry in os.scandir(_PROC):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"{entry.path}/stat", encoding="ascii", errors="replace") as f:
+                # The command name may contain spaces; fields resume after ")".
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) != parent:
+                continue
+            children.append(
+                ChildProcess(
+                    pid=int(entry.name),
+                    state=fields[0],
+                    rss_mb=int(fields[21]) * page_size / 1048576,
+                    cpu_seconds=(int(fields[11]) + int(fields[12])) / ticks,
+                    age=max(uptime - int(fields[19]) / ticks, 0.0),
+                )
+            )
+        except (OSError, ValueError, IndexError):
+            # Exited while we looked, or not ours to read.
+            continue
+    return children
+
+
+class ProcessWatchdog:
+    """Tracks agent clients' child processes and enforces their limits."""
+
+    def __init__(
+        self,
+        interval: float,
+        max_rss_mb: float = 0,
+        max_cpu_seconds: float = 0,
+        max_age: float = 0,
+        exit_grace: float = 10.0,
+    ) -> None:
+        self._interval = interval
+        self._max_rss_mb = max_rss_mb
+        self._max_cpu_seconds = max_cpu_seconds
+        self._max_age = max_age
+        self._exit_grace = exit_grace
+
+        self._clients: WeakSet = WeakSet()
+        self._exiting: dict[int, float] = {}  # pid -> kill after (monotonic)
+        self._zombies: set[int] = set()
+        self._task: asyncio.Task | None = None
+        self._last: list[ChildProcess] = []
+        # False when client PIDs cannot be read (see sdk_compat.check);
+        # every child would then look leaked, so only limits are enforced.
+        self.tracks_clients = True
+
+        self.killed: Tally[str] = Tally()
+        self.reaped = 0
+        self.disconnect_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._interval > 0 and os.path.isdir(f"{_PROC}/self")
+
+    def stats(self) -> dict[str, float]:
+        live = [c for c in self._last if c.state != "Z"]
+        return {
+            "children": len(live),
+            "rss_mb": round(sum(c.rss_mb for c in live), 1),
+            "max_rss_mb": round(max((c.rss_mb for c in live), default=0.0), 1),
+            "zombies": len(self._last) - len(live),
+            "exiting": len(self._exiting),
+            "reaped": self.reaped,
+            "disconnect_failures": self.disconnect_failures,
+            **{f"killed_{reason}": self.killed[reason] for reason in _KILL_REASONS},
+        }
+
+    def track(self, client: object) -> None:
+        """Watch ``client``'s child process; call before client.connect()."""
+        self._clients.add(client)
+
+    def release(self, client: object, failed: bool = False) -> None:
+        """``client`` was disconnected; its child has a grace period to exit."""
+        self._clients.discard(client)
+        if failed:
+            self.disconnect_failures += 1
+        pid = client_pid(client)
+        if pid is not None:
+            self._exiting[pid] = time.monotonic() + self._exit_grace
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Agent process watchdog sweep failed")
+
+    def sweep(self) -> None:
+        """Check every child process once."""
+        children = list_children()
+        self._last = children
+        owned = {client_pid(client) for client in list(self._clients)}
+        now = time.monotonic()
+        seen = set()
+        for child in children:
+            seen.add(child.pid)
+            if child.state == "Z":
+                self._reap(child.pid)
+                continue
+            reason = self._violation(child, child.pid in owned, now)
+            if reason is not None:
+                self._kill(child, reason)
+        # Forget processes that are gone.
+        self._exiting = {p: t for p, t in self._exiting.items() if p in seen}
+        self._zombies &= seen
+
+    def _violation(self, child: ChildProcess, owned: bool, now: float) -> str | None:
+        exit_by = self._exiting.get(child.pid)
+        if exit_by is not None and not owned:
+            return "leaked" if now >= exit_by else None
+        if not owned and self.tracks_clients and child.age >= _UNTRACKED_GRACE:
+            return "leaked"
+        if self._max_rss_mb and child.rss_mb > self._max_rss_mb:
+            return "rss"
+        if self._max_cpu_seconds and child.cpu_seconds > self._max_cpu_seconds:
+            return "cpu"
+        if self._max_age and child.age > self._max_age:
+            return "age"
+        return None
+
+    def _kill(self, child: ChildProcess, reason: str) -> None:
+        logger.warning(
+            "Killing agent process %d (%s): rss=%.0fMB cpu=%.0fs age=%.0fs",
+            child.pid,
+            reason,
+            child.rss_mb,
+            child.cpu_seconds,
+            child.age,
+        )
+        try:
+            os.kill(child.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        self.killed[reason] += 1
+        # Whoever holds the process object reaps it; if nobody does, the
+        # zombie is reaped on a later sweep.
+        self._exiting.pop(child.pid, None)
+
+    def _reap(self, pid: int) -> None:
+        # The owner's child watcher normally reaps its process right away, so
+        # only reap zombies that are still around one sweep later.
+        if pid not in self._zombies:
+            self._zombies.add(pid)
+            return
+        try:
+            reaped, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            reaped = 0
+        if reaped:
+            self.reaped += 1
+            logger.info("Reaped zombie agent process %d", pid)
+        self._zombies.discard(pid)
+
+
+watchdog = ProcessWatchdog(
+    interval=AGENT_WATCHDOG_INTERVAL,
+    max_rss_mb=AGENT_CHILD_MAX_RSS_MB,
+    max_cpu_seconds=AGENT_CHILD_MAX_CPU_SECONDS,
+    max_age=AGENT_CHILD_MAX_AGE,
+    exit_grace=AGENT_DISCONNECT_TIMEOUT + 5,
+)
@@ -3,6 +3,14 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 ALLOWED_ORIGINS: list[str] = [
     origin.strip()
     for origin in os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
@@ -12,3 +20,176 @@ ALLOWED_ORIGINS: list[str] = [
 RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
 
 MODEL_NAME: str = os.getenv("MODEL_NAME", "claude-sonnet-4-20250514")
+
+# Turns the agent may take per run (each tool round trip is one turn).
+AGENT_MAX_TURNS: int = int(os.getenv("AGENT_MAX_TURNS", "3"))
+
+# Warm pool of pre-connected agent clients. Set AGENT_POOL_SIZE=0 to connect
+# a fresh client per request instead. Clients are recycled after
+# AGENT_POOL_MAX_USES runs; values above 1 let later requests see earlier
+# conversations on the same client.
+AGENT_POOL_SIZE: int = int(os.getenv("AGENT_POOL_SIZE", "2"))
+AGENT_POOL_MAX_USES: int = int(os.getenv("AGENT_POOL_MAX_USES", "1"))
+AGENT_POOL_ACQUIRE_TIMEOUT: float = float(os.getenv("AGENT_POOL_ACQUIRE_TIMEOUT", "30"))
+AGENT_POOL_MAX_WAITERS: int = int(os.getenv("AGENT_POOL_MAX_WAITERS", "20"))
+
+# How agent clients are managed: "session" (follow-up turns reuse the
+# session's client), "pooled" (one-shot turns on pool clients) or
+# "per_request" (a fresh client for every turn).
+AGENT_LIFECYCLE: str = os.getenv("AGENT_LIFECYCLE", "session").strip().lower()
+
+# Multi-turn sessions keyed by session_id. Each live session owns one agent
+# subprocess, so keep SESSION_MAX small on a 1 GB VM; 0 disables sessions.
+SESSION_MAX: int = int(os.getenv("SESSION_MAX", "4"))
+SESSION_IDLE_TTL: float = float(os.getenv("SESSION_IDLE_TTL", "300"))
+SESSION_MIN_AVAILABLE_MB: float = float(os.getenv("SESSION_MIN_AVAILABLE_MB", "150"))
+
+# System prompt caching. resume.md is re-stat'ed at most every
+# PROMPT_RECHECK_INTERVAL seconds; PROMPT_WATCH reloads it as soon as it
+# changes on disk.
+PROMPT_RECHECK_INTERVAL: float = float(os.getenv("PROMPT_RECHECK_INTERVAL", "5"))
+PROMPT_WATCH: bool = _env_bool("PROMPT_WATCH", False)
+
+# Response cache for repeat questions (RESPONSE_CACHE_MAX_ENTRIES=0 disables
+# it). RESPONSE_CACHE_FUZZY also matches reworded questions with the same
+# content words.
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", "4194304"))
+RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_FUZZY: bool = _env_bool("RESPONSE_CACHE_FUZZY", True)
+
+# Attach identical first-turn questions that arrive while a run is in flight
+# to that run instead of starting another agent.
+COALESCE_REQUESTS: bool = _env_bool("COALESCE_REQUESTS", True)
+
+# Worker processes started by app.serve, and the server that runs them:
+# "uvicorn" or "gunicorn" (uvicorn workers under gunicorn's supervisor;
+# needs the gunicorn extra). Each worker has its own agent pool, sessions
+# and admission limits.
+WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+SERVER: str = os.getenv("SERVER", "uvicorn").strip().lower()
+
+# State that must agree across workers (see app/shared_state.py):
+# memory:// (this process only), sqlite:///path/to/state.db (workers on one
+# machine) or redis://host:6379/0 (every machine; rediss:// for TLS).
+SHARED_STATE_URL: str = os.getenv("SHARED_STATE_URL", "memory://").strip()
+
+# Rate limiter storage: "memory" (per process), "shared" (SHARED_STATE_URL)
+# or "redis" (shared through RATE_LIMIT_REDIS_URL, e.g. redis://host:6379/0
+# or rediss:// for TLS).
+RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Admission control: at most AGENT_MAX_CONCURRENT agent runs at once, with up
+# to AGENT_QUEUE_MAX requests waiting (FIFO) for AGENT_QUEUE_TIMEOUT seconds.
+# Requests beyond that get 503 + Retry-After.
+AGENT_MAX_CONCURRENT: int = int(os.getenv("AGENT_MAX_CONCURRENT", "3"))
+AGENT_QUEUE_MAX: int = int(os.getenv("AGENT_QUEUE_MAX", "20"))
+AGENT_QUEUE_TIMEOUT: float = float(os.getenv("AGENT_QUEUE_TIMEOUT", "30"))
+
+# Adaptive budgets: tokens used in the last BUDGET_WINDOW seconds, globally
+# and per client IP (0 = unlimited). When budget use or admission queue
+# fill reaches BUDGET_REDUCE_AT, runs get BUDGET_REDUCED_MAX_TURNS turns and
+# the slim prompt; at BUDGET_ECONOMY_AT they also switch to
+# BUDGET_ECONOMY_MODEL (if set). A client over its own budget gets 429.
+BUDGET_ADAPTIVE: bool = _env_bool("BUDGET_ADAPTIVE", True)
+BUDGET_WINDOW: float = float(os.getenv("BUDGET_WINDOW", "3600"))
+BUDGET_GLOBAL_TOKENS: int = int(os.getenv("BUDGET_GLOBAL_TOKENS", "0"))
+BUDGET_PER_IP_TOKENS: int = int(os.getenv("BUDGET_PER_IP_TOKENS", "0"))
+BUDGET_REDUCE_AT: float = float(os.getenv("BUDGET_REDUCE_AT", "0.5"))
+BUDGET_ECONOMY_AT: float = float(os.getenv("BUDGET_ECONOMY_AT", "0.8"))
+BUDGET_REDUCED_MAX_TURNS: int = int(os.getenv("BUDGET_REDUCED_MAX_TURNS", "2"))
+BUDGET_ECONOMY_MODEL: str = os.getenv("BUDGET_ECONOMY_MODEL", "").strip()
+
+# Logging: records are written as JSON ("json") or plain lines ("text") by
+# a background thread; at most LOG_QUEUE_SIZE wait, beyond that they are
+# dropped. LOG_ACCESS_SAMPLE_RATE (0-1) of requests get an access log line
+# (every error response does), and each agent run logs at most
+# LOG_STDERR_MAX_LINES lines of CLI stderr (at DEBUG).
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_ACCESS_SAMPLE_RATE: float = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "0.1"))
+LOG_STDERR_MAX_LINES: int = int(os.getenv("LOG_STDERR_MAX_LINES", "200"))
+
+# Request tracing: TRACE_SAMPLE_RATE (0-1) of chat requests are traced and
+# their spans written as JSON lines to TRACE_FILE (stdout when empty).
+# TRACE_FORMAT is "json" (flat span records) or "otlp" (OTLP/JSON).
+TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE: str = os.getenv("TRACE_FILE", "").strip()
+TRACE_FORMAT: str = os.getenv("TRACE_FORMAT", "json").strip().lower()
+# Let the sampled flag of an incoming traceparent header force tracing. Only
+# enable it behind a proxy that sets or strips the header: any client can
+# send one.
+TRACE_TRUST_PARENT: bool = _env_bool("TRACE_TRUST_PARENT", False)
+
+# Histogram bucket upper bounds (seconds) for /metrics latency histograms.
+METRICS_BUCKETS: tuple[float, ...] = tuple(
+    float(b)
+    for b in os.getenv(
+        "METRICS_BUCKETS", "0.05,0.1,0.25,0.5,1,2.5,5,10,20,30,60"
+    ).split(",")
+    if b.strip()
+)
+
+# Hard wall-clock limit for one agent run, and how long disconnect() may take
+# before the CLI subprocess is killed.
+AGENT_RUN_TIMEOUT: float = float(os.getenv("AGENT_RUN_TIMEOUT", "120"))
+AGENT_DISCONNECT_TIMEOUT: float = float(os.getenv("AGENT_DISCONNECT_TIMEOUT", "5"))
+
+# Agent subprocess watchdog: every AGENT_WATCHDOG_INTERVAL seconds (0
+# disables it) CLI children over these limits are killed (0 disables a
+# limit), as are children that outlive their client.
+AGENT_WATCHDOG_INTERVAL: float = float(os.getenv("AGENT_WATCHDOG_INTERVAL", "10"))
+AGENT_CHILD_MAX_RSS_MB: float = float(os.getenv("AGENT_CHILD_MAX_RSS_MB", "512"))
+AGENT_CHILD_MAX_CPU_SECONDS: float = float(
+    os.getenv("AGENT_CHILD_MAX_CPU_SECONDS", "600")
+)
+AGENT_CHILD_MAX_AGE: float = float(os.getenv("AGENT_CHILD_MAX_AGE", "0"))
+
+# Token-level streaming: forward text deltas as the model produces them,
+# flushed every STREAM_FLUSH_INTERVAL seconds or STREAM_FLUSH_CHARS
+# characters, whichever comes first.
+STREAM_PARTIAL: bool = _env_bool("STREAM_PARTIAL", True)
+STREAM_FLUSH_INTERVAL: float = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+STREAM_FLUSH_CHARS: int = int(os.getenv("STREAM_FLUSH_CHARS", "256"))
+
+# SSE keep-alive: a comment frame after SSE_HEARTBEAT_INTERVAL idle seconds
+# (0 disables), and the reconnection delay hinted to EventSource clients.
+SSE_HEARTBEAT_INTERVAL: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+SSE_RETRY_MS: int = int(os.getenv("SSE_RETRY_MS", "3000"))
+
+# Resumable agent streams: the last STREAM_RESUME_MAX_FRAMES frames of each
+# run are kept so a reconnect with Last-Event-ID can pick up where it left
+# off. Runs keep going STREAM_RESUME_GRACE seconds after their client
+# disconnects, and finished streams are replayable for STREAM_RESUME_TTL.
+STREAM_RESUME: bool = _env_bool("STREAM_RESUME", True)
+STREAM_RESUME_MAX_FRAMES: int = int(os.getenv("STREAM_RESUME_MAX_FRAMES", "1024"))
+STREAM_RESUME_GRACE: float = float(os.getenv("STREAM_RESUME_GRACE", "15"))
+STREAM_RESUME_TTL: float = float(os.getenv("STREAM_RESUME_TTL", "120"))
+
+# Knowledge store behind the MCP info tools (data/repos.json,
+# data/projects/*.md, data/resume.md); files are re-stat'ed at most every
+# KNOWLEDGE_RECHECK_INTERVAL seconds and reloaded when changed.
+KNOWLEDGE_RECHECK_INTERVAL: float = float(os.getenv("KNOWLEDGE_RECHECK_INTERVAL", "5"))
+
+# Snapshot of precomputed answers written by ``python -m app.precompute``
+# (relative paths are resolved against the backend directory; empty
+# disables it). A snapshot built for another prompt or knowledge version is
+# ignored.
+PRECOMPUTED_ANSWERS: str = os.getenv(
+    "PRECOMPUTED_ANSWERS", "data/answers.snapshot"
+).strip()
+
+# SLIM_PROMPT leaves data/resume.md out of the system prompt; the agent
+# looks details up with the search_knowledge tool, which returns the
+# SEARCH_TOP_K best-matching sections by default.
+SLIM_PROMPT: bool = _env_bool("SLIM_PROMPT", False)
+SEARCH_TOP_K: int = int(os.getenv("SEARCH_TOP_K", "3"))
+
+# FAQ fast path: first-turn questions that match a curated intent with at
+# least FAQ_MIN_CONFIDENCE cosine similarity are answered from a template
+# without starting the agent.
+FAQ_ENABLED: bool = _env_bool("FAQ_ENABLED", True)
+FAQ_MIN_CONFIDENCE: float = float(os.getenv("FAQ_MIN_CONFIDENCE", "0.75"))
@@ -0,0 +1,243 @@
+"""Non-blocking, structured logging.
+
+A log call only freezes the record and puts it on a bounded queue; a
+writer thread formats it (tracebacks included) and writes it to stdout, so
+a slow log consumer never stalls the event loop and the streams it serves.
+When the queue is full the record is dropped and counted instead.
+
+Records are JSON objects (LOG_FORMAT=json) or plain lines (text) carrying
+the request and session id of the code that logged them, also from inside
+the SDK client's own tasks. ``extra={"fields": {...}}`` adds structured
+fields to a record.
+
+:class:`StderrBatcher` is the SDK stderr callback: it logs the CLI's
+stderr as one record per batch of lines, with at most a fixed number of
+lines per run.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from collections import Counter as Tally
+from logging.handlers import QueueHandler, QueueListener
+from weakref import WeakKeyDictionary
+
+from app import tracing
+from app.config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE
+
+_CONTEXT = ("request_id", "session_id")
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp records with the request and session id of the caller."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = tracing.current_request_id()
+        if getattr(record, "session_id", None) is None:
+            record.session_id = tracing.current_session_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in _CONTEXT:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the context and fields as key=value."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s%(context)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        pairs = [(name, getattr(record, name, None)) for name in _CONTEXT]
+        pairs.extend((getattr(record, "fields", None) or {}).items())
+        record.context = "".join(
+            f" {key}={value}" for key, value in pairs if value is not None
+        )
+        return super().format(record)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops (and counts) records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped: Tally[str] = Tally()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message now; formatting, tracebacks included, happens
+        # in the writer thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped[record.levelname] += 1
+
+
+_handler: _DroppingQueueHandler | None = None
+
+
+def setup_logging(
+    level: str = LOG_LEVEL, format: str = LOG_FORMAT, queue_size: int = LOG_QUEUE_SIZE
+) -> None:
+    """Route the root logger (and uvicorn's) through the queue and writer.
+
+    uvicorn's access log is disabled in favour of the sampled one in
+    app/middleware/access_log.py. Safe to call more than once.
+    """
+    global _handler
+    if _handler is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if format == "json" else TextFormatter())
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    # Stopping the listener writes out whatever is still queued.
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+    for name in ("uvicorn", "uvicorn.error"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    access = logging.getLogger("uvicorn.access")
+    access.handlers = []
+    access.propagate = False
+    access.disabled = True
+    _handler = handler
+
+
+def log_stats() -> dict[str, int]:
+    """Queue depth and capacity of the logging pipeline."""
+    if _handler is None:
+        return {}
+    return {"queued": _handler.queue.qsize(), "capacity": _handler.queue.maxsize}
+
+
+def dropped_records() -> dict[tuple[str], int]:
+    """Records dropped because the queue was full, by level."""
+    if _handler is None:
+        return {}
+    return {(level,): n for level, n in _handler.dropped.items()}
+
+
+class _StderrRun:
+    __slots__ = ("request_id", "session_id", "lines", "logged", "dropped", "timer")
+
+    def __init__(self, request_id: str | None, session_id: str | None) -> None:
+        self.request_id = request_id
+        self.session_id = session_id
+        self.lines: list[str] = []
+        self.logged = 0
+        self.dropped = 0
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class StderrBatcher:
+    """SDK stderr callback that logs lines in batches, capped per run.
+
+    Lines are grouped by the client that wrote them and flushed as one
+    DEBUG record every ``interval`` seconds or ``batch_size`` lines. A run
+    logs at most ``max_lines`` lines; the rest are only counted, in the
+    record that closes the run.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        max_lines: int,
+        batch_size: int = 50,
+        interval: float = 1.0,
+    ) -> None:
+        self._logger = logger
+        self._max_lines = max_lines
+        self._batch_size = batch_size
+        self._interval = interval
+        self._runs: WeakKeyDictionary = WeakKeyDictionary()  # client slot -> run
+        self._unbound: _StderrRun | None = None  # lines from no known client
+        self.dropped = 0
+
+    def __call__(self, line: str) -> None:
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        slot = tracing.current_slot()
+        run = self._runs.get(slot) if slot is not None else self._unbound
+        request_id = slot.request_id if slot is not None else None
+        if run is None or run.request_id != request_id:
+            if run is not None:
+                self._flush(run)
+            run = _StderrRun(request_id, slot.session_id if slot else None)
+            if slot is not None:
+                self._runs[slot] = run
+            else:
+                self._unbound = run
+
+        if run.logged >= self._max_lines:
+            run.dropped += 1
+            self.dropped += 1
+            return
+        run.logged += 1
+        run.lines.append(line.rstrip())
+        if len(run.lines) >= self._batch_size:
+            self._flush(run)
+        elif run.timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._flush(run)
+            else:
+                run.timer = loop.call_later(self._interval, self._flush, run)
+
+    def _flush(self, run: _StderrRun) -> None:
+        if run.timer is not None:
+            run.timer.cancel()
+            run.timer = None
+        if not run.lines and not run.dropped:
+            return
+        lines, run.lines = run.lines, []
+        dropped, run.dropped = run.dropped, 0
+        self._logger.debug(
+            "SDK stderr (%d lines)",
+            len(lines),
+            extra={
+                "request_id": run.request_id,
+                "session_id": run.session_id,
+                "fields": {"stderr": lines, "stderr_dropped": dropped},
+            },
+        )
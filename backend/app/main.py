@@ -1,16 +1,143 @@
 import os
 
+from app.logs import dropped_records, log_stats, setup_logging
+from app.startup import preimport_sdk, report
+
+setup_logging()
+
 # Remove CLAUDECODE from process env so the Claude Agent SDK subprocess
 # does not think it is nested inside another Claude Code session.
 os.environ.pop("CLAUDECODE", None)
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.config import ALLOWED_ORIGINS
+from app import metrics, tracing
+from app.agent import sdk_compat
+from app.agent.retrieval import get_search_index
+from app.agent.runner import answer_version, get_agent_options
+from app.agent.watchdog import watchdog
+from app.agent.system_prompt import (
+    get_prompt_snapshot,
+    reload_prompt,
+    watch_prompt_file,
+)
+from app.config import ALLOWED_ORIGINS, LOG_ACCESS_SAMPLE_RATE, PROMPT_WATCH
+from app.middleware.access_log import AccessLogMiddleware
+from app.middleware.rate_limit import limiter
+from app.middleware.request_id import RequestIdMiddleware
 from app.routers import chat
+from app.shared_state import purge_loop, shared_state
+
+report.mark("imports")
+
+metrics.CallbackMetric(
+    "startup_phase_seconds",
+    "Time spent in each startup phase.",
+    lambda: {(name,): secs for name, secs in report.phases.items()},
+    labelnames=["phase"],
+)
+metrics.CallbackMetric(
+    "app_ready", "1 once an agent client has connected.", lambda: int(report.ready)
+)
+metrics.CallbackMetric(
+    "trace_spans_exported_total",
+    "Spans written by the trace exporter.",
+    lambda: tracing.exporter.exported,
+    type="counter",
+)
+metrics.CallbackMetric(
+    "trace_spans_dropped_total",
+    "Spans dropped because the exporter queue was full.",
+    lambda: tracing.exporter.dropped,
+    type="counter",
+)
+metrics.CallbackMetric(
+    "system_prompt_tokens",
+    "Approximate tokens in each section of the current system prompt.",
+    lambda: {(s.name,): s.tokens for s in get_prompt_snapshot().sections},
+    labelnames=["section"],
+)
+metrics.CallbackMetric(
+    "log_queue",
+    "Log records waiting for the writer thread, and the queue capacity.",
+    lambda: {(k,): v for k, v in log_stats().items()},
+    labelnames=["stat"],
+)
+metrics.CallbackMetric(
+    "log_records_dropped_total",
+    "Log records dropped because the queue was full, by level.",
+    dropped_records,
+    type="counter",
+    labelnames=["level"],
+)
+metrics.CallbackMetric(
+    "agent_processes",
+    "Agent CLI child processes (children, rss_mb, zombies, exiting) and "
+    "watchdog kill/reap counts.",
+    lambda: {(k,): v for k, v in watchdog.stats().items()},
+    labelnames=["stat"],
+)
+metrics.CallbackMetric(
+    "shared_state_keys",
+    "Keys held by the in-process shared state.",
+    shared_state.size,
+)
+
+
+async def _warm_up() -> None:
+    with report.phase("agent_warm_up"):
+        await chat.agent_runner.warm_up()
+    report.mark_ready()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prebuild everything the first chat request needs.
+
+    The prompt, agent options and search index are built, the precomputed
+    answer snapshot mapped and the SDK's lazily imported modules loaded
+    before the server accepts requests. The agent pool then connects in the
+    background; /ready reports when the first client is up.
+    """
+    with report.phase("prompt"):
+        reload_prompt()
+        get_agent_options()
+    with report.phase("knowledge"):
+        get_search_index()
+    with report.phase("precomputed"):
+        chat.precomputed.load(answer_version())
+    with report.phase("preimport"):
+        preimport_sdk()
+        watchdog.tracks_clients = sdk_compat.check()
+    watcher = asyncio.create_task(watch_prompt_file()) if PROMPT_WATCH else None
+    with report.phase("services"):
+        await limiter.start()
+        await watchdog.start()
+        await chat.agent_runner.start()
+    warm_up = asyncio.create_task(_warm_up())
+    purger = asyncio.create_task(purge_loop(shared_state))
+    try:
+        yield
+    finally:
+        for task in (warm_up, watcher, purger):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        await chat.agent_runner.close()
+        await watchdog.close()
+        await limiter.close()
+        await shared_state.close()
+        chat.precomputed.close()
+        tracing.exporter.close()
 
-app = FastAPI(title="Dingkang Wang Chatbot API")
+
+app = FastAPI(title="Dingkang Wang Chatbot API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,14 +145,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id", "X-Stream-Id", "X-Session-Worker"],
 )
+app.add_middleware(AccessLogMiddleware, sample_rate=LOG_ACCESS_SAMPLE_RATE)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(chat.router)
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    """Liveness: the process is up and serving requests.
+
+    Also reports the agent subprocesses as of the watchdog's last sweep.
+    """
+    return {"status": "ok", "agent_processes": watchdog.stats()}
+
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness: 200 once an agent client has connected, 503 until then."""
+    body = {"status": "ready" if report.ready else "starting", **report.as_dict()}
+    return JSONResponse(body, status_code=200 if report.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/")
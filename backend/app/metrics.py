@@ -0,0 +1,155 @@
+"""Minimal Prometheus-style metrics.
+
+Counters, gauges and histograms are plain dicts keyed by label values, so
+recording a sample is a dict lookup and an addition. Components that
+already keep their own counters register a callback instead, which is only
+evaluated when /metrics is scraped.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from app.config import METRICS_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    @abstractmethod
+    def _samples(self) -> Iterable[tuple[str, tuple, tuple, float]]:
+        """Yield (name suffix, label names, label values, value) tuples."""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self._samples():
+            labels = _format_labels(names, values)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self):
+        for labels, value in self._values.items():
+            yield "", self.labelnames, labels, value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = METRICS_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        if not self.labelnames:
+            self._values[()] = [0.0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Layout: one count per bucket, then +Inf, then sum.
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _samples(self):
+        names = self.labelnames + ("le",)
+        for labels, state in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                yield "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, state[-1]
+            yield "_count", self.labelnames, labels, cumulative
+
+
+class CallbackMetric(_Metric):
+    """Metric whose values are read from ``fn`` at scrape time.
+
+    ``fn`` returns a single number, or a mapping of label-value tuples to
+    numbers when ``labelnames`` is set.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], float | dict[tuple[str, ...], float] | None],
+        type: str = "gauge",
+        labelnames: Iterable[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self._fn = fn
+
+    def _samples(self):
+        value = self._fn()
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                yield "", self.labelnames, labels, v
+        else:
+            yield "", (), (), value
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
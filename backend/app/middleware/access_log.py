@@ -0,0 +1,70 @@
+"""Sampled access log with latency fields.
+
+LOG_ACCESS_SAMPLE_RATE of the requests are logged, and every request that
+ended in an error status. Each record has the method, path, status, time
+to the response headers (``ttfb_ms``), total time including the streamed
+body (``duration_ms``) and the bytes sent; the request and session id come
+from the logging context.
+"""
+
+import logging
+import random
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("app.access")
+
+
+class AccessLogMiddleware:
+    """Pure ASGI middleware, so streamed responses are not buffered."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 0
+        ttfb: float | None = None
+        sent = 0
+
+        async def send_logged(message: Message) -> None:
+            nonlocal status, ttfb, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                ttfb = time.perf_counter() - started
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_logged)
+        except Exception:
+            status = status or 500
+            raise
+        finally:
+            if status >= 400 or random.random() < self.sample_rate:
+                duration = time.perf_counter() - started
+                ttfb_ms = round(ttfb * 1000, 1) if ttfb is not None else None
+                logger.info(
+                    "%s %s %d %.0fms",
+                    scope["method"],
+                    scope["path"],
+                    status,
+                    duration * 1000,
+                    extra={
+                        "fields": {
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "status": status,
+                            "ttfb_ms": ttfb_ms,
+                            "duration_ms": round(duration * 1000, 1),
+                            "bytes": sent,
+                        }
+                    },
+                )
@@ -1,44 +1,290 @@
-"""Simple in-memory rate limiter based on client IP address."""
+"""Per-IP rate limiting with a sliding-window counter.
 
+Each key keeps two fixed-window counters (current and previous window);
+the previous one is weighted by how much of it still overlaps the sliding
+window. That is O(1) time and constant memory per key, unlike keeping a
+list of timestamps.
+
+Counters live in a pluggable backend: in-process (default), the app's
+shared state (app/shared_state.py) or a Redis-compatible server, so limits
+hold across workers and machines. The arithmetic is in app/sliding_window.py.
+"""
+
+import asyncio
+import logging
+import math
 import time
-from collections import defaultdict
-from typing import NamedTuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 
 from fastapi import HTTPException, Request
 
-from app.config import RATE_LIMIT_PER_MINUTE
+from app import sliding_window
+from app.config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_REDIS_URL,
+)
+from app.metrics import CallbackMetric
+from app.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
 
 _WINDOW_SECONDS = 60
-_CLEANUP_INTERVAL = 300  # clean up stale entries every 5 minutes
+_CLEANUP_INTERVAL = 60
+
+
+class _RateRecord:
+    """Counters for one key: the current fixed window and the one before."""
+
+    __slots__ = ("window", "current", "previous")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.current = 0
+        self.previous = 0
 
+    def roll(self, window: int) -> None:
+        if window == self.window:
+            return
+        self.previous = self.current if window == self.window + 1 else 0
+        self.current = 0
+        self.window = window
 
-class _RateRecord(NamedTuple):
-    timestamps: list[float]
 
+class RateLimitBackend(ABC):
+    """Storage for sliding-window counters."""
 
-_store: dict[str, list[float]] = defaultdict(list)
-_last_cleanup: float = time.time()
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        """Count a request for ``key``.
 
+        Returns 0 if the request is allowed, otherwise the number of seconds
+        the caller should wait before retrying. Denied requests are not
+        counted.
+        """
+
+    async def cleanup(self, window_seconds: float) -> None:
+        """Drop state for keys that have been idle for a full window."""
+
+    def tracked_keys(self) -> int | None:
+        """Number of keys currently held, if the backend can tell cheaply."""
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Process-local counters with a hard cap on tracked keys.
+
+    Records are kept in least-recently-used order, so cleanup only walks
+    the stale prefix and the cap evicts the longest-idle key in O(1).
+    """
 
-def _cleanup() -> None:
-    """Remove entries whose timestamps are all outside the current window."""
-    global _last_cleanup
-    now = time.time()
-    if now - _last_cleanup < _CLEANUP_INTERVAL:
-        return
-    _last_cleanup = now
-    cutoff = now - _WINDOW_SECONDS
-    keys_to_delete = []
-    for key, timestamps in _store.items():
-        # Remove expired timestamps
-        _store[key] = [t for t in timestamps if t > cutoff]
-        if not _store[key]:
-            keys_to_delete.append(key)
-    for key in keys_to_delete:
-        del _store[key]
+    def __init__(self, max_keys: int) -> None:
+        self._max_keys = max(max_keys, 1)
+        self._store: OrderedDict[str, _RateRecord] = OrderedDict()
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        now = time.time()
+        window = int(now // window_seconds)
+        record = self._store.get(key)
+        if record is None:
+            record = _RateRecord(window)
+            self._store[key] = record
+            if len(self._store) > self._max_keys:
+                self._store.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._store.move_to_end(key)
+            record.roll(window)
+
+        fraction = (now % window_seconds) / window_seconds
+        count = sliding_window.sliding_count(record.previous, record.current, fraction)
+        if count >= limit:
+            return sliding_window.retry_after(
+                record.previous, record.current, limit, window_seconds, now
+            )
+        record.current += 1
+        return 0.0
+
+    async def cleanup(self, window_seconds: float) -> None:
+        stale_before = int(time.time() // window_seconds) - 1
+        while self._store:
+            key, record = next(iter(self._store.items()))
+            if record.window >= stale_before:
+                break
+            del self._store[key]
+
+    def tracked_keys(self) -> int | None:
+        return len(self._store)
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Counters in a Redis-compatible server, shared by every instance.
+
+    Each fixed window is one key that expires after two windows. If the
+    server is unreachable requests are allowed (fail open), so a Redis
+    outage cannot take the chat endpoint down.
+    """
+
+    def __init__(self, url: str, prefix: str = "rl:") -> None:
+        # Imported here so the default in-memory setup never loads it.
+        from app.resp_client import RespClient
+
+        self._client = RespClient(url)
+        self._prefix = prefix
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        now = time.time()
+        window = int(now // window_seconds)
+        current_key = f"{self._prefix}{key}:{window}"
+        previous_key = f"{self._prefix}{key}:{window - 1}"
+        ttl_ms = int(window_seconds * 2000)
+        try:
+            current, _, previous = await self._client.pipeline(
+                [
+                    ("INCR", current_key),
+                    ("PEXPIRE", current_key, ttl_ms),
+                    ("GET", previous_key),
+                ]
+            )
+            current = int(current)
+            previous = int(previous or 0)
+        except Exception:
+            logger.warning(
+                "Rate limit backend unavailable, allowing request", exc_info=True
+            )
+            return 0.0
+
+        fraction = (now % window_seconds) / window_seconds
+        # ``current`` already includes this request.
+        if sliding_window.sliding_count(previous, current - 1, fraction) < limit:
+            return 0.0
+        try:
+            await self._client.execute("DECR", current_key)
+        except Exception:
+            logger.debug("Could not undo denied rate limit hit", exc_info=True)
+        return sliding_window.retry_after(
+            previous, current - 1, limit, window_seconds, now
+        )
 
+    async def close(self) -> None:
+        await self._client.close()
 
-def _get_client_ip(request: Request) -> str:
+
+class SharedStateRateLimitBackend(RateLimitBackend):
+    """Counters in a :class:`SharedState`, e.g. a SQLite file for workers.
+
+    Works like the Redis backend, one key per fixed window, and fails open
+    in the same way. The state is owned by the app, so close() leaves it
+    open, and expired windows are dropped by its purge loop.
+    """
+
+    def __init__(self, state: SharedState, prefix: str = "rl:") -> None:
+        self._state = state
+        self._prefix = prefix
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> float:
+        now = time.time()
+        window = int(now // window_seconds)
+        current_key = f"{self._prefix}{key}:{window}"
+        previous_key = f"{self._prefix}{key}:{window - 1}"
+        try:
+            current = await self._state.incr(current_key, ttl=window_seconds * 2)
+            previous = int(await self._state.get(previous_key) or 0)
+        except Exception:
+            logger.warning(
+                "Rate limit backend unavailable, allowing request", exc_info=True
+            )
+            return 0.0
+
+        fraction = (now % window_seconds) / window_seconds
+        if sliding_window.sliding_count(previous, current - 1, fraction) < limit:
+            return 0.0
+        try:
+            await self._state.incr(current_key, -1)
+        except Exception:
+            logger.debug("Could not undo denied rate limit hit", exc_info=True)
+        return sliding_window.retry_after(
+            previous, current - 1, limit, window_seconds, now
+        )
+
+
+class RateLimiter:
+    """Sliding-window rate limiter with background cleanup."""
+
+    def __init__(
+        self, backend: RateLimitBackend, limit: int, window_seconds: float
+    ) -> None:
+        self.backend = backend
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.rejected = 0
+        self._cleanup_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        await self.backend.close()
+
+    async def check(self, key: str) -> float:
+        """Return 0 if ``key`` may proceed, else seconds until it may retry."""
+        retry_after = await self.backend.hit(key, self.limit, self.window_seconds)
+        if retry_after > 0:
+            self.rejected += 1
+        return retry_after
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(_CLEANUP_INTERVAL)
+            try:
+                await self.backend.cleanup(self.window_seconds)
+            except Exception:
+                logger.exception("Rate limit cleanup failed")
+
+
+def _build_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+    if RATE_LIMIT_BACKEND == "shared":
+        return SharedStateRateLimitBackend(shared_state)
+    if RATE_LIMIT_BACKEND != "memory":
+        logger.warning(
+            "Unknown RATE_LIMIT_BACKEND %r, using in-memory backend",
+            RATE_LIMIT_BACKEND,
+        )
+    return InMemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+
+
+limiter = RateLimiter(_build_backend(), RATE_LIMIT_PER_MINUTE, _WINDOW_SECONDS)
+
+CallbackMetric(
+    "rate_limit_rejections_total",
+    "Requests rejected with 429.",
+    lambda: limiter.rejected,
+    type="counter",
+)
+CallbackMetric(
+    "rate_limit_tracked_keys",
+    "Client keys currently tracked by the rate limiter.",
+    lambda: limiter.backend.tracked_keys(),
+)
+
+
+def get_client_ip(request: Request) -> str:
     """Extract client IP from the request, respecting X-Forwarded-For."""
     forwarded = request.headers.get("x-forwarded-for")
     if forwarded:
@@ -52,23 +298,13 @@ async def rate_limit_dependency(request: Request) -> None:
     Raises HTTPException 429 if the client has exceeded the allowed number
     of requests in the current time window.
     """
-    _cleanup()
-
-    client_ip = _get_client_ip(request)
-    now = time.time()
-    cutoff = now - _WINDOW_SECONDS
-
-    # Prune old timestamps for this client
-    timestamps = _store[client_ip]
-    _store[client_ip] = [t for t in timestamps if t > cutoff]
-
-    if len(_store[client_ip]) >= RATE_LIMIT_PER_MINUTE:
+    retry_after = await limiter.check(get_client_ip(request))
+    if retry_after > 0:
         raise HTTPException(
             status_code=429,
             detail=(
                 f"Rate limit exceeded. Maximum {RATE_LIMIT_PER_MINUTE} "
                 f"requests per minute."
             ),
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
         )
-
-    _store[client_ip].append(now)
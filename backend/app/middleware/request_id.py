@@ -0,0 +1,51 @@
+"""Request ids for every HTTP request.
+
+The id comes from the client's ``X-Request-Id`` header when it is a
+reasonable token, otherwise a new one is generated. It is stored in
+:data:`app.tracing.request_id` for the rest of the request (including the
+tasks that produce a streamed response) and echoed in the response.
+"""
+
+import re
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import tracing
+
+_HEADER = b"x-request-id"
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware, so streamed responses are not buffered."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == _HEADER:
+                candidate = value.decode("latin-1")
+                if _VALID_ID.match(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+        tracing.request_id.set(request_id)
+        tracing.session_id.set(None)
+        encoded = request_id.encode()
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((_HEADER, encoded))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
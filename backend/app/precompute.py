@@ -0,0 +1,143 @@
+"""Precompute agent answers for common questions.
+
+    python -m app.precompute questions.txt
+    python -m app.precompute questions.txt -o /tmp/answers.snapshot -c 3
+
+Runs every question (one per line; blank lines and ``#`` comments are
+skipped) through the agent with the options the API uses, at most
+--concurrency at a time, and writes the successful answers to the
+PRECOMPUTED_ANSWERS snapshot (see app/services/precomputed.py). The
+snapshot is keyed by the current prompt and knowledge version, so it has
+to be rebuilt whenever data/ changes; the API ignores a stale one.
+
+Exits with status 1 if any question failed.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from app.agent.runner import AgentRunner, answer_version, create_lifecycle
+from app.config import (
+    AGENT_MAX_TURNS,
+    AGENT_RUN_TIMEOUT,
+    BUDGET_WINDOW,
+    MODEL_NAME,
+    PRECOMPUTED_ANSWERS,
+)
+from app.services import sse
+from app.services.admission import AdmissionController
+from app.services.budget import BudgetPolicy, build_profiles
+from app.services.precomputed import snapshot_path, write_snapshot
+from app.shared_state import MemoryState
+
+logger = logging.getLogger("app.precompute")
+
+
+def read_questions(path: Path) -> list[str]:
+    questions = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and line not in questions:
+            questions.append(line)
+    return questions
+
+
+def _create_runner(concurrency: int) -> AgentRunner:
+    """A runner on fresh clients that always uses the full profile."""
+    admission = AdmissionController(
+        max_concurrent=concurrency, max_queue=0, timeout=AGENT_RUN_TIMEOUT
+    )
+    profiles = build_profiles(AGENT_MAX_TURNS, AGENT_MAX_TURNS, MODEL_NAME, "")
+    budget = BudgetPolicy(
+        MemoryState(),
+        profiles,
+        window=BUDGET_WINDOW,
+        global_tokens=0,
+        per_client_tokens=0,
+        reduce_at=1.0,
+        economy_at=1.0,
+        adaptive=False,
+    )
+    return AgentRunner(create_lifecycle("per_request"), admission, budget)
+
+
+async def _answer(
+    runner: AgentRunner, question: str, slots: asyncio.Semaphore
+) -> bytes | None:
+    async with slots:
+        started = time.perf_counter()
+        frames = [
+            frame
+            async for frame in runner.stream(question, f"precompute-{uuid.uuid4()}")
+            if not sse.is_type(frame, "queued")
+        ]
+    elapsed = time.perf_counter() - started
+    if any(sse.is_type(frame, "error") for frame in frames):
+        logger.warning("Failed (%.1fs): %s", elapsed, question)
+        return None
+    logger.info("Answered (%.1fs): %s", elapsed, question)
+    return sse.batch(frames)
+
+
+async def precompute(questions: list[str], output: Path, concurrency: int) -> int:
+    """Answer ``questions`` and write the snapshot; returns the failures."""
+    version = answer_version()
+    runner = _create_runner(concurrency)
+    slots = asyncio.Semaphore(concurrency)
+    await runner.start()
+    try:
+        answers = await asyncio.gather(
+            *(_answer(runner, question, slots) for question in questions)
+        )
+    finally:
+        await runner.close()
+
+    done = {q: a for q, a in zip(questions, answers) if a is not None}
+    written = write_snapshot(output, version, done)
+    logger.info(
+        "Wrote %d answers for version %s to %s", written, version, output
+    )
+    return len(questions) - len(done)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.precompute",
+        description="Precompute agent answers into a snapshot the API serves.",
+    )
+    parser.add_argument("questions", type=Path, help="file with one question per line")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=snapshot_path(PRECOMPUTED_ANSWERS),
+        help="snapshot to write (default: PRECOMPUTED_ANSWERS)",
+    )
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=2, help="agent runs at once"
+    )
+    args = parser.parse_args(argv)
+    if args.output is None:
+        parser.error("PRECOMPUTED_ANSWERS is empty; pass --output")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Same as app.main: the SDK subprocess must not think it is nested.
+    os.environ.pop("CLAUDECODE", None)
+
+    questions = read_questions(args.questions)
+    if not questions:
+        sys.exit(f"No questions in {args.questions}")
+    failed = asyncio.run(
+        precompute(questions, args.output, max(args.concurrency, 1))
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
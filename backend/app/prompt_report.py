@@ -0,0 +1,44 @@
+"""Report the size of the system prompt, section by section.
+
+    python -m app.prompt_report
+
+Prints the full and the slim prompt (the one degraded runs use) with the
+approximate token count of every section. Sections marked static do not
+depend on data/, so together they form the prefix of the prompt that stays
+byte-identical when the resume changes.
+"""
+
+import argparse
+
+from app.agent.system_prompt import PromptSnapshot, build_snapshot
+
+
+def format_report(name: str, snapshot: PromptSnapshot) -> str:
+    lines = [
+        f"{name} prompt  version {snapshot.version}  "
+        f"~{snapshot.tokens:,} tokens ({len(snapshot.text):,} chars)",
+        f"  {'section':<12} {'chars':>7} {'~tokens':>8} {'share':>6}  static",
+    ]
+    for section in snapshot.sections:
+        share = section.tokens / snapshot.tokens if snapshot.tokens else 0.0
+        lines.append(
+            f"  {section.name:<12} {len(section.text):>7,} {section.tokens:>8,} "
+            f"{share:>6.0%}  {'yes' if section.static else 'no'}"
+        )
+    lines.append(f"  stable prefix: ~{snapshot.static_tokens:,} tokens")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.prompt_report",
+        description="Show the approximate token count of each system prompt section.",
+    )
+    parser.parse_args(argv)
+    print(format_report("full", build_snapshot(slim=False)))
+    print()
+    print(format_report("slim", build_snapshot(slim=True)))
+
+
+if __name__ == "__main__":
+    main()
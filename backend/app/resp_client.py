@@ -0,0 +1,129 @@
+"""Minimal asyncio client for the Redis serialization protocol (RESP).
+
+Only what the shared-state backends need: a single connection, pipelined
+commands and the RESP2 reply types. Works against Redis, Valkey, Upstash
+and other Redis-compatible servers; ``rediss://`` URLs connect over TLS.
+"""
+
+import asyncio
+import ssl
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """Error reply returned by the server."""
+
+
+def _encode(args: tuple) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+class RespClient:
+    """Single-connection RESP client. Commands are serialized by a lock."""
+
+    def __init__(self, url: str, timeout: float = 2.0) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported URL scheme: {parsed.scheme!r}")
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._tls = parsed.scheme == "rediss"
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout
+
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+    async def execute(self, *args) -> object:
+        """Run one command and return its reply."""
+        (reply,) = await self.pipeline([args])
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def pipeline(self, commands: list[tuple]) -> list[object]:
+        """Send several commands in one write and read all replies.
+
+        Error replies are returned in place as RespError instances.
+        """
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._roundtrip(commands), self._timeout)
+            except BaseException:
+                await self._reset()
+                raise
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._reset()
+
+    async def _roundtrip(self, commands: list[tuple]) -> list[object]:
+        if self._writer is None:
+            await self._connect()
+        self._writer.write(b"".join(_encode(tuple(c)) for c in commands))
+        await self._writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    async def _connect(self) -> None:
+        context = ssl.create_default_context() if self._tls else None
+        self._reader, self._writer = await asyncio.open_connection(
+            self._host, self._port, ssl=context
+        )
+        setup: list[tuple] = []
+        if self._password is not None:
+            if self._username:
+                setup.append(("AUTH", self._username, self._password))
+            else:
+                setup.append(("AUTH", self._password))
+        if self._db:
+            setup.append(("SELECT", self._db))
+        for command in setup:
+            self._writer.write(_encode(command))
+        await self._writer.drain()
+        for _ in setup:
+            reply = await self._read_reply()
+            if isinstance(reply, RespError):
+                raise reply
+
+    async def _reset(self) -> None:
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_reply(self) -> object:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode("utf-8")
+        if prefix == b"-":
+            return RespError(body.decode("utf-8"))
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(body)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply prefix: {prefix!r}")
@@ -1,98 +1,515 @@
-import json
 import logging
-from typing import AsyncGenerator
+import math
+import os
+from typing import AsyncGenerator, AsyncIterator
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from claude_agent_sdk import (
-    ClaudeSDKClient,
-    ClaudeAgentOptions,
-    AssistantMessage,
-    ResultMessage,
-    TextBlock,
+from app import tracing
+from app.agent import knowledge
+from app.agent.runner import (
+    AgentRunner,
+    OptionsVersion,
+    answer_version,
+    create_runner,
+    is_cacheable,
 )
-from app.agent.system_prompt import get_system_prompt
-from app.agent.tools import info_tools_server
-from app.middleware.rate_limit import rate_limit_dependency
+from app.agent.system_prompt import add_reload_listener
+from app.config import (
+    COALESCE_REQUESTS,
+    FAQ_ENABLED,
+    FAQ_MIN_CONFIDENCE,
+    PRECOMPUTED_ANSWERS,
+    RESPONSE_CACHE_FUZZY,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL,
+    SESSION_IDLE_TTL,
+    SSE_HEARTBEAT_INTERVAL,
+    SSE_RETRY_MS,
+    STREAM_RESUME,
+    STREAM_RESUME_GRACE,
+    STREAM_RESUME_MAX_FRAMES,
+    STREAM_RESUME_TTL,
+)
+from app.metrics import CallbackMetric, Counter
+from app.middleware.rate_limit import get_client_ip, rate_limit_dependency
+from app.services import sse
+from app.services.cancellation import stream_until_disconnect
+from app.services.coalesce import SingleFlight
+from app.services.faq import INTENTS, FaqMatch, FaqRouter
+from app.services.precomputed import PrecomputedAnswers, snapshot_path
+from app.services.response_cache import ResponseCache, normalize_message
+from app.services.resumable import (
+    ResumableStreams,
+    StreamGapError,
+    StreamNotFoundError,
+    parse_event_id,
+)
+from app.services.session_registry import (
+    INSTANCE_ID,
+    SessionRegistry,
+    worker_alive,
+)
+from app.shared_state import shared_state
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_RESPONSES = Counter(
+    "chat_responses_total", "Chat responses by where they were served from.", ["source"]
+)
+_STREAM_BYTES = Counter("chat_stream_bytes_total", "SSE bytes sent to chat clients.")
+_AFFINITY = Counter(
+    "session_affinity_total",
+    "Session turns by where they ran (local, replayed, taken_over, busy).",
+    ["result"],
+)
+
+_RETRY_HINT = sse.retry(SSE_RETRY_MS)
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str
 
 
-async def _stream_agent(message: str) -> AsyncGenerator[bytes, None]:
-    """Stream SSE events from the Claude Agent SDK.
+agent_runner = create_runner()
+
+
+def get_agent_runner() -> AgentRunner:
+    """FastAPI dependency returning the agent runner (override in tests)."""
+    return agent_runner
+
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    ttl=RESPONSE_CACHE_TTL,
+    fuzzy=RESPONSE_CACHE_FUZZY,
+    # The in-process state would only duplicate the local cache.
+    shared=shared_state if shared_state.shared else None,
+)
+add_reload_listener(lambda _snapshot: response_cache.clear())
+knowledge.add_reload_listener(lambda _index: response_cache.clear())
+
+precomputed = PrecomputedAnswers(
+    snapshot_path(PRECOMPUTED_ANSWERS), fuzzy=RESPONSE_CACHE_FUZZY
+)
+
+inflight = SingleFlight()
+
+faq = FaqRouter(INTENTS, FAQ_MIN_CONFIDENCE)
+
+session_registry = SessionRegistry(shared_state, SESSION_IDLE_TTL)
 
-    Uses explicit connect()/disconnect() lifecycle (not async-with)
-    following the pattern from ai-oncall-bots. This avoids event-loop
-    conflicts when running inside uvicorn.
+streams = ResumableStreams(
+    max_frames=STREAM_RESUME_MAX_FRAMES,
+    ttl=STREAM_RESUME_TTL,
+    grace=STREAM_RESUME_GRACE,
+)
+
+CallbackMetric(
+    "agent_pool_clients",
+    "Agent pool state (size, live, idle, waiters).",
+    lambda: {(k,): v for k, v in agent_runner.lifecycle.pool.stats().items()},
+    labelnames=["state"],
+)
+CallbackMetric(
+    "chat_sessions",
+    "Live multi-turn chat sessions.",
+    lambda: agent_runner.lifecycle.session_count,
+)
+CallbackMetric(
+    "chat_session_evictions_total",
+    "Chat sessions evicted, by reason (lru, idle, memory).",
+    lambda: {(k,): v for k, v in agent_runner.lifecycle.session_evictions.items()},
+    type="counter",
+    labelnames=["reason"],
+)
+CallbackMetric(
+    "response_cache",
+    "Response cache entries, bytes and hit/miss/eviction counts.",
+    lambda: {(k,): v for k, v in response_cache.stats().items()},
+    labelnames=["stat"],
+)
+CallbackMetric(
+    "precomputed_answers",
+    "Precomputed answer snapshot entries, hits, misses and whether it is stale.",
+    lambda: {(k,): v for k, v in precomputed.stats().items()},
+    labelnames=["stat"],
+)
+CallbackMetric(
+    "coalesce",
+    "In-flight coalesced runs and subscriber counts.",
+    lambda: {(k,): v for k, v in inflight.stats().items()},
+    labelnames=["stat"],
+)
+CallbackMetric(
+    "faq_requests_total",
+    "Messages checked by the FAQ fast path, by result and intent.",
+    faq.stats,
+    type="counter",
+    labelnames=["result", "intent"],
+)
+CallbackMetric(
+    "faq_hit_ratio",
+    "Share of checked messages answered by the FAQ path.",
+    lambda: faq.hit_rate,
+)
+CallbackMetric(
+    "faq_min_confidence",
+    "Similarity an FAQ intent needs to answer without the agent.",
+    lambda: faq.min_confidence,
+)
+CallbackMetric(
+    "resumable_streams",
+    "Resumable streams (live, retained) and started/resumed/abandoned counts.",
+    lambda: {(k,): v for k, v in streams.stats().items()},
+    labelnames=["stat"],
+)
+CallbackMetric(
+    "admission",
+    "Admission controller state (active, queued) and counters.",
+    lambda: {(k,): v for k, v in agent_runner.admission.stats().items()},
+    labelnames=["stat"],
+)
+
+
+async def _run_agent(
+    runner: AgentRunner,
+    message: str,
+    session_id: str,
+    client_key: str,
+    version: str,
+    cacheable: bool,
+) -> AsyncGenerator[bytes, None]:
+    """Run the agent and store a successful response in the cache.
+
+    Only answers from a client connected with the full budget profile on
+    the current prompt are cached (see runner.is_cacheable), so degraded
+    answers are not served in place of full ones once the pressure is gone.
     """
-    options = ClaudeAgentOptions(
-        system_prompt=get_system_prompt(),
-        max_turns=3,
-        mcp_servers={"info": info_tools_server},
-        allowed_tools=[
-            "mcp__info__get_github_repos",
-            "mcp__info__get_project_details",
-            "mcp__info__get_resume",
-        ],
-        permission_mode="bypassPermissions",
+    versions: list[OptionsVersion] = []
+    frames: list[bytes] = []
+    async for frame in runner.stream(message, session_id, client_key, versions.append):
+        if cacheable and not sse.is_type(frame, "queued"):
+            frames.append(frame)
+        yield frame
+
+    full = bool(versions) and is_cacheable(versions[0])
+    if cacheable and full and not any(sse.is_type(f, "error") for f in frames):
+        await response_cache.store(message, version, frames)
+
+
+def _match_faq(message: str, first_turn: bool) -> FaqMatch | None:
+    """Return a templated answer for a first-turn FAQ-class question."""
+    if not FAQ_ENABLED or not first_turn:
+        return None
+    match = faq.match(message)
+    if match is not None:
+        logger.debug("FAQ hit %s (%.2f)", match.intent, match.confidence)
+    return match
+
+
+def _served_from(source: str) -> None:
+    _RESPONSES.inc(source)
+    span = tracing.current_span()
+    if span is not None:
+        span.set(source=source)
+
+
+async def _traced(
+    frames: AsyncIterator[bytes], root: tracing.Span
+) -> AsyncGenerator[bytes, None]:
+    """End the request's root span once its stream is finished."""
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        root.end()
+
+
+async def _stream_faq(match: FaqMatch) -> AsyncGenerator[bytes, None]:
+    _served_from("faq")
+    frame = sse.batch((sse.text(match.answer), sse.DONE))
+    _STREAM_BYTES.inc(amount=len(frame))
+    yield frame
+
+
+def _flight_key(message: str, version: str) -> str:
+    return f"{version}\x00{normalize_message(message)}"
+
+
+def _joinable(message: str, first_turn: bool) -> bool:
+    """True if the turn would join a run in flight rather than start one."""
+    if not COALESCE_REQUESTS or not first_turn:
+        return False
+    return _flight_key(message, answer_version()) in inflight
+
+
+async def _coalesced(
+    runner: AgentRunner,
+    message: str,
+    session_id: str,
+    client_key: str,
+    version: str,
+) -> AsyncGenerator[bytes, None]:
+    """Join the identical first-turn run in flight, or start one.
+
+    The run belongs to the session that started it. A session that joined
+    gets the complete answer recorded instead.
+    """
+    joined: list[bool] = []
+
+    def on_join(follower: bool) -> None:
+        joined.append(follower)
+        _served_from("coalesced" if follower else "agent")
+
+    sent: list[bytes] = []
+    async for frame in inflight.stream(
+        _flight_key(message, version),
+        lambda: _run_agent(runner, message, session_id, client_key, version, True),
+        on_join,
+    ):
+        if joined[0]:
+            sent.append(frame)
+        yield frame
+    if joined[0] and not any(sse.is_type(f, "error") for f in sent):
+        runner.record(session_id, message, sse.text_content(sse.batch(sent)))
+
+
+async def _stream_chat(
+    runner: AgentRunner,
+    message: str,
+    session_id: str,
+    client_key: str,
+    first_turn: bool,
+) -> AsyncGenerator[bytes, None]:
+    """Serve a chat turn from a stored answer or a (coalesced) agent run.
+
+    Stored answers come from the response cache, then from the precomputed
+    snapshot. Only the first turn of a session is cacheable or coalesced;
+    follow-ups depend on the conversation so far. Identical first-turn
+    questions that arrive while a run is in flight attach to that run
+    instead of starting their own. Responses containing an error are never
+    stored.
+
+    Cached and precomputed answers and answers shared from another
+    session's run are recorded in the session, so the agent sees them with
+    its next turn.
+    """
+    version = answer_version()
+    if first_turn:
+        cached = await response_cache.fetch(message, version)
+        if cached is not None:
+            _served_from("cache")
+            runner.record(session_id, message, sse.text_content(sse.batch(cached)))
+            for frame in cached:
+                _STREAM_BYTES.inc(amount=len(frame))
+                yield frame
+            return
+        answer = precomputed.get(message, version)
+        if answer is not None:
+            _served_from("precomputed")
+            runner.record(session_id, message, sse.text_content(answer))
+            _STREAM_BYTES.inc(amount=len(answer))
+            yield answer
+            return
+
+    if first_turn and COALESCE_REQUESTS:
+        run = _coalesced(runner, message, session_id, client_key, version)
+    else:
+        _served_from("agent")
+        run = _run_agent(
+            runner, message, session_id, client_key, version, first_turn
+        )
+
+    async for frame in run:
+        _STREAM_BYTES.inc(amount=len(frame))
+        yield frame
+
+
+async def _session_affinity(
+    http_request: Request, session_id: str, headers: dict[str, str]
+) -> tuple[Response | None, bool]:
+    """Route a session turn to the worker holding the session.
+
+    Returns the response to send instead of serving the turn (a Fly replay
+    to the owner's machine, or 503 while another local worker holds it),
+    and whether the session moved here from another worker. The session is
+    only taken over when its owner is gone. The owning worker is
+    reported in ``X-Session-Worker`` as a routing hint.
+    """
+    affinity = await session_registry.locate(session_id)
+    headers["X-Session-Worker"] = affinity.owner
+    if not affinity.moved:
+        _AFFINITY.inc("local")
+        return None, False
+
+    if affinity.instance == INSTANCE_ID:
+        if worker_alive(affinity.pid):
+            # Another live worker on this machine, which no proxy can route
+            # to (app.serve runs one worker per machine with sessions on).
+            # Leave it the session rather than drop its conversation.
+            _AFFINITY.inc("busy")
+            logger.warning(
+                "Session %s is held by worker %s on this machine",
+                session_id,
+                affinity.owner,
+            )
+            busy = Response(status_code=503, headers={"Retry-After": "1"})
+            return busy, False
+    # fly-replay-src marks a request the proxy already replayed once; if it
+    # still missed the owner, that machine is gone and this one takes over.
+    elif os.getenv("FLY_MACHINE_ID") and "fly-replay-src" not in http_request.headers:
+        _AFFINITY.inc("replayed")
+        replay = Response(
+            status_code=307, headers={"fly-replay": f"instance={affinity.instance}"}
+        )
+        return replay, False
+
+    _AFFINITY.inc("taken_over")
+    logger.info("Session %s moved from %s", session_id, affinity.owner)
+    await session_registry.take_over(session_id)
+    headers["X-Session-Worker"] = session_registry.worker_id
+    return None, True
+
+
+def _sse_response(
+    http_request: Request, frames: AsyncIterator[bytes], headers: dict[str, str]
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_until_disconnect(
+            http_request,
+            frames,
+            heartbeat=SSE_HEARTBEAT_INTERVAL or None,
+            preamble=_RETRY_HINT,
+        ),
+        media_type="text/event-stream",
+        headers={**_SSE_HEADERS, **headers},
     )
 
-    client = ClaudeSDKClient(options=options)
 
+def _resume(stream_id: str, after: int) -> AsyncIterator[bytes]:
     try:
-        await client.connect()
-        await client.query(message)
-
-        async for msg in client.receive_response():
-            if isinstance(msg, AssistantMessage):
-                for block in msg.content:
-                    if isinstance(block, TextBlock):
-                        data = json.dumps({"type": "text", "content": block.text})
-                        yield f"data: {data}\n\n".encode()
-            elif isinstance(msg, ResultMessage):
-                if msg.is_error:
-                    data = json.dumps(
-                        {"type": "error", "content": msg.result or "Unknown error"}
-                    )
-                    yield f"data: {data}\n\n".encode()
-                break
-
-    except Exception as e:
-        logger.exception("Error in agent")
-        data = json.dumps({"type": "error", "content": str(e)})
-        yield f"data: {data}\n\n".encode()
+        return streams.read(stream_id, after)
+    except StreamNotFoundError:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream.")
+    except StreamGapError:
+        raise HTTPException(
+            status_code=410, detail="Missed events are no longer available."
+        )
 
-    finally:
-        try:
-            await client.disconnect()
-        except Exception:
-            pass
 
-    done = json.dumps({"type": "done"})
-    yield f"data: {done}\n\n".encode()
+@router.get("/api/chat/stream/{stream_id}")
+async def resume_chat(
+    stream_id: str,
+    http_request: Request,
+    last_event_id: str | None = Header(default=None),
+):
+    """Replay a chat stream after ``Last-Event-ID``, then follow it live.
+
+    Without the header the stream is replayed from the start. This never
+    starts an agent run, so it is not rate limited.
+    """
+    after = 0
+    if last_event_id:
+        try:
+            event_stream, seq = parse_event_id(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Malformed Last-Event-ID.")
+        if event_stream == stream_id:
+            after = seq
+    frames = _resume(stream_id, after)
+    return _sse_response(http_request, frames, {"X-Stream-Id": stream_id})
 
 
 @router.post("/api/chat")
 async def chat(
     request: ChatRequest,
+    http_request: Request,
     _rate_limit: None = Depends(rate_limit_dependency),
+    runner: AgentRunner = Depends(get_agent_runner),
 ):
-    """Stream a chat response as Server-Sent Events."""
-    return StreamingResponse(
-        _stream_agent(request.message),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
+    """Stream a chat response as Server-Sent Events.
+
+    FAQ-class questions are answered from a template without the agent, so
+    they are served even while the agent is at capacity or the client is
+    over its token budget. Questions that join an identical run in flight
+    take no agent slot either and are served while it is at capacity. With
+    shared state, follow-up turns are routed to the worker that holds the
+    session.
+
+    Agent runs are resumable: a retry carrying ``Last-Event-ID`` gets the
+    rest of the stream it lost instead of a new run.
+    """
+    tracing.session_id.set(request.session_id)
+    last_event_id = http_request.headers.get("last-event-id")
+    if STREAM_RESUME and last_event_id:
+        try:
+            stream_id, seq = parse_event_id(last_event_id)
+            frames = streams.read(stream_id, seq)
+        except (ValueError, StreamNotFoundError, StreamGapError):
+            logger.info("Cannot resume from %r, starting a new run", last_event_id)
+        else:
+            return _sse_response(http_request, frames, {"X-Stream-Id": stream_id})
+
+    headers: dict[str, str] = {}
+    moved = False
+    if shared_state.shared and runner.sticky:
+        routed, moved = await _session_affinity(
+            http_request, request.session_id, headers
+        )
+        if routed is not None:
+            return routed
+
+    root = tracing.start_trace(
+        "chat",
+        http_request.headers.get("traceparent"),
+        session_id=request.session_id,
+        message_chars=len(request.message),
     )
+    # A session that moved here has history this worker cannot see.
+    first_turn = not moved and not runner.has_history(request.session_id)
+    client_key = get_client_ip(http_request)
+    match = _match_faq(request.message, first_turn)
+    if match is not None:
+        # The agent sees the templated answer with the session's next turn.
+        runner.record(request.session_id, request.message, match.answer)
+        frames = _stream_faq(match)
+    elif retry_after := await runner.budget.check(client_key):
+        root.fail("over budget")
+        root.end()
+        raise HTTPException(
+            status_code=429,
+            detail="Token budget exceeded. Please try again later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+    elif runner.busy and not _joinable(request.message, first_turn):
+        root.fail("busy")
+        root.end()
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy. Please try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+    else:
+        frames = _stream_chat(
+            runner, request.message, request.session_id, client_key, first_turn
+        )
+    if root:
+        frames = _traced(frames, root)
+    if match is None and STREAM_RESUME:
+        stream_id = streams.start(frames)
+        headers["X-Stream-Id"] = stream_id
+        frames = streams.read(stream_id)
+    return _sse_response(http_request, frames, headers)
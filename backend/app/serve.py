@@ -0,0 +1,78 @@
+"""Start the API server with the configured number of workers.
+
+    python -m app.serve
+
+Runs ``app.main:app`` on PORT (default 8080) with WEB_CONCURRENCY worker
+processes, under uvicorn's own supervisor or, with SERVER=gunicorn, under
+gunicorn with uvicorn workers (``pip install .[gunicorn]``). More than one
+worker needs SHARED_STATE_URL set to a sqlite:// or redis:// URL so rate
+limits, cached answers and session routing agree across the workers.
+
+With multi-turn sessions (AGENT_LIFECYCLE=session, SESSION_MAX above 0) a
+conversation lives in one worker process, and the Fly proxy can route a
+follow-up to a machine but not to a worker on it. WEB_CONCURRENCY is then
+ignored and each machine runs one worker; scale out with machines.
+"""
+
+import logging
+import os
+import shutil
+import sys
+
+from app.config import (
+    AGENT_LIFECYCLE,
+    SERVER,
+    SESSION_MAX,
+    SHARED_STATE_URL,
+    WEB_CONCURRENCY,
+)
+
+logger = logging.getLogger("app.serve")
+
+_APP = "app.main:app"
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    host = os.getenv("HOST", "0.0.0.0")
+    port = os.getenv("PORT", "8080")
+    workers = max(WEB_CONCURRENCY, 1)
+    if workers > 1 and AGENT_LIFECYCLE == "session" and SESSION_MAX > 0:
+        logger.warning(
+            "WEB_CONCURRENCY=%d ignored: sessions are pinned to one worker per "
+            "machine (AGENT_LIFECYCLE=session)",
+            workers,
+        )
+        workers = 1
+    if workers > 1 and SHARED_STATE_URL.startswith("memory"):
+        logger.warning(
+            "WEB_CONCURRENCY=%d with in-process shared state: rate limits, "
+            "cached answers and sessions are per worker",
+            workers,
+        )
+
+    if SERVER == "gunicorn":
+        gunicorn = shutil.which("gunicorn")
+        if gunicorn is None:
+            sys.exit("SERVER=gunicorn but gunicorn is not installed")
+        os.execv(
+            gunicorn,
+            [
+                gunicorn,
+                _APP,
+                "--worker-class", "uvicorn.workers.UvicornWorker",
+                "--workers", str(workers),
+                "--bind", f"{host}:{port}",
+                "--graceful-timeout", "30",
+            ],
+        )
+    if SERVER != "uvicorn":
+        logger.warning("Unknown SERVER %r, using uvicorn", SERVER)
+
+    import uvicorn
+
+    uvicorn.run(_APP, host=host, port=int(port), workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Admission control for agent runs.
+
+Every agent run holds a CLI subprocess, so the number of concurrent runs
+is capped regardless of which client IP they come from. Requests over the
+cap wait in a bounded FIFO queue; when the queue is full they are shed
+before the response starts, and a queued request gives up after a timeout.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from app.metrics import Histogram
+
+_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time requests spent waiting for a run slot."
+)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when the wait queue is full or the wait timed out."""
+
+
+@dataclass
+class Ticket:
+    """A request's place in line; ``admitted`` resolves when it may run."""
+
+    admitted: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    enqueued_at: float = field(default_factory=time.monotonic)
+    released: bool = False
+
+
+class AdmissionController:
+    """Concurrency cap plus bounded FIFO wait queue."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, timeout: float) -> None:
+        self._max_concurrent = max(max_concurrent, 1)
+        self._max_queue = max(max_queue, 0)
+        self._timeout = timeout
+
+        self._active = 0
+        self._queue: deque[Ticket] = deque()
+        self._changed = asyncio.Event()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def full(self) -> bool:
+        """True when a new request could neither run nor wait."""
+        return (
+            self._active >= self._max_concurrent
+            and len(self._queue) >= self._max_queue
+        )
+
+    @property
+    def queue_fill(self) -> float:
+        """Share of the wait queue in use; 1.0 once requests are shed."""
+        if self._max_queue == 0:
+            return 1.0 if self._active >= self._max_concurrent else 0.0
+        return len(self._queue) / self._max_queue
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "active": self._active,
+            "queued": len(self._queue),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+    def enqueue(self) -> Ticket:
+        """Take a place in line, raising AdmissionRejectedError if full."""
+        ticket = Ticket()
+        if self._active < self._max_concurrent and not self._queue:
+            self._admit(ticket)
+        elif len(self._queue) >= self._max_queue:
+            self.rejected += 1
+            raise AdmissionRejectedError("The assistant is busy")
+        else:
+            self._queue.append(ticket)
+        return ticket
+
+    async def wait(self, ticket: Ticket) -> AsyncIterator[int]:
+        """Wait until ``ticket`` is admitted, yielding each new queue position.
+
+        Raises AdmissionRejectedError if the wait exceeds the timeout.
+        """
+        deadline = ticket.enqueued_at + self._timeout
+        last_position = None
+        while not ticket.admitted.done():
+            position = self._queue.index(ticket) + 1
+            if position != last_position:
+                last_position = position
+                yield position
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out += 1
+                self.release(ticket)
+                raise AdmissionRejectedError("Timed out waiting for the assistant")
+            changed = asyncio.ensure_future(self._changed.wait())
+            try:
+                await asyncio.wait(
+                    {ticket.admitted, changed},
+                    timeout=remaining,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                changed.cancel()
+
+    def release(self, ticket: Ticket) -> None:
+        """Give up the ticket's slot, or its place in line if not admitted."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted.done():
+            self._active -= 1
+            if self._queue:
+                self._admit(self._queue.popleft())
+        else:
+            ticket.admitted.cancel()
+            self._queue.remove(ticket)
+        self._notify()
+
+    def _admit(self, ticket: Ticket) -> None:
+        self._active += 1
+        self.admitted += 1
+        waited = time.monotonic() - ticket.enqueued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        _WAIT_SECONDS.observe(waited)
+        ticket.admitted.set_result(None)
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
@@ -0,0 +1,278 @@
+"""Adaptive token budgets for agent runs.
+
+Every run's usage (from its ResultMessage) is charged to a rolling global
+budget and to the budget of the client IP that started it. Rolling usage
+is a sliding-window counter like the rate limiter's: one key per fixed
+window in the app's shared state, the previous window weighted by how much
+of it still overlaps.
+
+Budget use and admission queue fill are turned into a pressure between 0
+and 1, which picks the profile new agent clients are connected with:
+
+- ``full``: AGENT_MAX_TURNS turns with the configured prompt and model,
+- ``reduced``: BUDGET_REDUCED_MAX_TURNS turns with the slim prompt,
+- ``economy``: as ``reduced``, on BUDGET_ECONOMY_MODEL if one is set.
+
+Pressure moves to a cheaper profile at once, but only back to a fuller one
+after it has dropped well below the threshold and the current profile has
+been in use for a while, so the pool is not flushed on every run.
+
+A client IP over its own budget is refused agent runs until its rolling
+usage drops again.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app import sliding_window
+from app.config import (
+    AGENT_MAX_TURNS,
+    BUDGET_ADAPTIVE,
+    BUDGET_ECONOMY_AT,
+    BUDGET_ECONOMY_MODEL,
+    BUDGET_GLOBAL_TOKENS,
+    BUDGET_PER_IP_TOKENS,
+    BUDGET_REDUCE_AT,
+    BUDGET_REDUCED_MAX_TURNS,
+    BUDGET_WINDOW,
+    MODEL_NAME,
+    SLIM_PROMPT,
+)
+from app.metrics import CallbackMetric
+from app.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_INTERVAL = 1.0
+_MIN_DWELL = 30.0
+_RECOVERY = 0.8
+_CACHE_READ_WEIGHT = 0.1
+
+
+@dataclass(frozen=True)
+class RunProfile:
+    """Agent options that trade answer depth for latency and spend."""
+
+    name: str
+    level: int
+    max_turns: int
+    slim_prompt: bool
+    model: str | None
+
+
+def build_profiles(
+    max_turns: int, reduced_turns: int, model: str, economy_model: str
+) -> tuple[RunProfile, RunProfile, RunProfile]:
+    max_turns = max(max_turns, 1)
+    reduced_turns = min(max(reduced_turns, 1), max_turns)
+    return (
+        RunProfile("full", 0, max_turns, SLIM_PROMPT, model or None),
+        RunProfile("reduced", 1, reduced_turns, True, model or None),
+        RunProfile("economy", 2, reduced_turns, True, economy_model or model or None),
+    )
+
+
+def billable_tokens(usage: dict | None) -> int:
+    """Tokens a run counts against budgets; cache reads count a tenth."""
+    usage = usage or {}
+
+    def get(name: str) -> float:
+        value = usage.get(name)
+        return value if isinstance(value, (int, float)) else 0
+
+    return int(
+        get("input_tokens")
+        + get("output_tokens")
+        + get("cache_creation_input_tokens")
+        + _CACHE_READ_WEIGHT * get("cache_read_input_tokens")
+    )
+
+
+class BudgetPolicy:
+    """Rolling token budgets and the run profile they call for."""
+
+    def __init__(
+        self,
+        state: SharedState,
+        profiles: tuple[RunProfile, RunProfile, RunProfile],
+        window: float,
+        global_tokens: int,
+        per_client_tokens: int,
+        reduce_at: float,
+        economy_at: float,
+        adaptive: bool = True,
+        prefix: str = "budget:",
+    ) -> None:
+        self._state = state
+        self._profiles = profiles
+        self._window = max(window, 1.0)
+        self._global_tokens = max(global_tokens, 0)
+        self._per_client_tokens = max(per_client_tokens, 0)
+        self._reduce_at = reduce_at
+        self._economy_at = max(economy_at, reduce_at)
+        self._adaptive = adaptive
+        self._prefix = prefix
+
+        self._profile = profiles[0]
+        self._changed_at = time.monotonic()
+        self._refreshed_at = 0.0
+        self._global_used = 0.0
+        self._load = 0.0
+        self._listeners: list[Callable[[RunProfile], None]] = []
+
+        self.charged_tokens = 0
+        self.charged_cost_usd = 0.0
+        self.rejected = 0
+        self.profile_changes = 0
+
+    @property
+    def profile(self) -> RunProfile:
+        return self._profile
+
+    @property
+    def pressure(self) -> float:
+        used = self._global_used / self._global_tokens if self._global_tokens else 0.0
+        return max(min(used, 1.0), self._load)
+
+    def add_listener(self, callback: Callable[[RunProfile], None]) -> None:
+        """Register a callback invoked whenever the run profile changes."""
+        self._listeners.append(callback)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "level": self._profile.level,
+            "pressure": round(self.pressure, 3),
+            "queue_fill": round(self._load, 3),
+            "global_used_tokens": round(self._global_used),
+            "global_limit_tokens": self._global_tokens,
+            "per_ip_limit_tokens": self._per_client_tokens,
+            "charged_tokens": self.charged_tokens,
+            "charged_cost_usd": self.charged_cost_usd,
+            "rejected": self.rejected,
+            "profile_changes": self.profile_changes,
+        }
+
+    async def _rolling(self, scope: str) -> tuple[int, int, float]:
+        now = time.time()
+        window = int(now // self._window)
+        current = await self._state.get(f"{self._prefix}{scope}:{window}")
+        previous = await self._state.get(f"{self._prefix}{scope}:{window - 1}")
+        return int(previous or 0), int(current or 0), now
+
+    async def check(self, client_key: str) -> float:
+        """Return 0 if ``client_key`` may start a run, else seconds to wait.
+
+        Fails open when the shared state is unavailable.
+        """
+        if not self._per_client_tokens:
+            return 0.0
+        limit = self._per_client_tokens
+        try:
+            previous, current, now = await self._rolling(f"ip:{client_key}")
+        except Exception:
+            logger.warning("Token budget unavailable, allowing run", exc_info=True)
+            return 0.0
+        fraction = (now % self._window) / self._window
+        if sliding_window.sliding_count(previous, current, fraction) < limit:
+            return 0.0
+        self.rejected += 1
+        return sliding_window.retry_after(previous, current, limit, self._window, now)
+
+    async def charge(
+        self, client_key: str | None, tokens: int, cost_usd: float = 0.0
+    ) -> None:
+        """Count a finished run against the global and client budgets."""
+        self.charged_tokens += tokens
+        self.charged_cost_usd += cost_usd
+        if tokens <= 0:
+            return
+        window = int(time.time() // self._window)
+        ttl = self._window * 2
+        try:
+            if self._global_tokens:
+                await self._state.incr(
+                    f"{self._prefix}global:{window}", tokens, ttl=ttl
+                )
+                self._refreshed_at = 0.0
+            if client_key and self._per_client_tokens:
+                await self._state.incr(
+                    f"{self._prefix}ip:{client_key}:{window}", tokens, ttl=ttl
+                )
+        except Exception:
+            logger.warning("Could not charge token budget", exc_info=True)
+
+    async def refresh(self, load: float) -> RunProfile:
+        """Update the pressure with ``load`` (0-1) and return the profile.
+
+        Global usage is re-read at most once a second, or after a charge.
+        """
+        self._load = min(max(load, 0.0), 1.0)
+        now = time.monotonic()
+        if self._global_tokens and now - self._refreshed_at >= _REFRESH_INTERVAL:
+            self._refreshed_at = now
+            try:
+                previous, current, wall = await self._rolling("global")
+            except Exception:
+                logger.warning("Token budget unavailable", exc_info=True)
+            else:
+                fraction = (wall % self._window) / self._window
+                self._global_used = sliding_window.sliding_count(
+                    previous, current, fraction
+                )
+        self._select(now)
+        return self._profile
+
+    def _select(self, now: float) -> None:
+        if not self._adaptive:
+            return
+        pressure = self.pressure
+        level = 0
+        if pressure >= self._economy_at:
+            level = 2
+        elif pressure >= self._reduce_at:
+            level = 1
+        current = self._profile.level
+        if level == current:
+            return
+        if level < current:
+            threshold = self._economy_at if current == 2 else self._reduce_at
+            if pressure >= threshold * _RECOVERY or now - self._changed_at < _MIN_DWELL:
+                return
+
+        self._profile = self._profiles[level]
+        self._changed_at = now
+        self.profile_changes += 1
+        logger.info(
+            "Budget pressure %.2f, new agent runs use the %s profile",
+            pressure,
+            self._profile.name,
+        )
+        for callback in self._listeners:
+            try:
+                callback(self._profile)
+            except Exception:
+                logger.exception("Budget profile listener failed")
+
+
+budget = BudgetPolicy(
+    shared_state,
+    build_profiles(
+        AGENT_MAX_TURNS, BUDGET_REDUCED_MAX_TURNS, MODEL_NAME, BUDGET_ECONOMY_MODEL
+    ),
+    window=BUDGET_WINDOW,
+    global_tokens=BUDGET_GLOBAL_TOKENS,
+    per_client_tokens=BUDGET_PER_IP_TOKENS,
+    reduce_at=BUDGET_REDUCE_AT,
+    economy_at=BUDGET_ECONOMY_AT,
+    adaptive=BUDGET_ADAPTIVE,
+)
+
+CallbackMetric(
+    "agent_budget",
+    "Token budget state: profile level (0 full, 1 reduced, 2 economy), "
+    "pressure, usage, limits and counters.",
+    lambda: {(k,): v for k, v in budget.stats().items()},
+    labelnames=["stat"],
+)
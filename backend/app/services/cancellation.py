@@ -0,0 +1,117 @@
+"""Cancel chat streams as soon as the HTTP client goes away.
+
+The response frames are produced by a separate task and handed to the
+response generator through a queue. When the client disconnects the
+generator stops and cancels the producer, which unwinds the agent run
+(the session is dropped and its subprocess torn down) instead of letting
+the model finish an answer nobody will read.
+
+Frames that queue up while the client is being written to are batched
+into a single write, and idle streams get heartbeat comments.
+
+Servers speaking ASGI spec < 2.4 (uvicorn) already make StreamingResponse
+listen for ``http.disconnect`` and cancel the generator; for newer servers
+the disconnect is awaited here.
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from starlette.requests import Request
+
+from app.metrics import Counter
+from app.services import sse
+
+logger = logging.getLogger(__name__)
+
+_CANCELLATIONS = Counter(
+    "chat_cancellations_total",
+    "Chat streams stopped before completion.",
+    ["reason"],
+)
+
+
+def record_cancellation(reason: str) -> None:
+    _CANCELLATIONS.inc(reason)
+
+
+def _server_watches_disconnect(request: Request) -> bool:
+    spec = request.scope.get("asgi", {}).get("spec_version", "2.0")
+    return tuple(int(part) for part in spec.split(".")) < (2, 4)
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _pump(frames: AsyncIterator[bytes], queue: asyncio.Queue) -> None:
+    try:
+        async for frame in frames:
+            queue.put_nowait(frame)
+    except Exception:
+        logger.exception("Chat stream failed")
+    finally:
+        queue.put_nowait(None)
+
+
+async def stream_until_disconnect(
+    request: Request,
+    frames: AsyncIterator[bytes],
+    heartbeat: float | None = None,
+    preamble: bytes = b"",
+) -> AsyncIterator[bytes]:
+    """Relay ``frames`` until they end or the client disconnects.
+
+    Frames that are already queued go out together in one write. With
+    ``heartbeat`` set, a comment frame is sent whenever the stream has been
+    idle for that many seconds. ``preamble`` is sent with the first write.
+    """
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+    producer = asyncio.create_task(_pump(frames, queue))
+    watcher = None
+    if not _server_watches_disconnect(request):
+        watcher = asyncio.create_task(_wait_for_disconnect(request))
+
+    completed = False
+    try:
+        while True:
+            if not queue.empty():
+                frame = queue.get_nowait()
+            elif watcher is None and heartbeat is None:
+                frame = await queue.get()
+            else:
+                getter = asyncio.ensure_future(queue.get())
+                waiters = {getter} if watcher is None else {getter, watcher}
+                await asyncio.wait(
+                    waiters, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not getter.done():
+                    getter.cancel()
+                    if watcher is not None and watcher.done():
+                        return
+                    yield sse.HEARTBEAT
+                    continue
+                frame = getter.result()
+
+            chunk = [preamble] if preamble else []
+            preamble = b""
+            while frame is not None:
+                chunk.append(frame)
+                if queue.empty():
+                    break
+                frame = queue.get_nowait()
+            if chunk:
+                yield sse.batch(chunk)
+            if frame is None:
+                completed = True
+                return
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if not completed:
+            producer.cancel()
+            record_cancellation("disconnect")
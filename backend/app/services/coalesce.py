@@ -0,0 +1,107 @@
+"""Single-flight deduplication of identical in-flight chat requests.
+
+Concurrent requests with the same key attach to one upstream run. The run
+executes in its own task and its frames are buffered, so subscribers that
+join late first get the prefix replayed and then follow the live stream.
+The run is cancelled once its last subscriber goes away.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Flight:
+    frames: list[bytes] = field(default_factory=list)
+    done: bool = False
+    subscribers: int = 0
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task | None = None
+
+    def publish(self, frame: bytes | None) -> None:
+        if frame is None:
+            self.done = True
+        else:
+            self.frames.append(frame)
+        wake, self.wake = self.wake, asyncio.Event()
+        wake.set()
+
+
+class SingleFlight:
+    """Registry of in-flight runs keyed by request identity."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self.runs = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "runs": self.runs,
+            "coalesced": self.coalesced,
+        }
+
+    async def stream(
+        self,
+        key: str,
+        run: Callable[[], AsyncIterator[bytes]],
+        on_join: Callable[[bool], None] | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield the frames of the run for ``key``, starting it if needed.
+
+        ``on_join`` is called before the first frame with True if the caller
+        joined a run already in flight, False if it started the run. Which
+        one it is is only settled here: a run seen in flight beforehand may
+        have finished by the time the stream is iterated.
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._produce(key, flight, run))
+            self.runs += 1
+        else:
+            self.coalesced += 1
+        if on_join is not None:
+            on_join(joined)
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.frames):
+                    yield flight.frames[index]
+                    index += 1
+                if flight.done:
+                    return
+                await flight.wake.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                # Nobody is listening: stop the run and let the next request
+                # for this key start a fresh one.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _produce(
+        self, key: str, flight: _Flight, run: Callable[[], AsyncIterator[bytes]]
+    ) -> None:
+        try:
+            async for frame in run():
+                flight.publish(frame)
+        except Exception:
+            logger.exception("Coalesced run failed")
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish(None)
@@ -0,0 +1,253 @@
+"""Fast path for FAQ-class questions.
+
+Questions such as "what projects has he built?" or "how do I contact
+him?" are answered straight from the knowledge files, without a CLI
+subprocess or a model call. Each intent has a few example questions; an
+incoming message is compared against them by TF-IDF cosine similarity and
+answered from the intent's template when the best score reaches the
+confidence threshold. Everything else falls through to the agent.
+
+Words the examples never use weigh as much as the rarest known word, so
+a question that adds specifics ("...that use radar?") scores lower and is
+left to the agent.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Callable
+
+from app.agent.knowledge import KnowledgeIndex, get_knowledge
+from app.agent.retrieval import chunk_markdown, tokenize
+
+# Longer messages are rarely FAQ-class; skip classifying them.
+_MAX_WORDS = 16
+
+
+def _repos_answer(knowledge: KnowledgeIndex) -> str | None:
+    if not knowledge.repos:
+        return None
+    lines = [
+        f"- **{repo['name']}**: {repo.get('description', '')}".rstrip(": ")
+        for repo in knowledge.repos
+    ]
+    return (
+        "Here are Dingkang's public GitHub repositories:\n\n"
+        + "\n".join(lines)
+        + "\n\nAsk me about any of them for more details."
+    )
+
+
+def _resume_section(knowledge: KnowledgeIndex, predicate: Callable[[str], bool]):
+    return [
+        chunk
+        for chunk in chunk_markdown("resume", knowledge.resume_payload)
+        if predicate(chunk.title)
+    ]
+
+
+def _contact_answer(knowledge: KnowledgeIndex) -> str | None:
+    chunks = _resume_section(knowledge, lambda title: title.endswith("> Contact"))
+    if not chunks:
+        return None
+    return f"You can reach Dingkang here:\n\n{chunks[0].text}"
+
+
+def _current_role_answer(knowledge: KnowledgeIndex) -> str | None:
+    chunks = _resume_section(knowledge, lambda title: "(Current)" in title)
+    if not chunks:
+        return None
+    role = chunks[0].title.rsplit(" > ", 1)[-1].replace(" (Current)", "")
+    return f"Dingkang currently works as a **{role}**.\n\n{chunks[0].text}"
+
+
+def _skills_answer(knowledge: KnowledgeIndex) -> str | None:
+    chunks = _resume_section(knowledge, lambda title: "> Technical Skills" in title)
+    if not chunks:
+        return None
+    sections = []
+    for chunk in chunks:
+        heading = chunk.title.rsplit(" > ", 1)[-1]
+        if heading == "Technical Skills":
+            sections.append(chunk.text)
+        else:
+            sections.append(f"**{heading}**\n{chunk.text}")
+    return "Dingkang's technical skills:\n\n" + "\n\n".join(sections)
+
+
+def _greeting_answer(knowledge: KnowledgeIndex) -> str | None:
+    return (
+        "Hi! I'm an AI assistant on Dingkang Wang's homepage. Ask me about his "
+        "experience, skills, or projects."
+    )
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    examples: tuple[str, ...]
+    render: Callable[[KnowledgeIndex], str | None]
+
+
+INTENTS: tuple[Intent, ...] = (
+    Intent(
+        "projects",
+        (
+            "what projects has he worked on",
+            "list his projects",
+            "show me his github repos",
+            "what repositories does he have",
+            "what open source projects has he built",
+            "what has he built",
+            "can you list his github repositories",
+        ),
+        _repos_answer,
+    ),
+    Intent(
+        "contact",
+        (
+            "how can i contact him",
+            "what is his email",
+            "his contact info",
+            "how do i reach him",
+            "email address",
+            "what is his github",
+            "get in touch",
+        ),
+        _contact_answer,
+    ),
+    Intent(
+        "current_role",
+        (
+            "where does he work",
+            "what is his current job",
+            "who is his current employer",
+            "what does he do now",
+            "what is his current role",
+            "which company does he work for right now",
+            "where is he working currently",
+        ),
+        _current_role_answer,
+    ),
+    Intent(
+        "skills",
+        (
+            "what are his skills",
+            "what programming languages does he know",
+            "what is his tech stack",
+            "what technologies does he use",
+            "technical skills",
+        ),
+        _skills_answer,
+    ),
+    Intent(
+        "greeting",
+        ("hi", "hello", "hey", "hi there", "hello there", "good morning"),
+        _greeting_answer,
+    ),
+)
+
+# Greetings are all stopwords to the retrieval tokenizer; keep them here.
+_GREETING_WORDS = frozenset({"hi", "hello", "hey", "morning", "there", "good"})
+
+
+def _terms(text: str) -> list[str]:
+    text = text.lower().replace("'s", "").replace("\u2019s", "")
+    words = text.split()
+    if words and all(w.strip("!.,?") in _GREETING_WORDS for w in words):
+        return [w.strip("!.,?") for w in words]
+    return tokenize(text)
+
+
+@dataclass(frozen=True)
+class FaqMatch:
+    intent: str
+    confidence: float
+    answer: str
+
+
+class FaqRouter:
+    """TF-IDF nearest-example classifier over a fixed intent table."""
+
+    def __init__(self, intents: tuple[Intent, ...], min_confidence: float) -> None:
+        self.min_confidence = min_confidence
+        self._intents = {intent.name: intent for intent in intents}
+
+        examples = [
+            (intent.name, _terms(example))
+            for intent in intents
+            for example in intent.examples
+        ]
+        n = len(examples)
+        df: dict[str, int] = {}
+        for _, terms in examples:
+            for term in set(terms):
+                df[term] = df.get(term, 0) + 1
+        self._idf = {t: math.log((1 + n) / (1 + count)) + 1 for t, count in df.items()}
+        self._unknown_idf = math.log(1 + n) + 1
+        self._examples = [
+            (name, vector, _norm(vector))
+            for name, terms in examples
+            if (vector := self._vector(terms))
+        ]
+        self._answers: dict[str, tuple[tuple, str | None]] = {}
+
+        self.hits: dict[str, int] = {name: 0 for name in self._intents}
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+    def stats(self) -> dict[tuple[str, ...], float]:
+        stats = {("hit", name): count for name, count in self.hits.items()}
+        stats[("miss", "")] = self.misses
+        return stats
+
+    def _vector(self, terms: list[str]) -> dict[str, float]:
+        vector: dict[str, float] = {}
+        for term in terms:
+            weight = self._idf.get(term, self._unknown_idf)
+            vector[term] = vector.get(term, 0.0) + weight
+        return vector
+
+    def classify(self, message: str) -> tuple[str | None, float]:
+        """Return the closest intent and its cosine similarity."""
+        if len(message.split()) > _MAX_WORDS:
+            return None, 0.0
+        query = self._vector(_terms(message))
+        if not query:
+            return None, 0.0
+        query_norm = _norm(query)
+        best, best_score = None, 0.0
+        for name, vector, norm in self._examples:
+            dot = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            score = dot / (query_norm * norm)
+            if score > best_score:
+                best, best_score = name, score
+        return best, best_score
+
+    def match(self, message: str) -> FaqMatch | None:
+        """Answer ``message`` from the intent table, or None to fall through."""
+        name, confidence = self.classify(message)
+        answer = None
+        if name is not None and confidence >= self.min_confidence:
+            answer = self._answer(name)
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits[name] += 1
+        return FaqMatch(name, confidence, answer)
+
+    def _answer(self, name: str) -> str | None:
+        knowledge = get_knowledge()
+        cached = self._answers.get(name)
+        if cached is None or cached[0] != knowledge.signature:
+            cached = (knowledge.signature, self._intents[name].render(knowledge))
+            self._answers[name] = cached
+        return cached[1]
+
+
+def _norm(vector: dict[str, float]) -> float:
+    return math.sqrt(sum(w * w for w in vector.values()))
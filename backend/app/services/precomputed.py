@@ -0,0 +1,176 @@
+"""Precomputed answers for common first-turn questions.
+
+``python -m app.precompute`` runs a question list through the agent ahead
+of time and writes the answers to a snapshot file. The file is one JSON
+header line followed by the answers' SSE frames back to back:
+
+    {"format": "answers", "schema": 1, "version": "<prompt>:<knowledge>",
+     "created_at": ..., "exact": {key: [offset, length]}, "fuzzy": {...}}
+    <frames><frames>...
+
+At startup only the header is parsed; the body is memory-mapped and an
+answer is sliced out of it when a question matches, so the snapshot costs
+no heap and is shared by every worker through the page cache. Keys are the
+normalized question and its token-set key, as in the response cache.
+
+The header's version is the prompt and knowledge version the answers were
+produced with. A snapshot from another version is rejected at load, and
+lookups stop matching as soon as the prompt or knowledge changes.
+"""
+
+import json
+import logging
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Mapping
+
+from app.services.response_cache import normalize_message, token_set_key
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+_FORMAT = "answers"
+_SCHEMA = 1
+
+
+def snapshot_path(setting: str) -> Path | None:
+    """Resolve PRECOMPUTED_ANSWERS; relative paths are under backend/."""
+    if not setting:
+        return None
+    path = Path(setting)
+    return path if path.is_absolute() else _BACKEND_DIR / path
+
+
+def write_snapshot(path: Path, version: str, answers: Mapping[str, bytes]) -> int:
+    """Write ``answers`` (question -> SSE frames) for ``version`` to ``path``.
+
+    The file is replaced atomically. Returns the number of answers written.
+    """
+    exact: dict[str, list[int]] = {}
+    fuzzy: dict[str, list[int]] = {}
+    body: list[bytes] = []
+    offset = 0
+    for question, frames in answers.items():
+        normalized = normalize_message(question)
+        if not normalized or normalized in exact:
+            continue
+        entry = [offset, len(frames)]
+        exact[normalized] = entry
+        fuzzy.setdefault(token_set_key(normalized) or normalized, entry)
+        body.append(frames)
+        offset += len(frames)
+
+    header = {
+        "format": _FORMAT,
+        "schema": _SCHEMA,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "exact": exact,
+        "fuzzy": fuzzy,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+        f.writelines(body)
+    os.replace(tmp, path)
+    return len(exact)
+
+
+class PrecomputedAnswers:
+    """Read-only view of a snapshot written by :func:`write_snapshot`."""
+
+    def __init__(self, path: Path | None, fuzzy: bool = True) -> None:
+        self._path = path
+        self._fuzzy = fuzzy
+        self._version: str | None = None
+        self._exact: dict[str, list[int]] = {}
+        self._fuzzy_index: dict[str, list[int]] = {}
+        self._body: mmap.mmap | None = None
+        self._base = 0
+        self.stale = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._body is not None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._exact),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": int(self.stale),
+        }
+
+    def load(self, version: str) -> bool:
+        """Map the snapshot if it exists and was produced for ``version``."""
+        self.close()
+        if self._path is None or not self._path.is_file():
+            return False
+        try:
+            with open(self._path, "rb") as f:
+                header = json.loads(f.readline())
+                base = f.tell()
+                if header.get("format") != _FORMAT or header.get("schema") != _SCHEMA:
+                    logger.warning("Ignoring %s: not an answer snapshot", self._path)
+                    return False
+                if header.get("version") != version:
+                    self.stale = True
+                    logger.warning(
+                        "Ignoring stale answer snapshot %s (built for %s, now %s)",
+                        self._path,
+                        header.get("version"),
+                        version,
+                    )
+                    return False
+                body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            logger.warning(
+                "Could not load answer snapshot %s", self._path, exc_info=True
+            )
+            return False
+
+        self._version = version
+        self._exact = header["exact"]
+        self._fuzzy_index = header["fuzzy"]
+        self._body = body
+        self._base = base
+        logger.info(
+            "Loaded %d precomputed answers from %s", len(self._exact), self._path
+        )
+        return True
+
+    def get(self, message: str, version: str) -> bytes | None:
+        """Return the precomputed frames answering ``message``, if any."""
+        if self._body is None:
+            return None
+        if version != self._version:
+            # The prompt or knowledge changed since the snapshot was built.
+            if not self.stale:
+                self.stale = True
+                logger.warning("Answer snapshot is stale, no longer serving it")
+            return None
+        normalized = normalize_message(message)
+        entry = self._exact.get(normalized)
+        if entry is None and self._fuzzy:
+            entry = self._fuzzy_index.get(token_set_key(normalized) or normalized)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, length = entry
+        start = self._base + offset
+        return self._body[start : start + length]
+
+    def close(self) -> None:
+        if self._body is not None:
+            self._body.close()
+        self._body = None
+        self._version = None
+        self._exact = {}
+        self._fuzzy_index = {}
+        self.stale = False
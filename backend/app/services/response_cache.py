@@ -0,0 +1,225 @@
+"""In-memory cache of complete chat responses for repeat questions.
+
+Entries are keyed on the normalized user message plus the system-prompt
+version and hold the full SSE event sequence, so a hit can be replayed
+without touching the agent. An optional token-set key lets near-duplicates
+("What does he do at Tesla?" / "what does Dingkang do at tesla") share an
+entry. Entries are evicted by TTL, then least recently used first once the
+entry or byte limit is reached.
+
+With a shared state (see app/shared_state.py) the in-memory cache is the
+first level and exact-match entries are also written to the shared state,
+so an answer produced by one worker is served by the others.
+"""
+
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Sequence
+
+from app.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9_+#.-]+")
+
+# Words dropped from the token-set key. They rarely change what is being
+# asked, and visitors refer to Dingkang in many different ways.
+_STOPWORDS = frozenset(
+    """
+    a an the is are was were be do does did can could would will should
+    you your me i please tell show give about of for on in at to with by
+    from and or has have any some
+    what whats s his him he dingkang wang mr
+    """.split()
+)
+
+
+def normalize_message(message: str) -> str:
+    """Case-fold, strip punctuation and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    tokens = (token.strip(".-") for token in _WORD_RE.findall(text))
+    return " ".join(token for token in tokens if token)
+
+
+def token_set_key(normalized: str) -> str:
+    """Order-insensitive key over the message's content words."""
+    tokens = {t for t in normalized.split() if t not in _STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def _shared_key(normalized: str, version: str) -> str:
+    digest = hashlib.sha256(f"{version}\x00{normalized}".encode()).hexdigest()
+    return f"rc:{digest[:32]}"
+
+
+@dataclass
+class _Entry:
+    events: tuple[bytes, ...]
+    size: int
+    expires_at: float
+    fuzzy_key: str | None
+
+
+class ResponseCache:
+    """LRU + TTL cache of SSE event sequences with a byte budget."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float,
+        fuzzy: bool = True,
+        shared: SharedState | None = None,
+    ) -> None:
+        self._max_entries = max(max_entries, 0)
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._fuzzy = fuzzy
+        self._shared = shared
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._fuzzy_index: dict[str, str] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def get(self, message: str, version: str) -> tuple[bytes, ...] | None:
+        """Return the cached events for ``message``, or None on a miss."""
+        if not self.enabled:
+            return None
+        events = self._get_local(normalize_message(message), version)
+        if events is None:
+            self.misses += 1
+        return events
+
+    async def fetch(self, message: str, version: str) -> tuple[bytes, ...] | None:
+        """Like :meth:`get`, falling back to the shared state on a local miss."""
+        if not self.enabled:
+            return None
+        normalized = normalize_message(message)
+        events = self._get_local(normalized, version)
+        if events is None and self._shared is not None and normalized:
+            try:
+                blob = await self._shared.get(_shared_key(normalized, version))
+            except Exception:
+                logger.warning("Shared response cache unavailable", exc_info=True)
+                blob = None
+            if blob is not None:
+                events = tuple(f + b"\n\n" for f in blob.split(b"\n\n") if f)
+                self.put(message, version, events)
+                self.shared_hits += 1
+        if events is None:
+            self.misses += 1
+        return events
+
+    async def store(self, message: str, version: str, events: Sequence[bytes]) -> None:
+        """:meth:`put` the events and write them to the shared state."""
+        self.put(message, version, events)
+        normalized = normalize_message(message)
+        if self._shared is None or not self.enabled or not normalized:
+            return
+        blob = b"".join(events)
+        if len(blob) > self._max_bytes:
+            return
+        try:
+            await self._shared.set(_shared_key(normalized, version), blob, self._ttl)
+        except Exception:
+            logger.warning("Could not write shared response cache", exc_info=True)
+
+    def _get_local(self, normalized: str, version: str) -> tuple[bytes, ...] | None:
+        key = f"{version}\x00{normalized}"
+        entry = self._lookup(key)
+        if entry is None and self._fuzzy:
+            fuzzy = token_set_key(normalized)
+            target = self._fuzzy_index.get(f"{version}\x00{fuzzy}") if fuzzy else None
+            if target is not None:
+                entry = self._lookup(target)
+                if entry is not None:
+                    self.fuzzy_hits += 1
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry.events
+
+    def put(self, message: str, version: str, events: Sequence[bytes]) -> None:
+        """Store the complete event sequence of a successful response."""
+        if not self.enabled:
+            return
+        normalized = normalize_message(message)
+        if not normalized:
+            return
+        key = f"{version}\x00{normalized}"
+        size = sum(len(e) for e in events) + len(key)
+        if size > self._max_bytes:
+            return
+
+        self._remove(key)
+        fuzzy_key = None
+        if self._fuzzy:
+            tokens = token_set_key(normalized)
+            if tokens:
+                fuzzy_key = f"{version}\x00{tokens}"
+                self._fuzzy_index[fuzzy_key] = key
+
+        self._entries[key] = _Entry(
+            events=tuple(events),
+            size=size,
+            expires_at=time.monotonic() + self._ttl,
+            fuzzy_key=fuzzy_key,
+        )
+        self._bytes += size
+
+        while self._entries and (
+            len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._fuzzy_index.clear()
+        self._bytes = 0
+
+    def _lookup(self, key: str) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        if entry.fuzzy_key and self._fuzzy_index.get(entry.fuzzy_key) == key:
+            del self._fuzzy_index[entry.fuzzy_key]
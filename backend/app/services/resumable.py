@@ -0,0 +1,173 @@
+"""Resumable chat streams.
+
+Each agent run is produced by its own task into a bounded ring buffer and
+gets a stream id. Frames go out with ``id: <stream>.<seq>`` fields, so a
+client that loses the connection can reconnect with ``Last-Event-ID`` and
+get the frames it missed, followed by the live stream if the run is still
+going, instead of starting another agent run.
+
+A run whose last reader disconnects keeps going for ``grace`` seconds so
+the reader can come back. After that it is cancelled. Finished streams
+stay replayable for ``ttl`` seconds. Streams live in the worker process
+that runs them.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from app.services import sse
+from app.services.cancellation import record_cancellation
+
+logger = logging.getLogger(__name__)
+
+
+class StreamNotFoundError(KeyError):
+    """The stream is unknown or has expired."""
+
+
+class StreamGapError(Exception):
+    """Frames after the requested position were already dropped."""
+
+
+def parse_event_id(event_id: str) -> tuple[str, int]:
+    """Split a ``<stream>.<seq>`` event id; raises ValueError if malformed."""
+    stream_id, _, seq = event_id.strip().rpartition(".")
+    if not stream_id:
+        raise ValueError(f"Malformed event id {event_id!r}")
+    return stream_id, int(seq)
+
+
+@dataclass
+class _Stream:
+    id: str
+    frames: deque[tuple[int, bytes]]
+    next_seq: int = 1
+    done: bool = False
+    readers: int = 0
+    finished_at: float | None = None
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task | None = None
+    abandon: asyncio.TimerHandle | None = None
+
+    def publish(self, frame: bytes | None) -> None:
+        if frame is None:
+            self.done = True
+            self.finished_at = time.monotonic()
+        else:
+            self.frames.append((self.next_seq, frame))
+            self.next_seq += 1
+        wake, self.wake = self.wake, asyncio.Event()
+        wake.set()
+
+
+class ResumableStreams:
+    """Registry of running and recently finished streams."""
+
+    def __init__(
+        self, max_frames: int, ttl: float, grace: float, max_streams: int = 256
+    ) -> None:
+        self._max_frames = max(max_frames, 1)
+        self._ttl = ttl
+        self._grace = grace
+        self._max_streams = max(max_streams, 1)
+        self._streams: dict[str, _Stream] = {}
+        self.started = 0
+        self.resumed = 0
+        self.abandoned = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "live": sum(1 for s in self._streams.values() if not s.done),
+            "retained": sum(1 for s in self._streams.values() if s.done),
+            "started": self.started,
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+        }
+
+    def start(self, frames: AsyncIterator[bytes]) -> str:
+        """Run ``frames`` in the background and return the new stream id."""
+        self._expire()
+        stream = _Stream(uuid.uuid4().hex, deque(maxlen=self._max_frames))
+        self._streams[stream.id] = stream
+        stream.task = asyncio.create_task(self._produce(stream, frames))
+        self.started += 1
+        return stream.id
+
+    def read(self, stream_id: str, after: int = 0) -> AsyncIterator[bytes]:
+        """Yield the stream's frames with a sequence number above ``after``.
+
+        Raises StreamNotFoundError or StreamGapError before yielding
+        anything when the stream cannot be resumed from ``after``.
+        """
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            raise StreamNotFoundError(stream_id)
+        oldest = stream.frames[0][0] if stream.frames else stream.next_seq
+        if after + 1 < oldest:
+            raise StreamGapError(f"{stream_id} has dropped frames before {oldest}")
+        if after:
+            self.resumed += 1
+        return self._follow(stream, after)
+
+    async def _follow(self, stream: _Stream, after: int) -> AsyncIterator[bytes]:
+        stream.readers += 1
+        if stream.abandon is not None:
+            stream.abandon.cancel()
+            stream.abandon = None
+        try:
+            while True:
+                while stream.frames and after < stream.next_seq - 1:
+                    index = after + 1 - stream.frames[0][0]
+                    if index < 0:
+                        # Fell behind the ring buffer; the client resumes
+                        # from its last id and gets a gap error.
+                        return
+                    seq, frame = stream.frames[index]
+                    after = seq
+                    yield sse.with_id(frame, f"{stream.id}.{seq}")
+                if stream.done:
+                    return
+                await stream.wake.wait()
+        finally:
+            stream.readers -= 1
+            if stream.readers == 0 and not stream.done:
+                loop = asyncio.get_running_loop()
+                stream.abandon = loop.call_later(self._grace, self._abandon, stream)
+
+    def _abandon(self, stream: _Stream) -> None:
+        stream.abandon = None
+        if stream.readers or stream.done or stream.task is None:
+            return
+        logger.info("Stream %s abandoned, stopping its run", stream.id)
+        self.abandoned += 1
+        record_cancellation("abandoned")
+        stream.task.cancel()
+        self._streams.pop(stream.id, None)
+
+    async def _produce(self, stream: _Stream, frames: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in frames:
+                stream.publish(frame)
+        except Exception:
+            logger.exception("Resumable stream %s failed", stream.id)
+        finally:
+            stream.publish(None)
+
+    def _expire(self) -> None:
+        """Drop finished streams past their TTL, then the oldest over the cap."""
+        cutoff = time.monotonic() - self._ttl
+        finished = sorted(
+            (s for s in self._streams.values() if s.done),
+            key=lambda s: s.finished_at,
+        )
+        excess = len(self._streams) + 1 - self._max_streams
+        for stream in finished:
+            if stream.finished_at > cutoff and excess <= 0:
+                break
+            del self._streams[stream.id]
+            excess -= 1
@@ -0,0 +1,98 @@
+"""Which worker holds each multi-turn chat session.
+
+A session's conversation lives in an agent subprocess owned by one worker
+process, so follow-up turns should reach that worker. The registry records
+the owner of every session in the shared state; the chat route compares it
+with the local worker and either serves the turn, asks the Fly proxy to
+replay the request on the owner's machine, or takes the session over once
+the owner is gone (its conversation is then lost). A proxy cannot pick a
+worker within a machine, so app.serve runs one worker per machine when
+sessions are on.
+
+Worker ids are ``<instance>/<pid>``, where the instance is FLY_MACHINE_ID
+on Fly and the host name elsewhere.
+"""
+
+import logging
+import os
+import socket
+from dataclasses import dataclass
+
+from app.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_ID = os.getenv("FLY_MACHINE_ID") or socket.gethostname()
+
+
+@dataclass(frozen=True)
+class Affinity:
+    """Where a turn for a session should run."""
+
+    owner: str
+    # True when the session was started on another worker.
+    moved: bool = False
+
+    @property
+    def instance(self) -> str:
+        return self.owner.rpartition("/")[0]
+
+    @property
+    def pid(self) -> int | None:
+        pid = self.owner.rpartition("/")[2]
+        return int(pid) if pid.isdigit() else None
+
+
+def worker_alive(pid: int | None) -> bool:
+    """True if ``pid`` is a running process on this machine."""
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SessionRegistry:
+    """Session id -> owning worker, kept for ``ttl`` seconds after each turn."""
+
+    def __init__(self, state: SharedState, ttl: float, prefix: str = "sess:") -> None:
+        self._state = state
+        self._ttl = ttl
+        self._prefix = prefix
+
+    @property
+    def worker_id(self) -> str:
+        # Read per call: workers may be forked after this module is imported.
+        return f"{INSTANCE_ID}/{os.getpid()}"
+
+    async def locate(self, session_id: str) -> Affinity:
+        """Claim ``session_id`` for this worker unless another worker holds it.
+
+        Fails open: if the shared state is unavailable the turn runs here.
+        """
+        key = self._prefix + session_id
+        me = self.worker_id.encode()
+        try:
+            if await self._state.add(key, me, self._ttl):
+                return Affinity(self.worker_id)
+            owner = await self._state.get(key)
+            if owner is None or owner == me:
+                await self._state.set(key, me, self._ttl)
+                return Affinity(self.worker_id)
+        except Exception:
+            logger.warning("Session registry unavailable", exc_info=True)
+            return Affinity(self.worker_id)
+        return Affinity(owner.decode(), moved=True)
+
+    async def take_over(self, session_id: str) -> None:
+        """Make this worker the owner of ``session_id``."""
+        try:
+            await self._state.set(
+                self._prefix + session_id, self.worker_id.encode(), self._ttl
+            )
+        except Exception:
+            logger.warning("Session registry unavailable", exc_info=True)
@@ -0,0 +1,93 @@
+"""Server-Sent Events encoding for the chat stream.
+
+Every chat event is one ``data:`` line holding a JSON object whose first
+key is ``type``. Events are built in a single ``bytes.join`` (JSON through
+orjson when it is installed), and the frames every stream ends with are
+encoded once at import. Frames are plain bytes, so the response cache and
+coalesced runs replay them without re-encoding.
+
+Besides events the encoder produces ``id:`` fields for resumable streams,
+``retry:`` reconnection hints and comment heartbeats, which keep proxies
+from closing a connection that is quiet during a long tool call.
+"""
+
+import json
+from typing import Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+if orjson is not None:
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+else:
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode(event: dict[str, Any], event_id: str | int | None = None) -> bytes:
+    """Encode ``event`` as one SSE frame, with an ``id:`` field if given."""
+    if event_id is None:
+        return b"".join((b"data: ", dumps(event), b"\n\n"))
+    return b"".join(
+        (b"id: ", str(event_id).encode(), b"\ndata: ", dumps(event), b"\n\n")
+    )
+
+
+def text(content: str) -> bytes:
+    return encode({"type": "text", "content": content})
+
+
+def error(content: str) -> bytes:
+    return encode({"type": "error", "content": content})
+
+
+def queued(position: int) -> bytes:
+    return encode({"type": "queued", "position": position})
+
+
+def with_id(frame: bytes, event_id: str | int) -> bytes:
+    """Prefix an encoded frame with an ``id:`` field."""
+    return b"".join((b"id: ", str(event_id).encode(), b"\n", frame))
+
+
+def retry(milliseconds: int) -> bytes:
+    """Reconnection delay hint for EventSource clients."""
+    return b"retry: %d\n\n" % milliseconds
+
+
+def batch(frames: Iterable[bytes]) -> bytes:
+    """Join several frames into one write."""
+    return b"".join(frames)
+
+
+def _type_prefix(event_type: str) -> bytes:
+    # b'data: {"type":"error"', the start of every frame of that type.
+    return b"data: " + dumps({"type": event_type})[:-1]
+
+
+def is_type(frame: bytes, event_type: str) -> bool:
+    """True if ``frame`` (without an ``id:`` field) is an event of that type."""
+    return frame.startswith(_PREFIXES.get(event_type) or _type_prefix(event_type))
+
+
+def text_content(data: bytes) -> str:
+    """Concatenate the content of the ``text`` events in ``data``."""
+    parts = []
+    for frame in data.split(b"\n\n"):
+        for line in frame.split(b"\n"):
+            if line.startswith(_PREFIXES["text"]):
+                parts.append(json.loads(line[len(b"data: ") :])["content"])
+    return "".join(parts)
+
+
+_PREFIXES = {t: _type_prefix(t) for t in ("text", "error", "queued", "done")}
+
+DONE = encode({"type": "done"})
+HEARTBEAT = b": keep-alive\n\n"
@@ -0,0 +1,334 @@
+"""Key-value state shared by the worker processes.
+
+With WEB_CONCURRENCY above 1, or more than one machine, every process has
+its own memory. State that has to agree across processes (rate-limit
+counters, cached responses, which worker holds a chat session) goes
+through a :class:`SharedState` backend chosen by SHARED_STATE_URL:
+
+- ``memory://`` (default): a dict in this process, correct for a single
+  worker only,
+- ``sqlite:///path/to/state.db``: a SQLite database in WAL mode, shared by
+  the workers on one machine,
+- ``redis://`` or ``rediss://``: a Redis-compatible server, shared by every
+  machine.
+
+Values are bytes and may expire after a TTL in seconds. Expiry uses the
+wall clock so that separate processes agree on it.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+
+from app.config import SHARED_STATE_URL
+
+logger = logging.getLogger(__name__)
+
+
+def _expires_at(ttl: float | None) -> float | None:
+    return time.time() + ttl if ttl is not None else None
+
+
+def _as_bytes(value: object) -> bytes | None:
+    if value is None or isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class SharedState(ABC):
+    """Async key-value store with per-key TTLs."""
+
+    name: str
+    # False when the state lives in this process and is not visible to
+    # other workers.
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        """Return the value at ``key``, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        """Set ``key`` to ``value``, expiring after ``ttl`` seconds if given."""
+
+    @abstractmethod
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Set ``key`` only if it does not exist; True if it was set."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove ``key`` if it exists."""
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """Add ``amount`` to the integer at ``key`` and return the new value.
+
+        A missing or expired key starts from 0. ``ttl`` (re)sets the expiry.
+        """
+
+    async def purge(self) -> int:
+        """Drop expired keys and return how many were removed."""
+        return 0
+
+    def size(self) -> int | None:
+        """Number of keys held, if the backend can tell cheaply."""
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryState(SharedState):
+    """Process-local state. Expired keys are dropped on access or purge."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[object, float | None]] = {}
+
+    def _live(self, key: str) -> tuple[object, float | None] | None:
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str) -> bytes | None:
+        item = self._live(key)
+        return _as_bytes(item[0]) if item is not None else None
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._data[key] = (value, _expires_at(ttl))
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        self._data[key] = (value, _expires_at(ttl))
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        item = self._live(key)
+        value = int(item[0]) + amount if item is not None else amount
+        expires_at = _expires_at(ttl) if ttl is not None else (item and item[1])
+        self._data[key] = (value, expires_at)
+        return value
+
+    async def purge(self) -> int:
+        now = time.time()
+        expired = [
+            key
+            for key, (_, expires_at) in self._data.items()
+            if expires_at is not None and expires_at <= now
+        ]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def size(self) -> int | None:
+        return len(self._data)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL
+)
+"""
+
+_SQLITE_INCR = """
+INSERT INTO kv (key, value, expires_at) VALUES (:key, :amount, :expires_at)
+ON CONFLICT (key) DO UPDATE SET
+    value = CASE WHEN expires_at <= :now THEN :amount
+                 ELSE CAST(value AS INTEGER) + :amount END,
+    expires_at = CASE WHEN :expires_at IS NOT NULL THEN :expires_at
+                      WHEN expires_at <= :now THEN NULL
+                      ELSE expires_at END
+RETURNING value
+"""
+
+
+class SqliteState(SharedState):
+    """State in a SQLite file in WAL mode, shared by the workers on one host.
+
+    Statements run in a worker thread on one connection per process; WAL
+    lets readers proceed while another process writes, and busy_timeout
+    makes concurrent writers wait instead of failing.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str, timeout: float = 5.0) -> None:
+        self._path = path
+        self._timeout = timeout
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path,
+            timeout=self._timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SQLITE_SCHEMA)
+        return conn
+
+    def _call(self, sql: str, params: dict) -> list[tuple]:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _execute(self, sql: str, **params) -> list[tuple]:
+        return await asyncio.to_thread(self._call, sql, params)
+
+    async def get(self, key: str) -> bytes | None:
+        rows = await self._execute(
+            "SELECT value FROM kv WHERE key = :key"
+            " AND (expires_at IS NULL OR expires_at > :now)",
+            key=key,
+            now=time.time(),
+        )
+        return _as_bytes(rows[0][0]) if rows else None
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        await self._execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at)"
+            " VALUES (:key, :value, :expires_at)",
+            key=key,
+            value=value,
+            expires_at=_expires_at(ttl),
+        )
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        rows = await self._execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (:key, :value, :expires_at)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE expires_at <= :now"
+            " RETURNING 1",
+            key=key,
+            value=value,
+            expires_at=_expires_at(ttl),
+            now=time.time(),
+        )
+        return bool(rows)
+
+    async def delete(self, key: str) -> None:
+        await self._execute("DELETE FROM kv WHERE key = :key", key=key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        rows = await self._execute(
+            _SQLITE_INCR,
+            key=key,
+            amount=amount,
+            expires_at=_expires_at(ttl),
+            now=time.time(),
+        )
+        return int(rows[0][0])
+
+    async def purge(self) -> int:
+        rows = await self._execute(
+            "DELETE FROM kv WHERE expires_at <= :now RETURNING 1", now=time.time()
+        )
+        return len(rows)
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisState(SharedState):
+    """State in a Redis-compatible server, shared by every machine."""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "") -> None:
+        # Imported here so the default in-memory setup never loads it.
+        from app.resp_client import RespClient
+
+        self._client = RespClient(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return _as_bytes(await self._client.execute("GET", self._prefix + key))
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        args = ("SET", self._prefix + key, value)
+        if ttl is not None:
+            args += ("PX", max(int(ttl * 1000), 1))
+        await self._client.execute(*args)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        args = ("SET", self._prefix + key, value, "NX")
+        if ttl is not None:
+            args += ("PX", max(int(ttl * 1000), 1))
+        return await self._client.execute(*args) is not None
+
+    async def delete(self, key: str) -> None:
+        await self._client.execute("DEL", self._prefix + key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        key = self._prefix + key
+        commands = [("INCRBY", key, amount)]
+        if ttl is not None:
+            commands.append(("PEXPIRE", key, max(int(ttl * 1000), 1)))
+        replies = await self._client.pipeline(commands)
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return int(replies[0])
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+async def purge_loop(state: SharedState, interval: float = 60.0) -> None:
+    """Periodically drop expired keys (Redis expires them by itself)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await state.purge()
+        except Exception:
+            logger.exception("Shared state purge failed")
+        else:
+            if removed:
+                logger.debug("Purged %d expired shared state keys", removed)
+
+
+def create_shared_state(url: str) -> SharedState:
+    """Build the backend described by ``url`` (see the module docstring)."""
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisState(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db and sqlite:////absolute/path.db
+        path = url.split("://", 1)[1]
+        path = path[1:] if path.startswith("/") else path
+        if not path:
+            raise ValueError(f"No database path in {url!r}")
+        return SqliteState(path)
+    if parsed.scheme != "memory":
+        logger.warning("Unknown SHARED_STATE_URL %r, using in-process state", url)
+    return MemoryState()
+
+
+shared_state = create_shared_state(SHARED_STATE_URL)
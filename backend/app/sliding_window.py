@@ -0,0 +1,28 @@
+"""Sliding-window counter arithmetic.
+
+A key keeps two fixed-window counters, the current window and the one
+before; the previous one is weighted by how much of it still overlaps the
+sliding window. Used by the rate limiter and the token budgets, which keep
+the counters in their own storage.
+"""
+
+
+def sliding_count(previous: int, current: int, elapsed_fraction: float) -> float:
+    """Estimated count over the sliding window ending now."""
+    return previous * (1.0 - elapsed_fraction) + current
+
+
+def retry_after(
+    previous: int, current: int, limit: int, window_seconds: float, now: float
+) -> float:
+    """Seconds until the sliding count drops below ``limit`` again."""
+    elapsed = now % window_seconds
+    if current < limit and previous > 0:
+        # Solve previous * (1 - t / window) + current < limit for t.
+        t = window_seconds * (1.0 - (limit - current) / previous)
+        return max(t - elapsed, 0.001)
+    # Wait for the next window, where this window's count becomes previous.
+    remaining = window_seconds - elapsed
+    if current > 0:
+        remaining += max(window_seconds * (1.0 - limit / current), 0.0)
+    return remaining
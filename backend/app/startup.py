@@ -0,0 +1,99 @@
+"""Startup pipeline timing and readiness.
+
+On a scale-to-zero deployment the first visitor pays for interpreter
+start, imports, uvicorn boot and the first CLI subprocess. The lifespan
+hook runs each warm-up step inside :meth:`StartupReport.phase`, so the
+time spent per phase is logged once the app is warm and exported on
+/ready and /metrics. ``ready`` only turns true after an agent client has
+connected, which is what /ready reports.
+
+This module is imported first by app.main and only uses the standard
+library, so its clock starts before the heavy imports.
+"""
+
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# Modules the Claude Agent SDK imports lazily inside connect(); importing
+# them during startup keeps that work off the first request.
+_SDK_LAZY_IMPORTS = (
+    "claude_agent_sdk._internal.query",
+    "claude_agent_sdk._internal.message_parser",
+    "claude_agent_sdk._internal.session_resume",
+    "claude_agent_sdk._internal.session_store_validation",
+    "claude_agent_sdk._internal.transport.subprocess_cli",
+)
+
+
+def _process_age() -> float | None:
+    """Seconds since this process was started, from /proc."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # The command name may contain spaces; fields resume after ")".
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - started, 0.0)
+
+
+class StartupReport:
+    """Durations of the startup phases and whether the app is warm."""
+
+    def __init__(self) -> None:
+        self._origin = time.perf_counter()
+        age = _process_age()
+        # Interpreter and server start up to the first line of app.main.
+        self.phases: dict[str, float] = {"boot": age} if age is not None else {}
+        self._process_origin = self._origin - (age or 0.0)
+        self._last = self._origin
+        self.ready = False
+        self.ready_after: float | None = None
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark or phase as ``name``."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self._last - started
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.ready_after = time.perf_counter() - self._process_origin
+        timings = ", ".join(f"{name} {secs:.3f}s" for name, secs in self.phases.items())
+        logger.info("Ready %.2fs after process start (%s)", self.ready_after, timings)
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": self.ready_after,
+            "phases": {name: round(secs, 4) for name, secs in self.phases.items()},
+        }
+
+
+def preimport_sdk() -> None:
+    """Import the SDK modules that connect() would otherwise load lazily."""
+    for name in _SDK_LAZY_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.debug("Could not pre-import %s", name)
+
+
+report = StartupReport()
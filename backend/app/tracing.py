@@ -0,0 +1,384 @@
+"""Request tracing with sampled spans exported as JSON lines.
+
+Every HTTP request gets a request id (``X-Request-Id``, taken from the
+request when the client sends one). A sampled chat request also gets a
+trace: a root span plus child spans for admission, connect, query, each
+assistant message, each tool call and disconnect. The current span lives
+in a context variable, so it follows the request into the tasks that
+produce its stream.
+
+Tool handlers and the SDK's stderr reader run in tasks the SDK client
+spawned when it connected, which may have been long before the request.
+:func:`bind_client` gives every client a slot that those tasks can see,
+and the runner points the slot at the active run (its span, request id
+and session id) while the client is leased (:func:`client_span`).
+
+Finished spans are written one JSON object per line to TRACE_FILE, or to
+stdout when it is empty. The default records use the OpenTelemetry span
+fields (trace_id, span_id, parent_span_id, unix-nano timestamps,
+attributes, status); TRACE_FORMAT=otlp wraps each span in an OTLP/JSON
+``resourceSpans`` envelope for collectors that ingest OTLP files. A writer
+thread does the encoding and I/O, so the event loop never waits on it.
+
+Only TRACE_SAMPLE_RATE of the traces are recorded. A W3C ``traceparent``
+header joins a sampled request to the caller's trace; its sampled flag
+forces sampling only with TRACE_TRUST_PARENT, since any client can send
+one.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Any, Iterator
+from weakref import WeakKeyDictionary
+
+from app.config import (
+    TRACE_FILE,
+    TRACE_FORMAT,
+    TRACE_SAMPLE_RATE,
+    TRACE_TRUST_PARENT,
+)
+
+logger = logging.getLogger(__name__)
+
+_SERVICE_NAME = "dingkwang-site-backend"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# Spans waiting for the writer thread; more are dropped and counted.
+_EXPORT_QUEUE_SIZE = 10000
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+session_id: ContextVar[str | None] = ContextVar("session_id", default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        start_ns: int | None = None,
+        attributes: dict[str, Any] | None = None,
+    ) -> None:
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, message: str) -> None:
+        self.error = message
+
+    def end(self, end_ns: int | None = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            exporter.export(self)
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not sampled."""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def fail(self, message: str) -> None:
+        pass
+
+    def end(self, end_ns: int | None = None) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class _Slot:
+    __slots__ = ("span", "request_id", "session_id", "__weakref__")
+
+    def __init__(self) -> None:
+        self.span: Span | None = None
+        self.request_id: str | None = None
+        self.session_id: str | None = None
+
+
+_slot: ContextVar[_Slot | None] = ContextVar("client_trace_slot", default=None)
+_client_slots: "WeakKeyDictionary[object, _Slot]" = WeakKeyDictionary()
+
+
+def current_span() -> Span | None:
+    span = _current.get()
+    if span is None:
+        slot = _slot.get()
+        span = slot.span if slot is not None else None
+    return span
+
+
+def current_slot() -> _Slot | None:
+    """The slot of the client whose task is running, if any."""
+    return _slot.get()
+
+
+def current_request_id() -> str | None:
+    value = request_id.get()
+    if value is None:
+        slot = _slot.get()
+        value = slot.request_id if slot is not None else None
+    return value
+
+
+def current_session_id() -> str | None:
+    value = session_id.get()
+    if value is None:
+        slot = _slot.get()
+        value = slot.session_id if slot is not None else None
+    return value
+
+
+def start_trace(
+    name: str,
+    traceparent: str | None = None,
+    trust_parent: bool = TRACE_TRUST_PARENT,
+    **attributes: Any,
+):
+    """Start a root span for a request, or return NOOP_SPAN if not sampled.
+
+    The span becomes the current span of the calling context. The sampled
+    flag of ``traceparent`` is only honoured with ``trust_parent``.
+    """
+    trace_id = parent_id = None
+    sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    match = _TRACEPARENT_RE.match(traceparent or "")
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        if trust_parent:
+            sampled = sampled or bool(int(flags, 16) & 1)
+    if not sampled:
+        return NOOP_SPAN
+    if request_id.get() is not None:
+        attributes.setdefault("request.id", request_id.get())
+    span = Span(name, trace_id or os.urandom(16).hex(), parent_id, None, attributes)
+    _current.set(span)
+    return span
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+    """Run the block as a child of the current span, if there is one."""
+    parent = current_span()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(name, parent.trace_id, parent.span_id, None, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(repr(e))
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Resumed in another context (e.g. an async generator).
+            _current.set(parent)
+        child.end()
+
+
+def record_span(name: str, start_ns: int, end_ns: int | None = None, **attributes):
+    """Record an already finished operation under the current span."""
+    parent = current_span()
+    if parent is not None:
+        child = Span(name, parent.trace_id, parent.span_id, start_ns, attributes)
+        child.end(end_ns)
+
+
+def bind_client(client: object) -> None:
+    """Give ``client`` a trace slot; call right before client.connect()."""
+    slot = _Slot()
+    _client_slots[client] = slot
+    _slot.set(slot)
+
+
+@contextmanager
+def client_span(client: object) -> Iterator[None]:
+    """Attribute work done by ``client``'s own tasks to the current run."""
+    slot = _client_slots.get(client)
+    if slot is None:
+        yield
+        return
+    slot.span = _current.get()
+    slot.request_id = request_id.get()
+    slot.session_id = session_id.get()
+    try:
+        yield
+    finally:
+        slot.span = slot.request_id = slot.session_id = None
+
+
+def _attribute_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _to_record(span: Span) -> dict[str, Any]:
+    return {
+        "trace_id": span.trace_id,
+        "span_id": span.span_id,
+        "parent_span_id": span.parent_id,
+        "name": span.name,
+        "start_time_unix_nano": span.start_ns,
+        "end_time_unix_nano": span.end_ns,
+        "duration_ms": round((span.end_ns - span.start_ns) / 1e6, 3),
+        "attributes": span.attributes,
+        "status": "error" if span.error else "ok",
+        **({"error": span.error} if span.error else {}),
+    }
+
+
+def _to_otlp(span: Span) -> dict[str, Any]:
+    otlp_span = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [
+            {"key": k, "value": _attribute_value(v)} for k, v in span.attributes.items()
+        ],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp_span["parentSpanId"] = span.parent_id
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": _SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [
+                    {"scope": {"name": "app.tracing"}, "spans": [otlp_span]}
+                ],
+            }
+        ]
+    }
+
+
+class JsonLinesExporter:
+    """Writes finished spans as JSON lines from a background thread.
+
+    export() only puts the span on a bounded queue; when the queue is full
+    the span is dropped and counted.
+    """
+
+    def __init__(
+        self, path: str = "", format: str = "json", queue_size: int = _EXPORT_QUEUE_SIZE
+    ) -> None:
+        self._path = path
+        self._encode = _to_otlp if format == "otlp" else _to_record
+        self._file: IO[str] | None = None
+        self._queue: queue.Queue[Span | None] = queue.Queue(maxsize=max(queue_size, 1))
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Write out the queued spans and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+        self._file = None
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Write whatever else is already queued with one flush.
+            while batch[-1] is not None and len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not None]
+            if spans:
+                self._write(spans)
+            if batch[-1] is None:
+                return
+
+    def _write(self, spans: list[Span]) -> None:
+        lines = "".join(
+            json.dumps(self._encode(span), default=str) + "\n" for span in spans
+        )
+        try:
+            if self._file is None:
+                self._file = open(self._path, "a") if self._path else sys.stdout
+            self._file.write(lines)
+            self._file.flush()
+        except OSError:
+            logger.warning("Could not write %d trace spans", len(spans), exc_info=True)
+            return
+        self.exported += len(spans)
+
+
+exporter = JsonLinesExporter(TRACE_FILE, TRACE_FORMAT)
@@ -0,0 +1,316 @@
+"""Load and latency benchmark for the chat backend.
+
+Starts the real application in a subprocess with the fake agent client
+(bench/fake_agent.py), drives concurrent SSE clients against /api/chat and
+reports latency percentiles, throughput, peak RSS and open file
+descriptors of the server. Runs fully offline.
+
+    cd backend
+    python -m bench                       # compare against bench/baseline.json
+    python -m bench --save-baseline       # record a new baseline
+    python -m bench -n 500 -c 50 --tokens 300 --env AGENT_POOL_SIZE=4
+
+Exits with status 1 when a metric regresses by more than --tolerance
+relative to the baseline.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+_DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Matches compact and spaced JSON alike.
+_TEXT_EVENT = re.compile(rb'"type":\s*"text"')
+_ERROR_EVENT = re.compile(rb'"type":\s*"error"')
+
+# Metric name -> (higher is better, absolute change always tolerated). The
+# slack keeps small absolute changes from flagging noise. Latency is gated
+# on the first text frame: the first byte is only the retry hint or a
+# ``queued`` event, so ttfb_* is reported but not compared.
+_COMPARED = {
+    "first_text_p50": (False, 0.05),
+    "first_text_p95": (False, 0.1),
+    "first_text_p99": (False, 0.2),
+    "total_p95": (False, 0.1),
+    "throughput_rps": (True, 0.1),
+    "peak_rss_mb": (False, 5.0),
+    "peak_fds": (False, 2),
+}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=_BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _count_fds(pid: int) -> int:
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return 0
+
+
+class _Sampler:
+    """Polls the server's RSS and open FD count while the load runs."""
+
+    def __init__(self, pid: int, interval: float = 0.05) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_fds = 0
+
+    def sample(self) -> None:
+        self.peak_rss_mb = max(self.peak_rss_mb, _read_rss_mb(self.pid))
+        self.peak_fds = max(self.peak_fds, _count_fds(self.pid))
+
+    async def run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+async def _wait_ready(client: httpx.AsyncClient, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+async def _one_request(client: httpx.AsyncClient, message: str) -> dict:
+    result = {"ok": False, "ttfb": None, "first_text": None, "bytes": 0}
+    body = {"message": message, "session_id": uuid.uuid4().hex}
+    started = time.perf_counter()
+    async with client.stream("POST", "/api/chat", json=body) as response:
+        result["status"] = response.status_code
+        error = False
+        async for chunk in response.aiter_bytes():
+            now = time.perf_counter() - started
+            if result["ttfb"] is None:
+                result["ttfb"] = now
+            if result["first_text"] is None and _TEXT_EVENT.search(chunk):
+                result["first_text"] = now
+            error = error or _ERROR_EVENT.search(chunk) is not None
+            result["bytes"] += len(chunk)
+    result["total"] = time.perf_counter() - started
+    result["ok"] = response.status_code == 200 and not error
+    return result
+
+
+async def _drive(args: argparse.Namespace, base_url: str, process) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+    timeout = httpx.Timeout(args.timeout)
+    client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout)
+    async with client:
+        await _wait_ready(client, process)
+        sampler = _Sampler(process.pid)
+        sampler.sample()
+        idle_fds = sampler.peak_fds
+        sampler_task = asyncio.create_task(sampler.run())
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def worker(i: int) -> dict:
+            if args.repeat:
+                message = "What kind of systems has Dingkang worked on recently?"
+            else:
+                message = f"Benchmark question {i}: summarize his work on topic {i}."
+            async with semaphore:
+                try:
+                    return await _one_request(client, message)
+                except httpx.HTTPError as e:
+                    return {"ok": False, "error": type(e).__name__}
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(i) for i in range(args.requests)))
+        wall = time.perf_counter() - started
+
+        # Let pooled clients refill and sessions settle before counting FDs.
+        await asyncio.sleep(args.settle)
+        sampler_task.cancel()
+        fds_after = _count_fds(process.pid)
+
+    ok = [r for r in results if r["ok"]]
+    ttfb = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    first_text = [r["first_text"] for r in ok if r["first_text"] is not None]
+    total = [r["total"] for r in ok]
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "peak_rss_mb": sampler.peak_rss_mb,
+        "peak_fds": sampler.peak_fds,
+        "idle_fds": idle_fds,
+        "fds_after": fds_after,
+    }
+    for name, values in (("ttfb", ttfb), ("first_text", first_text), ("total", total)):
+        for pct in (50, 95, 99):
+            report[f"{name}_p{pct}"] = _percentile(values, pct)
+    return report
+
+
+def _compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print a comparison table and return the regressed metric names."""
+    regressions = []
+    print(f"\n{'metric':<16} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, (higher_is_better, slack) in _COMPARED.items():
+        old, new = baseline.get(name), report.get(name)
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance and abs(new - old) > slack:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<16} {old:>10.3f} {new:>10.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench", description="Benchmark /api/chat with a fake agent."
+    )
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--repeat", action="store_true",
+                        help="send the same question every time (cache/coalescing)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="seconds to wait after the load before counting FDs")
+    parser.add_argument("--connect-delay", type=float, default=0.5)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--tool-calls", type=int, default=1)
+    parser.add_argument("--tool-delay", type=float, default=0.05)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the server (repeatable)")
+    parser.add_argument("--baseline", type=Path, default=_DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative regression before failing")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(_BACKEND_DIR),
+        "BENCH_CONNECT_DELAY": str(args.connect_delay),
+        "BENCH_FIRST_TOKEN_DELAY": str(args.first_token_delay),
+        "BENCH_TOKEN_INTERVAL": str(args.token_interval),
+        "BENCH_TOKENS": str(args.tokens),
+        "BENCH_TOOL_CALLS": str(args.tool_calls),
+        "BENCH_TOOL_DELAY": str(args.tool_delay),
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.server", "--port", str(port)],
+        cwd=_BACKEND_DIR,
+        env=env,
+    )
+    try:
+        report = asyncio.run(_drive(args, f"http://127.0.0.1:{port}", process))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    report["commit"] = _git_commit()
+    report["config"] = {
+        k: v for k, v in vars(args).items()
+        if k not in ("baseline", "save_baseline", "json", "tolerance")
+    }
+    print(json.dumps({k: v for k, v in report.items() if k != "config"}, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("config") != report["config"]:
+        print("\nWarning: baseline was recorded with different settings.")
+    if baseline.get("commit") and baseline["commit"] != report["commit"]:
+        # The stream format and the server change between commits; compare
+        # against a baseline recorded at the commit being measured against.
+        print(f"\nBaseline was recorded at commit {baseline['commit']}.")
+    regressions = _compare(report, baseline, args.tolerance)
+    if report["errors"]:
+        print(f"\n{report['errors']} request(s) failed.")
+    if regressions:
+        print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Stand-in for ClaudeSDKClient used by the benchmark server.
+
+Implements the part of the client surface the backend uses (connect,
+query, receive_response, interrupt, disconnect) without spawning the CLI
+or calling the API. Tool calls run the real MCP tool handlers in a task
+started by connect(), as the SDK does. Timing is controlled by
+environment variables so the benchmark runner can configure the server
+subprocess:
+
+- BENCH_CONNECT_DELAY: seconds connect() takes (default 0.5)
+- BENCH_FIRST_TOKEN_DELAY: seconds before the first token (default 0.3)
+- BENCH_TOKEN_INTERVAL: seconds between tokens (default 0.02)
+- BENCH_TOKENS: tokens per answer (default 120)
+- BENCH_TOOL_CALLS: tool calls made before answering (default 1)
+- BENCH_TOOL_DELAY: seconds each tool call takes (default 0.05)
+"""
+
+import asyncio
+import itertools
+import os
+import uuid
+from typing import Any, AsyncIterator
+
+from claude_agent_sdk import (
+    AssistantMessage,
+    ResultMessage,
+    StreamEvent,
+    TextBlock,
+    ToolResultBlock,
+    ToolUseBlock,
+    UserMessage,
+)
+
+from app.agent.tools import INFO_TOOLS
+
+CONNECT_DELAY = float(os.getenv("BENCH_CONNECT_DELAY", "0.5"))
+FIRST_TOKEN_DELAY = float(os.getenv("BENCH_FIRST_TOKEN_DELAY", "0.3"))
+TOKEN_INTERVAL = float(os.getenv("BENCH_TOKEN_INTERVAL", "0.02"))
+TOKENS = int(os.getenv("BENCH_TOKENS", "120"))
+TOOL_CALLS = int(os.getenv("BENCH_TOOL_CALLS", "1"))
+TOOL_DELAY = float(os.getenv("BENCH_TOOL_DELAY", "0.05"))
+
+_TOOLS = itertools.cycle(
+    ["get_github_repos", "get_project_details", "get_resume", "search_knowledge"]
+)
+_TOOL_ARGS = {"project_name": "dingkwang-site", "query": "agents"}
+_WORDS = (
+    "Dingkang builds AI agents and infrastructure for automated test "
+    "generation in vehicle software pipelines ."
+).split()
+
+
+class FakeClaudeSDKClient:
+    """Replays a synthetic agent run with configurable timing."""
+
+    def __init__(self, options: Any = None) -> None:
+        self.options = options
+        self._transport = None
+        self._connected = False
+        self._pending: str | None = None
+        self._session_id = uuid.uuid4().hex
+        self._calls: asyncio.Queue = asyncio.Queue()
+        self._tool_server: asyncio.Task | None = None
+
+    async def connect(self, prompt: Any = None) -> None:
+        await asyncio.sleep(CONNECT_DELAY)
+        self._tool_server = asyncio.create_task(self._serve_tools())
+        self._connected = True
+
+    async def _serve_tools(self) -> None:
+        handlers = {t.name: t.handler for t in INFO_TOOLS}
+        while True:
+            name, future = await self._calls.get()
+            try:
+                future.set_result(await handlers[name](dict(_TOOL_ARGS)))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _call_tool(self, name: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._calls.put_nowait((name, future))
+        return await future
+
+    async def query(self, prompt: str, session_id: str = "default") -> None:
+        if not self._connected:
+            raise RuntimeError("Not connected")
+        self._pending = prompt
+
+    async def interrupt(self) -> None:
+        self._pending = None
+
+    async def disconnect(self) -> None:
+        self._connected = False
+        if self._tool_server is not None:
+            self._tool_server.cancel()
+            self._tool_server = None
+
+    def _event(self, text: str) -> StreamEvent:
+        return StreamEvent(
+            uuid=uuid.uuid4().hex,
+            session_id=self._session_id,
+            event={
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": text},
+            },
+        )
+
+    async def receive_response(self) -> AsyncIterator[Any]:
+        if self._pending is None:
+            return
+        self._pending = None
+        partial = bool(getattr(self.options, "include_partial_messages", False))
+        model = getattr(self.options, "model", None) or "fake-model"
+
+        for n in range(TOOL_CALLS):
+            await asyncio.sleep(TOOL_DELAY)
+            name = next(_TOOLS)
+            yield AssistantMessage(
+                content=[ToolUseBlock(id=f"tool_{n}", name=name, input={})],
+                model=model,
+            )
+            result = await self._call_tool(name)
+            yield UserMessage(
+                content=[
+                    ToolResultBlock(tool_use_id=f"tool_{n}", content=result["content"])
+                ]
+            )
+
+        await asyncio.sleep(FIRST_TOKEN_DELAY)
+        tokens = []
+        for n in range(TOKENS):
+            if n:
+                await asyncio.sleep(TOKEN_INTERVAL)
+            token = _WORDS[n % len(_WORDS)] + " "
+            tokens.append(token)
+            if partial:
+                yield self._event(token)
+
+        text = "".join(tokens)
+        yield AssistantMessage(content=[TextBlock(text=text)], model=model)
+        yield ResultMessage(
+            subtype="success",
+            duration_ms=0,
+            duration_api_ms=0,
+            is_error=False,
+            num_turns=1 + TOOL_CALLS,
+            session_id=self._session_id,
+            total_cost_usd=0.0,
+            usage={"input_tokens": 2000, "output_tokens": TOKENS},
+            result=text,
+        )
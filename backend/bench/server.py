@@ -0,0 +1,33 @@
+"""Run the backend with the fake agent client, for benchmarking.
+
+    python -m bench.server --port 8765
+
+Everything except ClaudeSDKClient is the real application.
+"""
+
+import argparse
+import os
+
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000")
+
+import uvicorn
+
+from app.agent import pool
+from bench.fake_agent import FakeClaudeSDKClient
+
+pool.ClaudeSDKClient = FakeClaudeSDKClient
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Shared fixtures: a controllable clock, an in-process RESP server and
+fake agent clients."""
+
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class Clock:
+    """Stands in for time.time(); advanced explicitly by the test."""
+
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A window-aligned start keeps fixed-window arithmetic readable.
+    fake = Clock(1_000_000 * 60.0)
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def monotonic(monkeypatch):
+    """Stands in for time.monotonic(), for TTLs and dwell times.
+
+    The asyncio event loop reads it as well, so tests using it must not
+    wait on timers.
+    """
+    fake = Clock(1_000.0)
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def _bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespStub:
+    """A minimal Redis-compatible server for tests.
+
+    Implements the commands the shared-state and rate-limit backends send
+    (plus PING, ECHO, MGET and BLPOP to reach every RESP2 reply type), with
+    key expiry on time.time(). ``password`` makes it require AUTH,
+    ``stall`` makes it stop answering and ``drop()`` closes every client
+    connection.
+    """
+
+    def __init__(self, password: str | None = None) -> None:
+        self.password = password
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands: list[tuple[bytes, ...]] = []
+        self.connections = 0
+        self.stall = False
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+
+    async def close(self) -> None:
+        self.drop()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop(self) -> None:
+        for writer in list(self._writers):
+            writer.close()
+
+    def value(self, key: str) -> bytes | None:
+        item = self.data.get(key.encode())
+        if item is None or (item[1] is not None and item[1] <= time.time()):
+            return None
+        return item[0]
+
+    async def _serve(self, reader, writer) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        authed = self.password is None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                self.commands.append(args)
+                if self.stall:
+                    continue
+                name = args[0].upper()
+                if name == b"AUTH":
+                    authed = args[-1].decode() == self.password
+                    reply = b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n"
+                elif not authed:
+                    reply = b"-NOAUTH Authentication required.\r\n"
+                else:
+                    reply = self._dispatch(name, args[1:])
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_command(self, reader) -> tuple[bytes, ...] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return tuple(args)
+
+    def _get(self, key: bytes) -> bytes | None:
+        return self.value(key.decode())
+
+    def _dispatch(self, name: bytes, args: tuple[bytes, ...]) -> bytes:
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"ECHO":
+            return _bulk(args[0])
+        if name == b"GET":
+            return _bulk(self._get(args[0]))
+        if name == b"MGET":
+            values = [_bulk(self._get(key)) for key in args]
+            return b"*%d\r\n" % len(values) + b"".join(values)
+        if name == b"BLPOP":
+            # No lists here, so every BLPOP times out: a null array.
+            return b"*-1\r\n"
+        if name == b"SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            if b"NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.time() + int(options[options.index(b"PX") + 1]) / 1000
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % sum(self.data.pop(k, None) is not None for k in args)
+        if name in (b"INCR", b"DECR", b"INCRBY"):
+            amount = {b"INCR": 1, b"DECR": -1}.get(name) or int(args[1])
+            current = self._get(args[0])
+            try:
+                value = int(current or 0) + amount
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+            expires_at = self.data[args[0]][1] if current is not None else None
+            self.data[args[0]] = (str(value).encode(), expires_at)
+            return b":%d\r\n" % value
+        if name == b"PEXPIRE":
+            if self._get(args[0]) is None:
+                return b":0\r\n"
+            value = self.data[args[0]][0]
+            self.data[args[0]] = (value, time.time() + int(args[1]) / 1000)
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name.lower()
+
+
+@pytest.fixture
+async def resp_server():
+    server = RespStub()
+    await server.start()
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+def fake_sdk(monkeypatch):
+    """Connect the bench's fake agent clients, without delays."""
+    from app.agent import pool
+    from bench import fake_agent
+
+    for name in ("CONNECT_DELAY", "FIRST_TOKEN_DELAY", "TOKEN_INTERVAL"):
+        monkeypatch.setattr(fake_agent, name, 0.0)
+    monkeypatch.setattr(fake_agent, "TOOL_CALLS", 0)
+    monkeypatch.setattr(fake_agent, "TOKENS", 3)
+    monkeypatch.setattr(pool, "ClaudeSDKClient", fake_agent.FakeClaudeSDKClient)
+    return fake_agent.FakeClaudeSDKClient
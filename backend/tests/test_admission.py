@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejectedError
+
+pytestmark = pytest.mark.anyio
+
+
+async def _positions(admission: AdmissionController, ticket) -> list[int]:
+    return [position async for position in admission.wait(ticket)]
+
+
+async def test_runs_start_up_to_the_cap():
+    admission = AdmissionController(max_concurrent=2, max_queue=1, timeout=5)
+    first, second = admission.enqueue(), admission.enqueue()
+    assert first.admitted.done() and second.admitted.done()
+    assert await _positions(admission, first) == []
+    third = admission.enqueue()
+    assert not third.admitted.done()
+    assert admission.stats()["active"] == 2 and admission.stats()["queued"] == 1
+
+
+async def test_queue_is_fifo_and_reports_positions():
+    admission = AdmissionController(max_concurrent=1, max_queue=3, timeout=5)
+    running = admission.enqueue()
+    first, second = admission.enqueue(), admission.enqueue()
+    seen: list[list[int]] = [[], []]
+
+    async def wait(ticket, positions):
+        async for position in admission.wait(ticket):
+            positions.append(position)
+
+    waiters = [
+        asyncio.create_task(wait(ticket, positions))
+        for ticket, positions in zip((first, second), seen)
+    ]
+    await asyncio.sleep(0)
+    assert seen == [[1], [2]]
+
+    admission.release(running)
+    await waiters[0]
+    await asyncio.sleep(0)
+    # The second request moved up when the first was admitted.
+    assert seen[1] == [2, 1]
+    assert not second.admitted.done()
+
+    admission.release(first)
+    await waiters[1]
+    assert second.admitted.done()
+    assert admission.admitted == 3
+
+
+async def test_overflow_is_rejected():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, timeout=5)
+    admission.enqueue()
+    admission.enqueue()
+    assert admission.full
+    with pytest.raises(AdmissionRejectedError):
+        admission.enqueue()
+    assert admission.rejected == 1
+    assert admission.queue_fill == 1.0
+
+
+async def test_wait_times_out():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, timeout=0.05)
+    running = admission.enqueue()
+    queued = admission.enqueue()
+    with pytest.raises(AdmissionRejectedError, match="Timed out"):
+        await _positions(admission, queued)
+    assert admission.timed_out == 1
+    # The timed-out request gave up its place.
+    assert admission.stats()["queued"] == 0
+    admission.release(running)
+    assert admission.stats()["active"] == 0
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    admission = AdmissionController(max_concurrent=1, max_queue=2, timeout=5)
+    running = admission.enqueue()
+    cancelled, next_up = admission.enqueue(), admission.enqueue()
+
+    async def run(ticket):
+        try:
+            async for _ in admission.wait(ticket):
+                pass
+        finally:
+            admission.release(ticket)
+
+    task = asyncio.create_task(run(cancelled))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert admission.stats()["queued"] == 1
+
+    admission.release(running)
+    assert next_up.admitted.done()
+
+
+async def test_cancelled_run_releases_its_slot():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, timeout=5)
+    started = asyncio.Event()
+
+    async def run(ticket):
+        try:
+            async for _ in admission.wait(ticket):
+                pass
+            started.set()
+            await asyncio.Event().wait()
+        finally:
+            admission.release(ticket)
+
+    task = asyncio.create_task(run(admission.enqueue()))
+    await started.wait()
+    queued = admission.enqueue()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert queued.admitted.done()
+    assert admission.stats()["active"] == 1
+
+
+async def test_release_is_idempotent():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, timeout=5)
+    ticket = admission.enqueue()
+    admission.release(ticket)
+    admission.release(ticket)
+    assert admission.stats()["active"] == 0
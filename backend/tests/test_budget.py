@@ -0,0 +1,158 @@
+import pytest
+
+from app.services.budget import BudgetPolicy, billable_tokens, build_profiles
+from app.shared_state import MemoryState
+
+pytestmark = pytest.mark.anyio
+
+# The clock fixture starts on a minute boundary.
+WINDOW = 60.0
+PROFILES = build_profiles(6, 2, "sonnet", "haiku")
+
+
+def _policy(state=None, **kwargs) -> BudgetPolicy:
+    options = {
+        "window": WINDOW,
+        "global_tokens": 0,
+        "per_client_tokens": 0,
+        "reduce_at": 0.5,
+        "economy_at": 0.8,
+    }
+    return BudgetPolicy(state or MemoryState(), PROFILES, **(options | kwargs))
+
+
+class _Unavailable(MemoryState):
+    async def get(self, key):
+        raise ConnectionError("down")
+
+    async def incr(self, key, amount=1, ttl=None):
+        raise ConnectionError("down")
+
+
+def test_billable_tokens():
+    usage = {
+        "input_tokens": 100,
+        "output_tokens": 50,
+        "cache_creation_input_tokens": 20,
+        "cache_read_input_tokens": 1000,
+        "server_tool_use": {"web_search_requests": 1},
+    }
+    assert billable_tokens(usage) == 270
+    assert billable_tokens({"input_tokens": None}) == 0
+    assert billable_tokens(None) == 0
+
+
+def test_profiles():
+    full, reduced, economy = PROFILES
+    assert (full.level, full.max_turns, full.model) == (0, 6, "sonnet")
+    assert (reduced.max_turns, reduced.slim_prompt, reduced.model) == (
+        2,
+        True,
+        "sonnet",
+    )
+    assert economy.model == "haiku"
+    # Reduced runs never get more turns than full ones.
+    assert build_profiles(1, 2, "", "")[1].max_turns == 1
+    assert build_profiles(6, 2, "sonnet", "")[2].model == "sonnet"
+
+
+async def test_client_over_its_budget_is_refused(clock):
+    budget = _policy(per_client_tokens=1000)
+    await budget.charge("1.2.3.4", 600)
+    assert await budget.check("1.2.3.4") == 0
+    await budget.charge("1.2.3.4", 500)
+    wait = await budget.check("1.2.3.4")
+    # This window ends, then enough of it has to slide out of the next one.
+    assert wait == pytest.approx(WINDOW + WINDOW * (1 - 1000 / 1100))
+    assert await budget.check("5.6.7.8") == 0
+    assert budget.rejected == 1
+    assert budget.charged_tokens == 1100
+
+
+async def test_client_budget_slides(clock):
+    budget = _policy(per_client_tokens=1000)
+    await budget.charge("1.2.3.4", 1500)
+    # Half way into the next window, half of the 1500 still counts.
+    clock.advance(1.5 * WINDOW)
+    assert await budget.check("1.2.3.4") == 0
+    await budget.charge("1.2.3.4", 300)
+    assert await budget.check("1.2.3.4") > 0
+    clock.advance(WINDOW)
+    assert await budget.check("1.2.3.4") == 0
+
+
+async def test_budgets_fail_open(clock):
+    budget = _policy(_Unavailable(), global_tokens=1000, per_client_tokens=1000)
+    await budget.charge("1.2.3.4", 5000)
+    assert await budget.check("1.2.3.4") == 0
+    assert (await budget.refresh(0.0)).name == "full"
+
+
+async def test_global_usage_degrades_the_profile(clock, monotonic):
+    budget = _policy(global_tokens=1000)
+    changes = []
+    budget.add_listener(changes.append)
+    assert (await budget.refresh(0.0)).name == "full"
+
+    await budget.charge(None, 600)
+    assert (await budget.refresh(0.0)).name == "reduced"
+    await budget.charge(None, 300)
+    assert (await budget.refresh(0.0)).name == "economy"
+    assert [profile.name for profile in changes] == ["reduced", "economy"]
+    assert budget.profile_changes == 2
+    assert budget.stats()["level"] == 2
+
+
+async def test_global_usage_is_reread_at_most_once_a_second(clock, monotonic):
+    state = MemoryState()
+    budget = _policy(state, global_tokens=1000)
+    other_worker = _policy(state, global_tokens=1000)
+    await budget.refresh(0.0)
+    await other_worker.charge(None, 900)
+    assert (await budget.refresh(0.0)).name == "full"
+    monotonic.advance(1.0)
+    assert (await budget.refresh(0.0)).name == "economy"
+
+
+async def test_queue_fill_counts_as_pressure(monotonic):
+    budget = _policy()
+    assert (await budget.refresh(0.5)).name == "reduced"
+    assert budget.pressure == 0.5
+    assert (await budget.refresh(2.0)).name == "economy"
+    assert budget.pressure == 1.0
+
+
+async def test_recovery_needs_lower_pressure_and_dwell(monotonic):
+    budget = _policy()
+    assert (await budget.refresh(0.9)).name == "economy"
+
+    # Under the economy threshold, but not by the recovery margin (0.8 * 0.8).
+    monotonic.advance(60)
+    assert (await budget.refresh(0.7)).name == "economy"
+
+    # Low enough, but only once the profile has been in use for 30s.
+    budget = _policy()
+    await budget.refresh(0.9)
+    monotonic.advance(29)
+    assert (await budget.refresh(0.6)).name == "economy"
+    monotonic.advance(1)
+    assert (await budget.refresh(0.6)).name == "reduced"
+
+    # One level at a time, each with its own dwell.
+    assert (await budget.refresh(0.1)).name == "reduced"
+    monotonic.advance(30)
+    assert (await budget.refresh(0.45)).name == "reduced"
+    assert (await budget.refresh(0.39)).name == "full"
+
+
+async def test_degrading_is_immediate(monotonic):
+    budget = _policy()
+    await budget.refresh(0.6)
+    assert (await budget.refresh(0.85)).name == "economy"
+    assert budget.profile_changes == 2
+
+
+async def test_fixed_profile_when_not_adaptive(monotonic):
+    budget = _policy(adaptive=False)
+    assert (await budget.refresh(1.0)).name == "full"
+    assert budget.profile_changes == 0
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from app.services.coalesce import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+def _run(frames: list[bytes], release: asyncio.Event | None = None):
+    async def run():
+        for frame in frames:
+            if release is not None:
+                await release.wait()
+            yield frame
+
+    return run
+
+
+async def _collect(stream) -> list[bytes]:
+    return [frame async for frame in stream]
+
+
+async def test_on_join_reports_leader_and_follower():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    roles: list[bool] = []
+    leader = asyncio.create_task(
+        _collect(flights.stream("k", _run([b"a"], release), roles.append))
+    )
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(
+        _collect(flights.stream("k", _run([b"other"]), roles.append))
+    )
+    await asyncio.sleep(0)
+    release.set()
+    assert await leader == await follower == [b"a"]
+    assert roles == [False, True]
+
+
+async def test_a_flight_that_ended_before_iteration_is_not_joined():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    leader = asyncio.create_task(_collect(flights.stream("k", _run([b"a"], release))))
+    await asyncio.sleep(0)
+    assert "k" in flights
+    # Checked while the first run is in flight, iterated after it ended.
+    roles: list[bool] = []
+    late = flights.stream("k", _run([b"b"]), roles.append)
+    release.set()
+    await leader
+    assert await _collect(late) == [b"b"]
+    assert roles == [False]
+
+
+class _Run:
+    """A run that emits frames on demand; counts starts and cancellations."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[bytes | Exception | None] = asyncio.Queue()
+        self.started = 0
+        self.cancelled = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            while (frame := await self.queue.get()) is not None:
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+async def test_followers_get_every_frame_of_one_run():
+    flights = SingleFlight()
+    run = _Run()
+    first = asyncio.create_task(_collect(flights.stream("k", run)))
+    second = asyncio.create_task(_collect(flights.stream("k", run)))
+    await asyncio.sleep(0)
+    run.queue.put_nowait(b"a")
+    run.queue.put_nowait(b"b")
+    await asyncio.sleep(0)
+
+    # A late follower gets the frames it missed replayed, then the rest.
+    late = asyncio.create_task(_collect(flights.stream("k", run)))
+    await asyncio.sleep(0)
+    run.queue.put_nowait(b"c")
+    run.queue.put_nowait(None)
+    assert await first == await second == await late == [b"a", b"b", b"c"]
+    assert run.started == 1
+    assert flights.stats() == {"in_flight": 0, "runs": 1, "coalesced": 2}
+
+
+async def test_leader_failure_ends_every_subscriber():
+    flights = SingleFlight()
+    run = _Run()
+    subscribers = [
+        asyncio.create_task(_collect(flights.stream("k", run))) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    run.queue.put_nowait(b"a")
+    run.queue.put_nowait(RuntimeError("agent crashed"))
+    for subscriber in subscribers:
+        assert await subscriber == [b"a"]
+    assert "k" not in flights
+
+    # The failed run is not reused.
+    retry = asyncio.create_task(_collect(flights.stream("k", run)))
+    await asyncio.sleep(0)
+    run.queue.put_nowait(None)
+    assert await retry == []
+    assert run.started == 2
+
+
+async def test_run_is_cancelled_when_its_last_subscriber_leaves():
+    flights = SingleFlight()
+    run = _Run()
+    leader = flights.stream("k", run)
+    follower = flights.stream("k", run)
+    run.queue.put_nowait(b"a")
+    assert await anext(leader) == b"a"
+    assert await anext(follower) == b"a"
+
+    await leader.aclose()
+    await asyncio.sleep(0)
+    assert not run.cancelled.is_set()
+    run.queue.put_nowait(b"b")
+    assert await anext(follower) == b"b"
+
+    await follower.aclose()
+    await asyncio.wait_for(run.cancelled.wait(), 1)
+    assert "k" not in flights
+
+    # The next request for the key starts a fresh run.
+    roles: list[bool] = []
+    fresh = flights.stream("k", run, roles.append)
+    run.queue.put_nowait(None)
+    assert await _collect(fresh) == []
+    assert roles == [False]
+    assert run.started == 2
@@ -0,0 +1,87 @@
+import pytest
+
+from app.agent.knowledge import get_knowledge
+from app.services.faq import INTENTS, FaqRouter
+
+# The FAQ_MIN_CONFIDENCE default. Questions on either side of it are pinned
+# below, so a change to the intent table or the scoring that moves them
+# across shows up here.
+THRESHOLD = 0.75
+
+
+@pytest.fixture
+def router() -> FaqRouter:
+    return FaqRouter(INTENTS, THRESHOLD)
+
+
+@pytest.mark.parametrize(
+    ("question", "intent"),
+    [
+        ("What projects has he worked on?", "projects"),
+        ("list his github repos", "projects"),
+        ("What open source has he built?", "projects"),
+        ("How can I contact him?", "contact"),
+        ("What's his email address?", "contact"),
+        ("Where does he work?", "current_role"),
+        ("Where is he working?", "current_role"),
+        ("What are his skills?", "skills"),
+        ("What technologies does he use at work?", "skills"),
+        ("Hello!", "greeting"),
+        ("hi there", "greeting"),
+    ],
+)
+def test_faq_questions_are_answered(router, question, intent):
+    match = router.match(question)
+    assert match is not None
+    assert match.intent == intent
+    assert match.confidence >= THRESHOLD
+    assert match.answer
+
+
+@pytest.mark.parametrize(
+    ("question", "closest"),
+    [
+        # Close to an intent, but asking for something its template lacks.
+        ("What is his current job title?", "current_role"),
+        ("Which company does he work for?", "current_role"),
+        ("What programming languages does he use?", "skills"),
+        ("What projects has he worked on that use radar?", "projects"),
+        ("Where did he work before Tesla?", "current_role"),
+        ("How do I contact his manager?", "contact"),
+    ],
+)
+def test_near_misses_fall_through_to_the_agent(router, question, closest):
+    intent, confidence = router.classify(question)
+    assert intent == closest
+    assert 0.6 < confidence < THRESHOLD
+    assert router.match(question) is None
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is his favourite food?",
+        "What does he do?",
+        # Long messages are not classified at all.
+        "Can you walk me through how his work on the perception stack at "
+        "Tesla relates to the projects he has built on GitHub?",
+    ],
+)
+def test_unrelated_questions_do_not_match(router, question):
+    assert router.classify(question) == (None, 0.0)
+    assert router.match(question) is None
+
+
+def test_hit_and_miss_counts(router):
+    router.match("How can I contact him?")
+    router.match("What is his favourite food?")
+    stats = router.stats()
+    assert stats[("hit", "contact")] == 1
+    assert stats[("miss", "")] == 1
+    assert router.hit_rate == 0.5
+
+
+def test_projects_answer_lists_the_repositories(router):
+    match = router.match("list his github repos")
+    for repo in get_knowledge().repos:
+        assert f"**{repo['name']}**" in match.answer
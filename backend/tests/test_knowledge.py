@@ -0,0 +1,196 @@
+import json
+import os
+
+import pytest
+
+from app.agent import knowledge, retrieval
+from app.agent.knowledge import get_knowledge, reload_knowledge
+from app.agent.retrieval import (
+    Chunk,
+    SearchIndex,
+    chunk_markdown,
+    get_search_index,
+)
+
+REPOS = [
+    {
+        "name": "tpu-training",
+        "description": "Distributed training on TPUs.",
+        "aliases": ["TPU Trainer", "jax trainer"],
+    },
+    {"name": "homepage", "description": "This site."},
+    {"name": "homelab", "description": "Home server configuration."},
+    {"name": "radar-fusion", "description": "Camera and radar sensor fusion."},
+]
+
+RESUME = """\
+# Dingkang Wang
+
+## Experience
+
+### Tesla (Current)
+
+Works on the Autopilot perception stack: camera and radar fusion.
+
+### Google
+
+Built TPU training infrastructure for large models.
+
+## Contact
+
+Email: someone@example.com
+"""
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    """Knowledge files of the test's own; re-stat'ed on every lookup."""
+    projects = tmp_path / "projects"
+    projects.mkdir()
+    (tmp_path / "repos.json").write_text(json.dumps(REPOS))
+    (tmp_path / "resume.md").write_text(RESUME)
+    (projects / "radar-fusion.md").write_text(
+        "# radar-fusion\n\nFuses radar returns with camera detections.\n"
+    )
+    monkeypatch.setattr(knowledge, "_REPOS_PATH", tmp_path / "repos.json")
+    monkeypatch.setattr(knowledge, "_RESUME_PATH", tmp_path / "resume.md")
+    monkeypatch.setattr(knowledge, "_PROJECTS_DIR", projects)
+    monkeypatch.setattr(knowledge, "KNOWLEDGE_RECHECK_INTERVAL", 0)
+    monkeypatch.setattr(knowledge, "_index", None)
+    monkeypatch.setattr(knowledge, "_listeners", [])
+    monkeypatch.setattr(retrieval, "_index", None)
+    return tmp_path
+
+
+def _touch(path, text: str) -> None:
+    """Rewrite ``path`` with a modification time the index has not seen."""
+    mtime = os.stat(path).st_mtime_ns
+    path.write_text(text)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def test_index_loads_the_files(data):
+    index = get_knowledge()
+    assert [repo["name"] for repo in index.repos] == [r["name"] for r in REPOS]
+    # Aliases are for lookups only and stay out of the tool payload.
+    assert "aliases" not in index.repos_payload
+    assert index.details["radar-fusion"] == (
+        "Fuses radar returns with camera detections."
+    )
+    assert index.details["homepage"] == "This site."
+    assert index.available == "homelab, homepage, radar-fusion, tpu-training"
+    assert index.resume_payload.startswith("# Dingkang Wang")
+
+
+@pytest.mark.parametrize(
+    ("query", "name"),
+    [
+        ("tpu-training", "tpu-training"),
+        ("TPU Training", "tpu-training"),
+        ("jax trainer", "tpu-training"),
+        ("Radar_Fusion", "radar-fusion"),
+    ],
+)
+def test_exact_and_alias_lookup(data, query, name):
+    assert get_knowledge().lookup(query).name == name
+
+
+def test_unique_prefix_lookup(data):
+    result = get_knowledge().lookup("homep")
+    assert result.name == "homepage"
+    assert result.details == "This site."
+
+
+def test_ambiguous_prefix_returns_suggestions(data):
+    result = get_knowledge().lookup("home")
+    assert result.name is None
+    assert result.suggestions == ("homelab", "homepage")
+
+
+def test_trigram_lookup_tolerates_typos(data):
+    assert get_knowledge().lookup("tpu trainnig").name == "tpu-training"
+    assert get_knowledge().lookup("radr fusion").name == "radar-fusion"
+
+
+def test_unknown_project(data):
+    assert get_knowledge().lookup("kubernetes operator").name is None
+    assert get_knowledge().lookup("!!").suggestions == ()
+
+
+def test_index_is_rebuilt_when_a_file_changes(data):
+    reloaded = []
+    knowledge.add_reload_listener(reloaded.append)
+    before = get_knowledge()
+    assert get_knowledge() is before
+
+    # A new project file...
+    (data / "projects" / "homepage.md").write_text("# homepage\n\nThe new site.\n")
+    added = get_knowledge()
+    assert added is not before
+    assert added.details["homepage"] == "The new site."
+    assert added.version != before.version
+
+    # ...and an edited one.
+    _touch(data / "projects" / "radar-fusion.md", "# radar-fusion\n\nRetired.\n")
+    edited = get_knowledge()
+    assert edited.details["radar-fusion"] == "Retired."
+    assert reloaded == [added, edited]
+
+
+def test_files_are_not_restated_within_the_interval(data, monkeypatch):
+    monkeypatch.setattr(knowledge, "KNOWLEDGE_RECHECK_INTERVAL", 3600)
+    before = get_knowledge()
+    _touch(data / "resume.md", "# Someone else\n")
+    assert get_knowledge() is before
+    assert reload_knowledge().resume_payload == "# Someone else"
+
+
+def test_version_depends_only_on_content(data):
+    first = get_knowledge().version
+    _touch(data / "resume.md", RESUME)
+    assert reload_knowledge().version == first
+
+
+def test_markdown_is_chunked_by_heading_path():
+    chunks = chunk_markdown("resume", RESUME)
+    assert [chunk.title for chunk in chunks] == [
+        "Dingkang Wang > Experience > Tesla (Current)",
+        "Dingkang Wang > Experience > Google",
+        "Dingkang Wang > Contact",
+    ]
+    assert chunks[2].text == "Email: someone@example.com"
+
+
+def test_bm25_ranks_the_most_relevant_section_first(data):
+    index = get_search_index()
+    results = index.search("radar fusion", top_k=2)
+    assert [chunk.title for chunk, _ in results] == [
+        "radar-fusion",
+        "Dingkang Wang > Experience > Tesla (Current)",
+    ]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_bm25_searches_headings_and_skips_stopwords(data):
+    index = get_search_index()
+    # "Google" only appears in a heading.
+    assert index.search("google")[0][0].title.endswith("> Google")
+    assert index.search("what does he do") == []
+    assert index.search("unheard-of words") == []
+    assert len(index.search("training", top_k=1)) == 1
+
+
+def test_bm25_prefers_shorter_documents_for_the_same_term_frequency():
+    short = Chunk("a", "short", "lidar calibration")
+    long = Chunk("b", "long", "lidar " + " ".join(f"w{n}" for n in range(40)))
+    index = SearchIndex([long, short, Chunk("c", "other", "unrelated text")])
+    assert [chunk for chunk, _ in index.search("lidar")] == [short, long]
+
+
+def test_search_index_follows_knowledge_reloads(data):
+    before = get_search_index()
+    assert get_search_index() is before
+    _touch(data / "resume.md", RESUME + "\n## Hobbies\n\nSailing.\n")
+    after = get_search_index()
+    assert after is not before
+    assert after.search("sailing")[0][0].title == "Dingkang Wang > Hobbies"
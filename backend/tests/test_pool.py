@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from app.agent import pool as pool_module
+from app.agent.pool import ClientPool, PoolExhaustedError
+from bench import fake_agent
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeProcess:
+    returncode = None
+    killed = False
+
+    def kill(self) -> None:
+        self.killed = True
+        self.returncode = -9
+
+
+class HungClient(fake_agent.FakeClaudeSDKClient):
+    """A client whose CLI starts but never finishes connecting."""
+
+    def __init__(self, options=None) -> None:
+        super().__init__(options)
+        self.process = FakeProcess()
+        self._transport = type("Transport", (), {"_process": self.process})()
+        HungClient.last = self
+
+    async def connect(self, prompt=None) -> None:
+        await asyncio.Event().wait()
+
+    async def disconnect(self) -> None:
+        if not self.process.killed:
+            await asyncio.Event().wait()
+
+
+async def test_connect_without_a_pool_times_out_and_kills_the_cli(monkeypatch):
+    monkeypatch.setattr(pool_module, "ClaudeSDKClient", HungClient)
+    pool = ClientPool(lambda: None, size=0, acquire_timeout=0.05)
+    with pytest.raises(PoolExhaustedError):
+        await asyncio.wait_for(pool.acquire(), 5)
+    assert HungClient.last.process.killed
+
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    async def wait():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout)
+
+
+@pytest.fixture
+async def pool(fake_sdk):
+    pool = ClientPool(lambda: None, size=2, acquire_timeout=0.2, max_waiters=1)
+    await pool.start()
+    await pool.warm_up()
+    await _until(lambda: pool.stats()["idle"] == 2)
+    yield pool
+    await pool.close()
+
+
+async def test_acquire_and_refill(pool):
+    first = await pool.acquire()
+    assert pool.stats() == {"size": 2, "live": 2, "idle": 1, "waiters": 0}
+    # max_uses=1: the client is recycled and the pool connects a new one.
+    pool.release(first)
+    await _until(lambda: pool.stats()["idle"] == 2)
+    clients = {(await pool.acquire()).client, (await pool.acquire()).client}
+    assert first.client not in clients
+    assert not first.client._connected
+
+
+async def test_clients_are_reused_up_to_max_uses(fake_sdk):
+    pool = ClientPool(lambda: None, size=1, max_uses=2)
+    await pool.start()
+    try:
+        pooled = await pool.acquire()
+        pool.release(pooled)
+        assert (await pool.acquire()) is pooled
+        pool.release(pooled)
+        assert pooled.uses == 2
+        assert (await pool.acquire()) is not pooled
+    finally:
+        await pool.close()
+
+
+async def test_failed_runs_recycle_the_client(pool):
+    pooled = await pool.acquire()
+    pool.release(pooled, failed=True)
+    await _until(lambda: pool.stats()["idle"] == 2)
+    assert not pooled.client._connected
+
+
+async def test_flush_replaces_idle_and_checked_out_clients(fake_sdk):
+    pool = ClientPool(lambda: None, size=2, max_uses=5)
+    await pool.start()
+    try:
+        checked_out, idle = await pool.acquire(), await pool.acquire()
+        pool.release(idle)
+        pool.flush()
+        await _until(lambda: not idle.client._connected)
+        # Connected with the old options: recycled on release, however few
+        # uses it has had.
+        pool.release(checked_out)
+        await _until(lambda: pool.stats()["idle"] == 2)
+        assert not checked_out.client._connected
+        fresh = {(await pool.acquire()).client, (await pool.acquire()).client}
+        assert not fresh & {checked_out.client, idle.client}
+    finally:
+        await pool.close()
+
+
+async def test_acquire_times_out_and_sheds_waiters(pool):
+    await pool.acquire()
+    await pool.acquire()
+    waiter = asyncio.create_task(pool.acquire())
+    await _until(lambda: pool.saturated)
+    with pytest.raises(PoolExhaustedError, match="Too many"):
+        await pool.acquire()
+    with pytest.raises(PoolExhaustedError, match="Timed out"):
+        await waiter
+
+
+async def test_detached_clients_leave_the_pool(pool):
+    pooled = await pool.acquire()
+    client = pool.detach(pooled)
+    await _until(lambda: pool.stats()["idle"] == 2)
+    assert pool.stats()["live"] == 2
+    assert client._connected
+    await pool_module.disconnect_client(client)
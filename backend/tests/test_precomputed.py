@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from app.services.precomputed import PrecomputedAnswers, write_snapshot
+
+STUDY = b'data: {"type":"text","content":"Stanford"}\n\ndata: {"type":"done"}\n\n'
+TESLA = b'data: {"type":"text","content":"Autopilot"}\n\ndata: {"type":"done"}\n\n'
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "answers.bin"
+    answers = {
+        "Where did he study?": STUDY,
+        "What does Dingkang do at Tesla?": TESLA,
+        # Same question once normalized: only the first is kept.
+        "where did he study": b"ignored",
+    }
+    assert write_snapshot(path, "p1:k1", answers) == 2
+    return path
+
+
+def test_round_trip(snapshot):
+    answers = PrecomputedAnswers(snapshot)
+    assert answers.load("p1:k1")
+    assert answers.get("Where did he study?", "p1:k1") == STUDY
+    assert answers.get("WHAT does Dingkang do at Tesla", "p1:k1") == TESLA
+    assert answers.get("what does he do at tesla", "p1:k1") == TESLA
+    assert answers.get("Any hobbies?", "p1:k1") is None
+    assert answers.stats() == {"entries": 2, "hits": 3, "misses": 1, "stale": 0}
+    answers.close()
+
+
+def test_snapshot_is_written_atomically(snapshot):
+    assert [p.name for p in snapshot.parent.iterdir()] == ["answers.bin"]
+    header = json.loads(snapshot.read_bytes().split(b"\n", 1)[0])
+    assert header["format"] == "answers"
+    assert header["version"] == "p1:k1"
+
+
+def test_snapshot_from_another_version_is_rejected(snapshot):
+    answers = PrecomputedAnswers(snapshot)
+    assert not answers.load("p2:k1")
+    assert not answers.loaded
+    assert answers.stale
+    assert answers.get("Where did he study?", "p2:k1") is None
+
+
+def test_lookups_stop_once_the_version_moves_on(snapshot):
+    answers = PrecomputedAnswers(snapshot)
+    assert answers.load("p1:k1")
+    assert answers.get("Where did he study?", "p1:k2") is None
+    assert answers.stale
+    answers.close()
+
+
+def test_fuzzy_matches_can_be_disabled(snapshot):
+    answers = PrecomputedAnswers(snapshot, fuzzy=False)
+    assert answers.load("p1:k1")
+    assert answers.get("what does he do at tesla", "p1:k1") is None
+    answers.close()
+
+
+@pytest.mark.parametrize(
+    "content", [b"", b"not json\n", b'{"format": "trace", "schema": 1}\n']
+)
+def test_unreadable_or_foreign_file_is_ignored(tmp_path, content):
+    path = tmp_path / "answers.bin"
+    path.write_bytes(content)
+    answers = PrecomputedAnswers(path)
+    assert not answers.load("p1:k1")
+    assert not answers.stale
+
+
+def test_missing_or_unset_snapshot_is_not_an_error(tmp_path):
+    assert not PrecomputedAnswers(None).load("p1:k1")
+    assert not PrecomputedAnswers(tmp_path / "missing.bin").load("p1:k1")
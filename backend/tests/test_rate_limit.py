@@ -0,0 +1,131 @@
+import math
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.middleware import rate_limit
+from app.middleware.rate_limit import (
+    InMemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+    SharedStateRateLimitBackend,
+)
+from app.shared_state import MemoryState
+
+pytestmark = pytest.mark.anyio
+
+WINDOW = 60.0
+LIMIT = 3
+
+
+@pytest.fixture(params=["memory", "shared", "redis"])
+async def backend(request, resp_server):
+    if request.param == "memory":
+        backend = InMemoryRateLimitBackend(max_keys=100)
+    elif request.param == "shared":
+        backend = SharedStateRateLimitBackend(MemoryState())
+    else:
+        backend = RedisRateLimitBackend(resp_server.url)
+    yield backend
+    await backend.close()
+
+
+async def test_allows_up_to_the_limit_then_denies(backend, clock):
+    for _ in range(LIMIT):
+        assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+    # Nothing in the previous window: this window's count only starts to
+    # decay once the next window begins.
+    assert await backend.hit("ip", LIMIT, WINDOW) == pytest.approx(WINDOW)
+    assert await backend.hit("other", LIMIT, WINDOW) == 0.0
+
+
+async def test_sliding_count_across_a_window_boundary(backend, clock):
+    clock.advance(WINDOW - 1)
+    for _ in range(LIMIT):
+        assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+
+    # 6s into the next window the previous window still weighs 0.9:
+    # 3 * 0.9 = 2.7 < 3 admits one request, 2.7 + 1 does not.
+    clock.advance(1 + 6)
+    assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+    retry_after = await backend.hit("ip", LIMIT, WINDOW)
+    # 3 * (1 - t/60) + 1 < 3 once t > 20s into the window: 14s from now.
+    assert retry_after == pytest.approx(14.0)
+
+    clock.advance(retry_after + 0.01)
+    assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+
+
+async def test_denied_requests_are_not_counted(backend, clock):
+    for _ in range(LIMIT):
+        await backend.hit("ip", LIMIT, WINDOW)
+    for _ in range(5):
+        assert await backend.hit("ip", LIMIT, WINDOW) > 0
+    # Two windows on, a key that was only over the limit by denied
+    # requests is clear again.
+    clock.advance(2 * WINDOW)
+    assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+
+
+async def test_redis_keys_expire_after_two_windows(resp_server, clock):
+    backend = RedisRateLimitBackend(resp_server.url, prefix="rl:")
+    try:
+        await backend.hit("ip", LIMIT, WINDOW)
+        key = f"rl:ip:{int(clock.now // WINDOW)}"
+        assert resp_server.value(key) == b"1"
+        clock.advance(2 * WINDOW)
+        assert resp_server.value(key) is None
+    finally:
+        await backend.close()
+
+
+async def test_redis_undoes_a_denied_hit(resp_server, clock):
+    backend = RedisRateLimitBackend(resp_server.url, prefix="rl:")
+    try:
+        for _ in range(LIMIT + 2):
+            await backend.hit("ip", LIMIT, WINDOW)
+        assert resp_server.value(f"rl:ip:{int(clock.now // WINDOW)}") == b"3"
+    finally:
+        await backend.close()
+
+
+async def test_redis_fails_open(resp_server, clock):
+    url = resp_server.url
+    await resp_server.close()
+    backend = RedisRateLimitBackend(url)
+    try:
+        for _ in range(LIMIT + 2):
+            assert await backend.hit("ip", LIMIT, WINDOW) == 0.0
+    finally:
+        await backend.close()
+
+
+def _request(ip: str) -> Request:
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/chat",
+        "headers": [],
+        "client": (ip, 1234),
+    }
+    return Request(scope)
+
+
+async def test_dependency_sends_retry_after(resp_server, clock, monkeypatch):
+    limiter = RateLimiter(
+        RedisRateLimitBackend(resp_server.url), limit=LIMIT, window_seconds=WINDOW
+    )
+    monkeypatch.setattr(rate_limit, "limiter", limiter)
+    try:
+        clock.advance(30)
+        for _ in range(LIMIT):
+            await rate_limit.rate_limit_dependency(_request("10.0.0.1"))
+        with pytest.raises(HTTPException) as denied:
+            await rate_limit.rate_limit_dependency(_request("10.0.0.1"))
+    finally:
+        await limiter.close()
+
+    assert denied.value.status_code == 429
+    assert denied.value.headers["Retry-After"] == str(math.ceil(WINDOW - 30))
+    assert limiter.rejected == 1
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.resp_client import RespClient, RespError
+
+from conftest import RespStub
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(resp_server):
+    client = RespClient(resp_server.url)
+    yield client
+    await client.close()
+
+
+async def test_reply_types(client):
+    assert await client.execute("PING") == "PONG"
+    assert await client.execute("SET", "k", b"v") == "OK"
+    assert await client.execute("GET", "k") == b"v"
+    assert await client.execute("GET", "missing") is None
+    assert await client.execute("INCR", "n") == 1
+    assert await client.execute("INCRBY", "n", -3) == -2
+    assert await client.execute("MGET", "k", "missing") == [b"v", None]
+    assert await client.execute("BLPOP", "list", 0) is None
+
+
+async def test_binary_and_empty_bulk_strings(client):
+    payload = b"\r\n\x00\xff data: {}\r\n"
+    await client.execute("SET", "bin", payload)
+    assert await client.execute("GET", "bin") == payload
+    assert await client.execute("ECHO", "") == b""
+
+
+async def test_error_reply_raises(client):
+    await client.execute("SET", "k", b"not a number")
+    with pytest.raises(RespError, match="not an integer"):
+        await client.execute("INCR", "k")
+    # The connection is still usable after an error reply.
+    assert await client.execute("PING") == "PONG"
+
+
+async def test_pipeline_returns_errors_in_place(client, resp_server):
+    replies = await client.pipeline(
+        [("SET", "a", 1), ("NOSUCHCOMMAND",), ("INCR", "a"), ("GET", "a")]
+    )
+    assert replies[0] == "OK"
+    assert isinstance(replies[1], RespError)
+    assert replies[2:] == [2, b"2"]
+    assert resp_server.connections == 1
+
+
+async def test_reconnects_after_the_server_drops_the_connection(client, resp_server):
+    assert await client.execute("PING") == "PONG"
+    resp_server.drop()
+    await asyncio.sleep(0)
+    with pytest.raises((ConnectionError, OSError)):
+        await client.execute("PING")
+    assert await client.execute("PING") == "PONG"
+    assert resp_server.connections == 2
+
+
+async def test_timeout_resets_the_connection(resp_server):
+    client = RespClient(resp_server.url, timeout=0.2)
+    try:
+        resp_server.stall = True
+        with pytest.raises(asyncio.TimeoutError):
+            await client.execute("PING")
+        resp_server.stall = False
+        # A late reply to the stalled command must not be read as this one's.
+        assert await client.execute("ECHO", "fresh") == b"fresh"
+        assert resp_server.connections == 2
+    finally:
+        await client.close()
+
+
+async def test_auth_and_select_on_connect():
+    server = RespStub(password="s3cret")
+    await server.start()
+    client = RespClient(server.url + "/2")
+    try:
+        assert await client.execute("PING") == "PONG"
+        assert server.commands[:2] == [(b"AUTH", b"s3cret"), (b"SELECT", b"2")]
+    finally:
+        await client.close()
+        await server.close()
+
+
+async def test_wrong_password_is_an_error():
+    server = RespStub(password="s3cret")
+    await server.start()
+    host_port = server.url.split("@", 1)[1]
+    client = RespClient(f"redis://:wrong@{host_port}")
+    try:
+        with pytest.raises(RespError, match="WRONGPASS"):
+            await client.execute("PING")
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_rejects_other_url_schemes():
+    with pytest.raises(ValueError):
+        RespClient("http://localhost:6379")
@@ -0,0 +1,107 @@
+import pytest
+
+from app.services.response_cache import (
+    ResponseCache,
+    normalize_message,
+    token_set_key,
+)
+from app.shared_state import MemoryState
+
+pytestmark = pytest.mark.anyio
+
+EVENTS = (b'data: {"type":"text","content":"Hi"}\n\n', b'data: {"type":"done"}\n\n')
+
+
+def _cache(**kwargs) -> ResponseCache:
+    options = {"max_entries": 8, "max_bytes": 1 << 20, "ttl": 60.0}
+    return ResponseCache(**(options | kwargs))
+
+
+def test_normalization_and_token_set_key():
+    assert normalize_message("  What does he DO at Tesla?! ") == (
+        "what does he do at tesla"
+    )
+    assert token_set_key("what does he do at tesla") == "tesla"
+    assert token_set_key("tesla work") == token_set_key("work tesla")
+
+
+def test_hit_requires_the_same_prompt_version():
+    cache = _cache()
+    cache.put("Where did he study?", "v1", EVENTS)
+    assert cache.get("where did he study", "v1") == EVENTS
+    assert cache.get("where did he study", "v2") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_the_ttl(monotonic):
+    cache = _cache(ttl=10.0)
+    cache.put("Where did he study?", "v1", EVENTS)
+    monotonic.advance(9.9)
+    assert cache.get("Where did he study?", "v1") == EVENTS
+    monotonic.advance(0.1)
+    assert cache.get("Where did he study?", "v1") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = _cache(max_entries=2)
+    cache.put("first question", "v1", EVENTS)
+    cache.put("second question", "v1", EVENTS)
+    assert cache.get("first question", "v1") is not None
+    cache.put("third question", "v1", EVENTS)
+    assert cache.get("second question", "v1") is None
+    assert cache.get("first question", "v1") is not None
+    assert cache.get("third question", "v1") is not None
+    assert cache.evictions == 1
+
+
+def test_byte_budget_bounds_the_cache():
+    size = sum(map(len, EVENTS))
+    cache = _cache(max_bytes=2 * size + 40)
+    for n in range(3):
+        cache.put(f"question {n}", "v1", EVENTS)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= 2 * size + 40
+    # An answer larger than the whole budget is not stored at all.
+    cache.put("huge", "v1", (b"x" * (4 * size),))
+    assert cache.get("huge", "v1") is None
+
+
+def test_reworded_question_is_a_fuzzy_hit():
+    cache = _cache()
+    cache.put("What does Dingkang do at Tesla?", "v1", EVENTS)
+    assert cache.get("what does he do at tesla", "v1") == EVENTS
+    assert cache.get("Tesla: what does he do?", "v1") == EVENTS
+    assert cache.fuzzy_hits == 2
+    assert cache.get("what did he do before tesla", "v1") is None
+
+
+def test_fuzzy_lookup_can_be_disabled():
+    cache = _cache(fuzzy=False)
+    cache.put("What does Dingkang do at Tesla?", "v1", EVENTS)
+    assert cache.get("what does he do at tesla", "v1") is None
+
+
+def test_evicted_entry_leaves_no_fuzzy_alias():
+    cache = _cache(max_entries=1)
+    cache.put("What does Dingkang do at Tesla?", "v1", EVENTS)
+    cache.put("Where did he study?", "v1", EVENTS)
+    assert cache.get("what does he do at tesla", "v1") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = _cache(max_entries=0)
+    cache.put("Where did he study?", "v1", EVENTS)
+    assert not cache.enabled
+    assert cache.get("Where did he study?", "v1") is None
+
+
+async def test_answer_is_shared_between_workers():
+    shared = MemoryState()
+    first, second = _cache(shared=shared), _cache(shared=shared)
+    await first.store("Where did he study?", "v1", EVENTS)
+    assert await second.fetch("where did he study", "v1") == EVENTS
+    assert second.shared_hits == 1
+    # Now held locally as well.
+    assert second.get("where did he study", "v1") == EVENTS
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from app.services import sse
+from app.services.resumable import (
+    ResumableStreams,
+    StreamGapError,
+    StreamNotFoundError,
+    parse_event_id,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def _frames(count: int):
+    async def frames():
+        for n in range(1, count + 1):
+            yield sse.text(str(n))
+
+    return frames()
+
+
+class _Run:
+    """An agent run that produces frames on demand and notes cancellation."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.cancelled = asyncio.Event()
+
+    async def frames(self):
+        try:
+            while (frame := await self.queue.get()) is not None:
+                yield frame
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+async def _read_all(streams: ResumableStreams, stream_id: str, after: int = 0):
+    return [frame async for frame in streams.read(stream_id, after)]
+
+
+def _id(stream_id: str, seq: int, content: str) -> bytes:
+    return sse.with_id(sse.text(content), f"{stream_id}.{seq}")
+
+
+def test_parse_event_id():
+    assert parse_event_id(" 3f2a.12 ") == ("3f2a", 12)
+    for malformed in ("", "12", "3f2a.", "3f2a.x", ".4"):
+        with pytest.raises(ValueError):
+            parse_event_id(malformed)
+
+
+async def test_frames_carry_resumable_ids():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=1)
+    stream_id = streams.start(_frames(2))
+    assert await _read_all(streams, stream_id) == [
+        _id(stream_id, 1, "1"),
+        _id(stream_id, 2, "2"),
+    ]
+
+
+async def test_resume_after_last_event_id():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=1)
+    stream_id = streams.start(_frames(4))
+    frames = await _read_all(streams, stream_id)
+    last_event_id = frames[1].split(b"\n", 1)[0].removeprefix(b"id: ").decode()
+
+    resumed_id, seq = parse_event_id(last_event_id)
+    assert (resumed_id, seq) == (stream_id, 2)
+    assert await _read_all(streams, resumed_id, seq) == frames[2:]
+    assert streams.resumed == 1
+
+
+async def test_resumed_reader_follows_the_live_run():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=1)
+    run = _Run()
+    stream_id = streams.start(run.frames())
+    run.queue.put_nowait(sse.text("1"))
+    first = streams.read(stream_id)
+    assert await anext(first) == _id(stream_id, 1, "1")
+    await first.aclose()
+
+    resumed = streams.read(stream_id, 1)
+    run.queue.put_nowait(sse.text("2"))
+    run.queue.put_nowait(None)
+    assert [frame async for frame in resumed] == [_id(stream_id, 2, "2")]
+    assert not run.cancelled.is_set()
+
+
+async def test_unknown_stream():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=1)
+    with pytest.raises(StreamNotFoundError):
+        streams.read("0123abcd", 3)
+
+
+async def test_position_dropped_from_the_ring_buffer():
+    streams = ResumableStreams(max_frames=3, ttl=60, grace=1)
+    stream_id = streams.start(_frames(5))
+    assert len(await _read_all(streams, stream_id, 2)) == 3
+    # Frames 1 and 2 are gone: resuming after 1 would skip frame 2.
+    with pytest.raises(StreamGapError):
+        streams.read(stream_id, 1)
+    with pytest.raises(StreamGapError):
+        streams.read(stream_id)
+
+
+async def test_run_is_abandoned_after_the_grace_period():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=0.05)
+    run = _Run()
+    stream_id = streams.start(run.frames())
+    run.queue.put_nowait(sse.text("1"))
+    reader = streams.read(stream_id)
+    await anext(reader)
+    await reader.aclose()
+
+    await asyncio.wait_for(run.cancelled.wait(), 1)
+    assert streams.abandoned == 1
+    with pytest.raises(StreamNotFoundError):
+        streams.read(stream_id, 1)
+
+
+async def test_reconnecting_within_the_grace_period_keeps_the_run():
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=0.05)
+    run = _Run()
+    stream_id = streams.start(run.frames())
+    run.queue.put_nowait(sse.text("1"))
+    reader = streams.read(stream_id)
+    await anext(reader)
+    await reader.aclose()
+
+    resumed = streams.read(stream_id, 1)
+    waiting = asyncio.ensure_future(anext(resumed))
+    await asyncio.sleep(0.1)
+    assert not run.cancelled.is_set()
+    run.queue.put_nowait(sse.text("2"))
+    assert await waiting == _id(stream_id, 2, "2")
+    run.queue.put_nowait(None)
+    assert [frame async for frame in resumed] == []
+    assert streams.abandoned == 0
+
+
+async def test_finished_streams_expire(monotonic):
+    streams = ResumableStreams(max_frames=8, ttl=60, grace=1, max_streams=2)
+    old = streams.start(_frames(1))
+    await _read_all(streams, old)
+    monotonic.advance(61)
+    streams.start(_frames(1))
+    with pytest.raises(StreamNotFoundError):
+        streams.read(old, 1)
@@ -0,0 +1,157 @@
+import pytest
+
+from app.agent import runner as runner_module
+from app.agent import system_prompt
+from app.agent.pool import ClientPool
+from app.agent.runner import (
+    AgentRunner,
+    PerRequestLifecycle,
+    PooledLifecycle,
+    SessionLifecycle,
+    create_lifecycle,
+    get_agent_options,
+    is_cacheable,
+    is_current,
+)
+from app.agent.sessions import SessionManager
+from app.services import sse
+from app.services.admission import AdmissionController
+from app.services.budget import budget
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def resume(tmp_path, monkeypatch):
+    """A resume.md of the test's own, so the prompt version can be bumped."""
+    path = tmp_path / "resume.md"
+    path.write_text("Works on agents.\n")
+    monkeypatch.setattr(system_prompt, "_RESUME_PATH", path)
+    monkeypatch.setattr(system_prompt, "_snapshot", None)
+    monkeypatch.setattr(runner_module, "_options", None)
+    monkeypatch.setattr(runner_module, "_options_version", None)
+    # Profile changes made by a test are undone afterwards.
+    for name in ("_profile", "_changed_at", "_load"):
+        monkeypatch.setattr(budget, name, getattr(budget, name))
+    system_prompt.reload_prompt()
+    return path
+
+
+@pytest.fixture
+def queries(fake_sdk, monkeypatch):
+    """Every prompt sent to a fake client, with the client it was sent to."""
+    sent: list[tuple[object, str]] = []
+
+    class Client(fake_sdk):
+        async def query(self, prompt, session_id="default"):
+            sent.append((self, prompt))
+            await super().query(prompt, session_id)
+
+    monkeypatch.setattr("app.agent.pool.ClaudeSDKClient", Client)
+    return sent
+
+
+def _runner(current=is_current) -> AgentRunner:
+    pool = ClientPool(get_agent_options, size=0)
+    sessions = SessionManager(pool, 4, idle_ttl=60, current=current)
+    admission = AdmissionController(max_concurrent=2, max_queue=2, timeout=5)
+    return AgentRunner(SessionLifecycle(pool, sessions), admission, budget)
+
+
+async def _turn(runner: AgentRunner, message: str, versions: list | None = None):
+    on_options = versions.append if versions is not None else None
+    frames = [f async for f in runner.stream(message, "s", None, on_options)]
+    assert not any(sse.is_type(f, "error") for f in frames)
+    return frames
+
+
+async def test_runs_are_reported_under_the_options_of_their_client(resume, queries):
+    runner = _runner(current=None)
+    try:
+        await _turn(runner, "first")
+        # Degrade while the session holds a client connected at full.
+        assert (await budget.refresh(1.0)).name == "economy"
+        versions = []
+        await _turn(runner, "second", versions)
+        assert [v.profile.name for v in versions] == ["full"]
+        assert is_cacheable(versions[0])
+    finally:
+        await runner.close()
+
+
+async def test_stale_session_client_is_replaced_with_context(resume, queries):
+    runner = _runner()
+    try:
+        await _turn(runner, "what does he work on")
+        resume.write_text("Works on agents and test generation.\n")
+        system_prompt.reload_prompt()
+
+        versions = []
+        await _turn(runner, "tell me more", versions)
+        (first, _), (second, prompt) = queries
+        assert second is not first
+        assert runner.lifecycle.sessions.reconnects == 1
+        assert prompt.startswith("Earlier turns of this conversation:")
+        assert "User: what does he work on" in prompt
+        assert prompt.endswith("Current message:\n\ntell me more")
+        assert versions[0].prompt_version == system_prompt.get_prompt_version()
+
+        # The replacement client is current: no further reconnect or replay.
+        await _turn(runner, "thanks")
+        assert queries[-1] == (second, "thanks")
+    finally:
+        await runner.close()
+
+
+async def test_degraded_or_outdated_answers_are_not_cacheable(resume, queries):
+    runner = _runner()
+    try:
+        versions = []
+        await _turn(runner, "first", versions)
+        full = versions[0]
+        assert is_cacheable(full)
+
+        await budget.refresh(1.0)
+        await _turn(runner, "second", versions)
+        assert versions[1].profile.name == "economy"
+        assert not is_cacheable(versions[1])
+
+        resume.write_text("Something else.\n")
+        system_prompt.reload_prompt()
+        assert not is_cacheable(full)
+    finally:
+        await runner.close()
+
+
+@pytest.mark.parametrize(
+    "name, lifecycle",
+    [
+        ("per_request", PerRequestLifecycle),
+        ("pooled", PooledLifecycle),
+        ("session", SessionLifecycle),
+        ("unknown", SessionLifecycle),
+    ],
+)
+def test_create_lifecycle(name, lifecycle):
+    assert type(create_lifecycle(name)) is lifecycle
+
+
+@pytest.mark.parametrize("size", [0, 1])
+async def test_one_shot_turns_release_their_client(resume, queries, size):
+    pool = ClientPool(get_agent_options, size=size)
+    lifecycle = PooledLifecycle(pool)
+    admission = AdmissionController(max_concurrent=2, max_queue=2, timeout=5)
+    runner = AgentRunner(lifecycle, admission, budget)
+    await runner.start()
+    try:
+        frames = await _turn(runner, "first")
+        assert sse.text_content(sse.batch(frames))
+        assert frames[-1] == sse.DONE
+        await _turn(runner, "second")
+        # No conversation is kept between one-shot turns.
+        (first, _), (second, prompt) = queries
+        assert second is not first and prompt == "second"
+        assert not runner.has_history("s")
+        assert admission.stats()["active"] == 0
+    finally:
+        await runner.close()
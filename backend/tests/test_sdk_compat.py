@@ -0,0 +1,35 @@
+import logging
+
+import claude_agent_sdk
+
+from app.agent import sdk_compat
+
+
+def test_installed_sdk_exposes_the_cli_subprocess(caplog):
+    # Fails when an SDK upgrade moves the private attributes.
+    assert sdk_compat.check()
+    assert not caplog.records
+
+
+def test_missing_attributes_are_reported(monkeypatch, caplog):
+    class Client:
+        def __init__(self, options=None) -> None:
+            pass
+
+    monkeypatch.setattr(claude_agent_sdk, "ClaudeSDKClient", Client)
+    with caplog.at_level(logging.ERROR):
+        assert not sdk_compat.check()
+    assert "Cannot reach the agent CLI subprocess" in caplog.text
+
+
+def test_client_pid_without_a_process():
+    assert sdk_compat.client_pid(object()) is None
+    assert sdk_compat.client_pid(type("C", (), {"_transport": None})()) is None
+
+
+def test_client_pid():
+    process = type("P", (), {"pid": 1234})()
+    transport = type("T", (), {"_process": process})()
+    client = type("C", (), {"_transport": transport})()
+    assert sdk_compat.client_process(client) is process
+    assert sdk_compat.client_pid(client) == 1234
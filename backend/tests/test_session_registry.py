@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from app.services.session_registry import Affinity, SessionRegistry, worker_alive
+from app.shared_state import MemoryState, RedisState, SharedState
+
+pytestmark = pytest.mark.anyio
+
+TTL = 300
+
+
+class Worker(SessionRegistry):
+    """A registry that claims sessions as a given worker."""
+
+    def __init__(self, state: SharedState, worker_id: str) -> None:
+        super().__init__(state, TTL)
+        self._worker_id = worker_id
+
+    @property
+    def worker_id(self) -> str:
+        return self._worker_id
+
+
+@pytest.fixture(params=["memory", "redis"])
+async def state(request, resp_server):
+    if request.param == "memory":
+        state = MemoryState()
+    else:
+        state = RedisState(resp_server.url)
+    yield state
+    await state.close()
+
+
+async def test_first_turn_claims_the_session(state, clock):
+    one = Worker(state, "machine-a/100")
+    assert await one.locate("s") == Affinity("machine-a/100")
+    # Later turns on the owner stay local.
+    assert await one.locate("s") == Affinity("machine-a/100")
+
+
+async def test_other_workers_see_the_owner(state, clock):
+    one, two = Worker(state, "machine-a/100"), Worker(state, "machine-b/200")
+    await one.locate("s")
+    affinity = await two.locate("s")
+    assert affinity == Affinity("machine-a/100", moved=True)
+    assert affinity.instance == "machine-a"
+    assert affinity.pid == 100
+    # Locating does not steal the session.
+    assert (await one.locate("s")).moved is False
+
+
+async def test_take_over(state, clock):
+    one, two = Worker(state, "machine-a/100"), Worker(state, "machine-b/200")
+    await one.locate("s")
+    await two.take_over("s")
+    assert await two.locate("s") == Affinity("machine-b/200")
+    assert (await one.locate("s")).owner == "machine-b/200"
+
+
+async def test_ownership_expires_after_the_ttl(state, clock):
+    one, two = Worker(state, "machine-a/100"), Worker(state, "machine-b/200")
+    await one.locate("s")
+    clock.advance(TTL - 1)
+    # Every turn renews the claim.
+    assert (await one.locate("s")).moved is False
+    clock.advance(TTL - 1)
+    assert (await two.locate("s")).moved is True
+    clock.advance(TTL)
+    assert await two.locate("s") == Affinity("machine-b/200")
+
+
+async def test_fails_open_without_shared_state(resp_server, clock):
+    url = resp_server.url
+    await resp_server.close()
+    state = RedisState(url)
+    try:
+        worker = Worker(state, "machine-a/100")
+        assert await worker.locate("s") == Affinity("machine-a/100")
+        await worker.take_over("s")
+    finally:
+        await state.close()
+
+
+def test_worker_alive():
+    assert worker_alive(os.getpid())
+    assert not worker_alive(None)
+    assert Affinity("host/not-a-pid").pid is None
+    # PIDs are below pid_max (at most 2**22 on Linux).
+    assert not worker_alive(2**22 + 1)
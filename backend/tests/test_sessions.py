@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from app.agent import sessions
+from app.agent.pool import ClientPool
+from app.agent.sessions import SessionManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manager(fake_sdk):
+    manager = SessionManager(ClientPool(lambda: None, size=0), 1, idle_ttl=60)
+    yield manager
+    await manager.close()
+
+
+async def _turn(manager: SessionManager, session_id: str):
+    async with manager.checkout(session_id) as lease:
+        return lease
+
+
+async def test_recorded_turns_do_not_evict_live_sessions(manager):
+    first = await _turn(manager, "a")
+    manager.record("b", "hello", "Hi!")
+
+    assert len(manager) == 1
+    assert not manager.evictions
+    assert manager.has_history("b")
+    # "a" keeps its client.
+    assert (await _turn(manager, "a")).client is first.client
+
+
+async def test_recorded_turns_are_sent_with_the_next_agent_turn(manager):
+    manager.record("b", "hello", "Hi!")
+    manager.record("b", "who are you", "An assistant.")
+    lease = await _turn(manager, "b")
+    assert lease.history == [("hello", "Hi!"), ("who are you", "An assistant.")]
+    # Only once.
+    assert (await _turn(manager, "b")).history == []
+    assert manager.has_history("b")
+
+
+async def test_recorded_turns_are_kept_if_the_turn_fails(manager):
+    manager.record("b", "hello", "Hi!")
+    with pytest.raises(RuntimeError):
+        async with manager.checkout("b"):
+            raise RuntimeError("agent failed")
+    assert (await _turn(manager, "b")).history == [("hello", "Hi!")]
+
+
+async def test_recorded_sessions_are_bounded(manager, monkeypatch):
+    monkeypatch.setattr(sessions, "_MAX_UNSEEN", 2)
+    for session_id in ("a", "b", "c"):
+        manager.record(session_id, "hello", "Hi!")
+    assert not manager.has_history("a")
+    assert manager.has_history("b") and manager.has_history("c")
+
+
+async def test_memory_pressure_evictions(fake_sdk, monkeypatch):
+    reads = []
+
+    def available_memory_mb() -> float:
+        reads.append(1)
+        return 50.0
+
+    monkeypatch.setattr(sessions, "_available_memory_mb", available_memory_mb)
+    manager = SessionManager(
+        ClientPool(lambda: None, size=0), 4, idle_ttl=60, min_available_mb=100
+    )
+    try:
+        for session_id in ("a", "b", "c"):
+            await _turn(manager, session_id)
+        # Each new session pushes out one idle session to free memory.
+        assert len(manager) == 1
+        assert manager.evictions == {"memory": 2}
+        # /proc/meminfo is read once per _MEMINFO_INTERVAL, not per session.
+        assert len(reads) == 1
+    finally:
+        await manager.close()
+
+
+async def test_least_recently_used_session_is_evicted(fake_sdk):
+    manager = SessionManager(ClientPool(lambda: None, size=0), 2, idle_ttl=60)
+    try:
+        a = await _turn(manager, "a")
+        await _turn(manager, "b")
+        await _turn(manager, "a")
+        await _turn(manager, "c")
+        assert manager.evictions == {"lru": 1}
+        assert manager.has_history("a") and manager.has_history("c")
+        assert not manager.has_history("b")
+        assert (await _turn(manager, "a")).client is a.client
+    finally:
+        await manager.close()
+
+
+async def test_busy_sessions_are_not_evicted(manager):
+    async with manager.checkout("a") as a:
+        await _turn(manager, "b")
+        # Over the cap, but "a" is mid-turn.
+        assert len(manager) == 2
+    assert not manager.evictions
+    assert (await _turn(manager, "a")).client is a.client
+
+
+async def test_idle_sessions_are_evicted(fake_sdk):
+    manager = SessionManager(ClientPool(lambda: None, size=0), 4, idle_ttl=0.05)
+    try:
+        old = await _turn(manager, "old")
+        await asyncio.sleep(0.1)
+        await _turn(manager, "new")
+        await manager.sweep()
+        assert manager.evictions == {"idle": 1}
+        assert not manager.has_history("old") and manager.has_history("new")
+        await manager.close()
+        assert not old.client._connected
+    finally:
+        await manager.close()
+
+
+async def test_failed_turn_drops_the_session(manager):
+    first = await _turn(manager, "a")
+    with pytest.raises(RuntimeError):
+        async with manager.checkout("a"):
+            raise RuntimeError("agent failed")
+    assert not manager.has_history("a")
+    assert (await _turn(manager, "a")).client is not first.client
+
+
+async def test_stale_clients_are_replaced(fake_sdk):
+    current = set()
+    manager = SessionManager(
+        ClientPool(lambda: None, size=0), 4, idle_ttl=60, current=current.__contains__
+    )
+    try:
+        async with manager.checkout("a") as lease:
+            current.add(lease.client)
+            lease.exchange = ("hello", "Hi!")
+        current.clear()  # e.g. the prompt version changed
+        lease = await _turn(manager, "a")
+        assert lease.history == [("hello", "Hi!")]
+        assert manager.reconnects == 1
+    finally:
+        await manager.close()
@@ -0,0 +1,128 @@
+import pytest
+
+from app.shared_state import MemoryState, RedisState, SqliteState, create_shared_state
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+async def state(request, tmp_path, resp_server):
+    if request.param == "memory":
+        state = MemoryState()
+    elif request.param == "sqlite":
+        state = SqliteState(str(tmp_path / "state.db"))
+    else:
+        state = RedisState(resp_server.url, prefix="test:")
+    yield state
+    await state.close()
+
+
+async def test_get_set_delete(state, clock):
+    assert await state.get("k") is None
+    await state.set("k", b"v")
+    assert await state.get("k") == b"v"
+    await state.set("k", b"w")
+    assert await state.get("k") == b"w"
+    await state.delete("k")
+    assert await state.get("k") is None
+
+
+async def test_set_expires(state, clock):
+    await state.set("k", b"v", ttl=10)
+    clock.advance(9)
+    assert await state.get("k") == b"v"
+    clock.advance(1)
+    assert await state.get("k") is None
+
+
+async def test_add_only_sets_missing_or_expired_keys(state, clock):
+    assert await state.add("k", b"first", ttl=10)
+    assert not await state.add("k", b"second", ttl=10)
+    assert await state.get("k") == b"first"
+    clock.advance(10)
+    assert await state.add("k", b"third")
+    assert await state.get("k") == b"third"
+
+
+async def test_incr(state, clock):
+    assert await state.incr("n") == 1
+    assert await state.incr("n", 5) == 6
+    assert await state.incr("n", -2) == 4
+    assert await state.get("n") == b"4"
+
+
+async def test_incr_ttl_and_restart_after_expiry(state, clock):
+    assert await state.incr("n", ttl=10) == 1
+    clock.advance(5)
+    # Without a ttl the expiry is kept...
+    assert await state.incr("n") == 2
+    clock.advance(5)
+    # ...so the counter starts over once it has passed.
+    assert await state.incr("n", ttl=10) == 1
+    clock.advance(5)
+    # A ttl resets it.
+    assert await state.incr("n", ttl=10) == 2
+    clock.advance(9)
+    assert await state.get("n") == b"2"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_purge_drops_only_expired_keys(backend, tmp_path, clock):
+    if backend == "memory":
+        state = MemoryState()
+    else:
+        state = SqliteState(str(tmp_path / "state.db"))
+    try:
+        await state.set("short", b"1", ttl=5)
+        await state.incr("counter", ttl=5)
+        await state.set("long", b"1", ttl=50)
+        await state.set("forever", b"1")
+        assert await state.purge() == 0
+        clock.advance(5)
+        assert await state.purge() == 2
+        assert await state.get("long") == b"1"
+        assert await state.get("forever") == b"1"
+    finally:
+        await state.close()
+
+
+async def test_sqlite_is_shared_between_connections(tmp_path, clock):
+    path = str(tmp_path / "shared" / "state.db")
+    first, second = SqliteState(path), SqliteState(path)
+    try:
+        await first.set("k", b"v", ttl=10)
+        assert await second.get("k") == b"v"
+        assert not await second.add("k", b"other")
+
+        assert await first.incr("n") == 1
+        assert await second.incr("n") == 2
+        assert await first.get("n") == b"2"
+
+        clock.advance(10)
+        assert await second.add("k", b"other")
+        assert await first.get("k") == b"other"
+        await second.delete("k")
+        assert await first.get("k") is None
+    finally:
+        await first.close()
+        await second.close()
+
+
+async def test_redis_uses_the_key_prefix(resp_server, clock):
+    state = RedisState(resp_server.url, prefix="app:")
+    try:
+        await state.set("k", b"v", ttl=10)
+        assert resp_server.value("app:k") == b"v"
+        assert resp_server.value("k") is None
+    finally:
+        await state.close()
+
+
+def test_create_shared_state(tmp_path):
+    assert isinstance(create_shared_state("memory://"), MemoryState)
+    assert isinstance(create_shared_state(""), MemoryState)
+    assert isinstance(create_shared_state("redis://localhost:6379/0"), RedisState)
+    sqlite = create_shared_state(f"sqlite:///{tmp_path}/state.db")
+    assert isinstance(sqlite, SqliteState)
+    with pytest.raises(ValueError):
+        create_shared_state("sqlite://")
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app.services import cancellation, sse
+from app.services.cancellation import stream_until_disconnect
+
+pytestmark = pytest.mark.anyio
+
+
+def test_event_framing():
+    frame = sse.encode({"type": "text", "content": "Zürich"})
+    assert frame == 'data: {"type":"text","content":"Zürich"}\n\n'.encode()
+    assert sse.encode({"type": "done"}, event_id="s1:3") == (
+        b'id: s1:3\ndata: {"type":"done"}\n\n'
+    )
+    assert sse.with_id(sse.DONE, 4) == sse.encode({"type": "done"}, event_id=4)
+    assert sse.queued(2) == b'data: {"type":"queued","position":2}\n\n'
+    assert sse.retry(1500) == b"retry: 1500\n\n"
+    assert sse.HEARTBEAT.startswith(b":") and sse.HEARTBEAT.endswith(b"\n\n")
+
+
+def test_every_frame_is_a_single_json_event():
+    for frame in (sse.text("a\nb"), sse.error("boom"), sse.queued(1), sse.DONE):
+        assert frame.count(b"\n\n") == 1 and frame.endswith(b"\n\n")
+        event = json.loads(frame.removeprefix(b"data: "))
+        assert next(iter(event)) == "type"
+
+
+def test_is_type():
+    assert sse.is_type(sse.text("hi"), "text")
+    assert sse.is_type(sse.error("boom"), "error")
+    assert sse.is_type(sse.DONE, "done")
+    assert not sse.is_type(sse.DONE, "text")
+    # Matches the whole type, not a prefix of it.
+    assert not sse.is_type(sse.encode({"type": "textual"}), "text")
+    assert sse.is_type(sse.encode({"type": "tool_use", "name": "x"}), "tool_use")
+
+
+def test_text_content_joins_only_text_events():
+    data = sse.batch(
+        [
+            sse.text("Hello"),
+            sse.encode({"type": "tool_use", "content": "ignored"}),
+            sse.with_id(sse.text(", world"), "s1:2"),
+            sse.DONE,
+        ]
+    )
+    assert sse.text_content(data) == "Hello, world"
+    assert sse.text_content(b"") == ""
+
+
+def _request(spec_version: str = "2.4") -> tuple[Request, asyncio.Event]:
+    """A request whose client disconnects once the returned event is set."""
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+    return Request(scope, receive), gone
+
+
+class _Producer:
+    """Frames from a test-controlled source; notes when it is cancelled."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.cancelled = asyncio.Event()
+
+    async def frames(self):
+        try:
+            while (frame := await self.queue.get()) is not None:
+                yield frame
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+async def _collect(stream) -> list[bytes]:
+    return [chunk async for chunk in stream]
+
+
+async def test_queued_frames_go_out_in_one_write():
+    async def frames():
+        for n in range(3):
+            yield sse.text(str(n))
+        yield sse.DONE
+
+    request, _ = _request()
+    chunks = await _collect(
+        stream_until_disconnect(request, frames(), preamble=sse.retry(1000))
+    )
+    assert chunks == [
+        sse.batch([sse.retry(1000), sse.text("0"), sse.text("1"), sse.text("2")])
+        + sse.DONE
+    ]
+
+
+async def test_heartbeat_while_idle():
+    producer = _Producer()
+    request, _ = _request()
+    stream = stream_until_disconnect(request, producer.frames(), heartbeat=0.01)
+    assert await anext(stream) == sse.HEARTBEAT
+    producer.queue.put_nowait(sse.DONE)
+    producer.queue.put_nowait(None)
+    assert await _collect(stream) == [sse.DONE]
+    assert not producer.cancelled.is_set()
+
+
+async def test_failed_producer_ends_the_stream():
+    async def frames():
+        yield sse.text("partial")
+        raise RuntimeError("boom")
+
+    request, _ = _request()
+    chunks = await _collect(stream_until_disconnect(request, frames()))
+    assert b"".join(chunks) == sse.text("partial")
+
+
+def _disconnects() -> float:
+    return cancellation._CANCELLATIONS._values.get(("disconnect",), 0.0)
+
+
+async def test_disconnect_cancels_the_producer():
+    producer = _Producer()
+    request, gone = _request("2.4")
+    before = _disconnects()
+    stream = stream_until_disconnect(request, producer.frames())
+    producer.queue.put_nowait(sse.text("hi"))
+    assert await anext(stream) == sse.text("hi")
+
+    gone.set()
+    assert await _collect(stream) == []
+    await asyncio.wait_for(producer.cancelled.wait(), 1)
+    assert _disconnects() == before + 1
+
+
+async def test_closing_the_stream_cancels_the_producer():
+    # Servers on ASGI < 2.4 close the response generator themselves.
+    producer = _Producer()
+    request, _ = _request("2.3")
+    stream = stream_until_disconnect(request, producer.frames())
+    producer.queue.put_nowait(sse.text("hi"))
+    assert await anext(stream) == sse.text("hi")
+
+    await stream.aclose()
+    await asyncio.wait_for(producer.cancelled.wait(), 1)
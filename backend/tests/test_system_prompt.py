@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from app.agent import system_prompt
+from app.agent.system_prompt import build_snapshot, get_prompt_snapshot
+
+RESUME = "# Dingkang Wang\n\n## Experience\n\nWorks on agents at Tesla.\n"
+
+
+@pytest.fixture
+def resume(tmp_path, monkeypatch):
+    """A resume.md of the test's own, re-stat'ed on every lookup."""
+    path = tmp_path / "resume.md"
+    path.write_text(RESUME)
+    monkeypatch.setattr(system_prompt, "_RESUME_PATH", path)
+    monkeypatch.setattr(system_prompt, "PROMPT_RECHECK_INTERVAL", 0)
+    monkeypatch.setattr(system_prompt, "_snapshot", None)
+    monkeypatch.setattr(system_prompt, "_slim_snapshot", None)
+    monkeypatch.setattr(system_prompt, "_listeners", [])
+    return path
+
+
+def _rewrite(path, text: str) -> None:
+    """Rewrite ``path`` with a modification time the prompt has not seen."""
+    mtime = os.stat(path).st_mtime_ns
+    path.write_text(text)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def _names(snapshot) -> list[str]:
+    return [section.name for section in snapshot.sections]
+
+
+def test_resume_replaces_the_builtin_profile(resume):
+    snapshot = build_snapshot(slim=False)
+    assert _names(snapshot) == ["role", "behavior", "background"]
+    assert "Works on agents at Tesla." in snapshot.text
+    assert "## About Dingkang Wang" not in snapshot.text
+
+
+def test_profile_stands_in_for_a_missing_resume(resume):
+    resume.unlink()
+    snapshot = build_snapshot(slim=False)
+    assert _names(snapshot) == ["role", "behavior", "profile"]
+    assert snapshot.text.count("## About Dingkang Wang") == 1
+
+
+def test_slim_prompt_leaves_the_resume_out(resume):
+    snapshot = build_snapshot(slim=True)
+    assert _names(snapshot) == ["role", "behavior", "profile", "slim_note"]
+    assert "Works on agents at Tesla." not in snapshot.text
+    assert all(section.static for section in snapshot.sections)
+
+
+def test_sections_appear_once_in_order(resume):
+    for slim in (False, True):
+        snapshot = build_snapshot(slim=slim)
+        assert len(set(_names(snapshot))) == len(snapshot.sections)
+        assert snapshot.text == "\n\n".join(s.text for s in snapshot.sections) + "\n"
+
+
+def test_static_prefix_survives_resume_edits(resume):
+    before = build_snapshot(slim=False)
+    slim = build_snapshot(slim=True)
+    _rewrite(resume, RESUME + "\n## Hobbies\n\nSailing.\n")
+    after = build_snapshot(slim=False)
+
+    assert after.version != before.version
+    assert after.static_tokens == before.static_tokens > 0
+    static = "\n\n".join(s.text for s in before.sections if s.static)
+    assert before.text.startswith(static) and after.text.startswith(static)
+    # The slim prompt does not depend on data/ at all.
+    assert build_snapshot(slim=True).text == slim.text
+
+
+def test_version_depends_only_on_the_normalized_text(resume):
+    clean = build_snapshot(slim=False)
+    _rewrite(resume, RESUME.replace("\n", "   \r\n") + "\n\n\n")
+    noisy = build_snapshot(slim=False)
+    assert noisy.text == clean.text
+    assert noisy.version == clean.version
+    assert noisy.resume_mtime_ns != clean.resume_mtime_ns
+
+
+def test_edit_reloads_the_prompt_and_notifies_listeners(resume):
+    changes = []
+    system_prompt.add_reload_listener(changes.append)
+    first = get_prompt_snapshot()
+    assert get_prompt_snapshot() is first
+
+    # Touched without a change in content: rebuilt, but nobody is told.
+    _rewrite(resume, RESUME)
+    assert get_prompt_snapshot().version == first.version
+    assert changes == []
+
+    _rewrite(resume, RESUME + "\nNow at a new team.\n")
+    changed = get_prompt_snapshot()
+    assert changed.version != first.version
+    assert changes == [changed]
+
+
+def test_prompt_is_not_restated_within_the_interval(resume, monkeypatch):
+    monkeypatch.setattr(system_prompt, "PROMPT_RECHECK_INTERVAL", 3600)
+    first = get_prompt_snapshot()
+    _rewrite(resume, RESUME + "\nNow at a new team.\n")
+    assert get_prompt_snapshot() is first
+    assert system_prompt.reload_prompt().version != first.version
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from app import tracing
+
+TRACEPARENT = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    exporter = tracing.JsonLinesExporter(str(tmp_path / "spans.jsonl"))
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    yield exporter
+    exporter.close()
+
+
+def _spans(tmp_path) -> list[dict]:
+    lines = (tmp_path / "spans.jsonl").read_text().splitlines()
+    return [json.loads(line) for line in lines]
+
+
+def test_client_traceparent_does_not_force_sampling(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    assert not tracing.start_trace("chat", TRACEPARENT)
+
+
+def test_trusted_traceparent_joins_the_callers_trace(exporter, tmp_path):
+    root = tracing.start_trace("chat", TRACEPARENT, trust_parent=True)
+    with tracing.span("agent.run"):
+        pass
+    root.end()
+    exporter.close()
+
+    child, parent = _spans(tmp_path)
+    assert parent["trace_id"] == "a" * 32
+    assert parent["parent_span_id"] == "b" * 16
+    assert child["parent_span_id"] == parent["span_id"]
+    assert exporter.exported == 2
+
+
+def test_exporter_drops_spans_when_the_queue_is_full(tmp_path, monkeypatch):
+    exporter = tracing.JsonLinesExporter(str(tmp_path / "spans.jsonl"), queue_size=1)
+    # No writer thread, so nothing drains the queue.
+    monkeypatch.setattr(exporter, "_start", lambda: None)
+    for _ in range(3):
+        exporter.export(tracing.Span("span", "a" * 32))
+    assert exporter.dropped == 2
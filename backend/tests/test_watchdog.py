@@ -0,0 +1,194 @@
+import os
+
+import pytest
+
+from app.agent import watchdog as watchdog_module
+from app.agent.watchdog import ProcessWatchdog, list_children
+
+TICKS = os.sysconf("SC_CLK_TCK")
+PAGE = os.sysconf("SC_PAGE_SIZE")
+UPTIME = 10_000.0
+
+
+class FakeProc:
+    """A /proc of the test's own, with children of this process."""
+
+    def __init__(self, root) -> None:
+        self.root = root
+        (root / "self").mkdir()
+        (root / "uptime").write_text(f"{UPTIME} 1234.5\n")
+
+    def add(
+        self,
+        pid: int,
+        state: str = "S",
+        rss_mb: float = 100,
+        cpu_seconds: float = 1,
+        age: float = 10,
+        ppid: int | None = None,
+        comm: str = "claude",
+    ) -> None:
+        fields = ["0"] * 30
+        fields[0] = state
+        fields[1] = str(os.getpid() if ppid is None else ppid)
+        fields[11] = str(int(cpu_seconds * TICKS))  # utime; stime stays 0
+        fields[19] = str(int((UPTIME - age) * TICKS))  # starttime
+        fields[21] = str(int(rss_mb * 1048576 / PAGE))
+        (self.root / str(pid)).mkdir()
+        (self.root / str(pid) / "stat").write_text(
+            f"{pid} ({comm}) {' '.join(fields)}\n"
+        )
+
+
+class Client:
+    """Stands in for a ClaudeSDKClient whose CLI child has ``pid``."""
+
+    def __init__(self, pid: int) -> None:
+        self._transport = type("Transport", (), {})()
+        self._transport._process = type("Process", (), {"pid": pid})()
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    monkeypatch.setattr(watchdog_module, "_PROC", str(tmp_path))
+    return FakeProc(tmp_path)
+
+
+@pytest.fixture
+def kills(monkeypatch):
+    killed: list[int] = []
+
+    def kill(pid, sig):
+        killed.append(pid)
+
+    monkeypatch.setattr(os, "kill", kill)
+    return killed
+
+
+def _watchdog(**limits) -> ProcessWatchdog:
+    return ProcessWatchdog(interval=1, exit_grace=10, **limits)
+
+
+def test_stat_parsing(proc):
+    proc.add(101, rss_mb=256, cpu_seconds=12, age=300, comm="claude (cli) x")
+    proc.add(102, state="Z")
+    proc.add(103, ppid=1)  # not ours
+    (proc.root / "104").mkdir()  # exited while listed
+    (proc.root / "105").mkdir()
+    (proc.root / "105" / "stat").write_text("105 (truncated) S")
+
+    children = sorted(list_children(), key=lambda c: c.pid)
+    assert [c.pid for c in children] == [101, 102]
+    child = children[0]
+    assert child.state == "S"
+    assert child.rss_mb == pytest.approx(256, abs=PAGE / 1048576)
+    assert child.cpu_seconds == pytest.approx(12, abs=1 / TICKS)
+    assert child.age == pytest.approx(300, abs=1 / TICKS)
+    assert children[1].state == "Z"
+
+
+def test_enabled_only_with_proc(proc, monkeypatch):
+    assert _watchdog().enabled
+    assert not ProcessWatchdog(interval=0).enabled
+    monkeypatch.setattr(watchdog_module, "_PROC", str(proc.root / "missing"))
+    assert not _watchdog().enabled
+
+
+@pytest.mark.parametrize(
+    ("usage", "reason"),
+    [
+        ({"rss_mb": 600}, "rss"),
+        ({"cpu_seconds": 120}, "cpu"),
+        ({"age": 4000}, "age"),
+    ],
+)
+def test_child_over_a_limit_is_killed(proc, kills, usage, reason):
+    watchdog = _watchdog(max_rss_mb=500, max_cpu_seconds=60, max_age=3600)
+    # Clients are tracked weakly, so hold on to them.
+    clients = [Client(101), Client(102)]
+    for client in clients:
+        watchdog.track(client)
+    proc.add(101, **usage)
+    proc.add(102, rss_mb=400, cpu_seconds=50, age=3000)
+    watchdog.sweep()
+    assert kills == [101]
+    assert watchdog.killed == {reason: 1}
+
+
+def test_disabled_limits_are_not_enforced(proc, kills):
+    watchdog = _watchdog()
+    client = Client(101)
+    watchdog.track(client)
+    proc.add(101, rss_mb=10_000, cpu_seconds=10_000, age=100_000)
+    watchdog.sweep()
+    assert kills == []
+
+
+def test_untracked_child_is_killed_after_a_grace_period(proc, kills):
+    watchdog = _watchdog()
+    proc.add(101, age=5)  # still connecting
+    proc.add(102, age=120)
+    watchdog.sweep()
+    assert kills == [102]
+    assert watchdog.killed == {"leaked": 1}
+
+
+def test_released_client_gets_time_to_exit(proc, kills, monotonic):
+    watchdog = _watchdog()
+    client = Client(101)
+    watchdog.track(client)
+    proc.add(101, age=300)
+    watchdog.sweep()
+    watchdog.release(client)
+
+    monotonic.advance(9)
+    watchdog.sweep()
+    assert kills == []
+    assert watchdog.stats()["exiting"] == 1
+    monotonic.advance(1)
+    watchdog.sweep()
+    assert kills == [101]
+    assert watchdog.stats()["exiting"] == 0
+
+
+def test_without_client_pids_only_limits_are_enforced(proc, kills):
+    watchdog = _watchdog(max_rss_mb=500)
+    watchdog.tracks_clients = False
+    proc.add(101, age=120)
+    proc.add(102, age=120, rss_mb=600)
+    watchdog.sweep()
+    assert kills == [102]
+    assert watchdog.killed == {"rss": 1}
+
+
+def test_vanished_child_is_not_counted(proc, monkeypatch):
+    def kill(pid, sig):
+        raise ProcessLookupError(pid)
+
+    monkeypatch.setattr(os, "kill", kill)
+    watchdog = _watchdog()
+    proc.add(101, age=120)
+    watchdog.sweep()
+    assert watchdog.killed == {}
+
+
+def test_zombie_is_reaped_one_sweep_later(proc, kills, monkeypatch):
+    waited = []
+
+    def waitpid(pid, options):
+        waited.append(pid)
+        return pid, 0
+
+    monkeypatch.setattr(os, "waitpid", waitpid)
+    watchdog = _watchdog()
+    proc.add(101, state="Z", age=120)
+    proc.add(102, age=5)
+    watchdog.sweep()
+    assert waited == []
+    assert watchdog.stats()["zombies"] == 1
+    assert watchdog.stats()["children"] == 1
+
+    watchdog.sweep()
+    assert waited == [101]
+    assert watchdog.reaped == 1
+    assert kills == []
@@ -5,6 +5,7 @@ import { ArrowLeft } from "lucide-react";
 import Link from "next/link";
 import ChatMessage from "@/components/ChatMessage";
 import ChatInput from "@/components/ChatInput";
+import { streamChat } from "@/lib/chatStream";
 
 interface Message {
   role: "user" | "assistant";
@@ -44,61 +45,28 @@ export default function ChatPage() {
     try {
       const apiUrl =
         process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
-      const response = await fetch(`${apiUrl}/api/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          message: content,
-          session_id: sessionId,
-        }),
-      });
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-
-      const reader = response.body?.getReader();
-      if (!reader) throw new Error("No response body");
-
-      const decoder = new TextDecoder();
-      let buffer = "";
-
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const events = buffer.split("\n\n");
-        buffer = events.pop() || "";
-
-        for (const event of events) {
-          const lines = event.split("\n");
-          for (const line of lines) {
-            if (line.startsWith("data: ")) {
-              try {
-                const data = JSON.parse(line.slice(6));
-                if (data.type === "text" && data.content) {
-                  setMessages((prev) => {
-                    const updated = [...prev];
-                    const lastMsg = updated[updated.length - 1];
-                    if (lastMsg.role === "assistant") {
-                      updated[updated.length - 1] = {
-                        ...lastMsg,
-                        content: lastMsg.content + data.content,
-                      };
-                    }
-                    return updated;
-                  });
-                } else if (data.type === "done") {
-                  setIsStreaming(false);
-                }
-              } catch {
-                // Skip malformed JSON
+      await streamChat(
+        apiUrl,
+        { message: content, session_id: sessionId },
+        (data) => {
+          if (data.type === "text" && data.content) {
+            const text = data.content;
+            setMessages((prev) => {
+              const updated = [...prev];
+              const lastMsg = updated[updated.length - 1];
+              if (lastMsg.role === "assistant") {
+                updated[updated.length - 1] = {
+                  ...lastMsg,
+                  content: lastMsg.content + text,
+                };
               }
-            }
+              return updated;
+            });
+          } else if (data.type === "done") {
+            setIsStreaming(false);
           }
         }
-      }
+      );
     } catch (error) {
       console.error("Chat error:", error);
       setMessages((prev) => {
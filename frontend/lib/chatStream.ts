@@ -0,0 +1,98 @@
+export interface ChatEvent {
+  type: string;
+  content?: string;
+  position?: number;
+}
+
+interface ChatRequest {
+  message: string;
+  session_id: string;
+}
+
+class HttpError extends Error {}
+
+const MAX_RESUMES = 3;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * POST a chat message and feed the SSE events to `onEvent`.
+ *
+ * Every agent run has a stream id (X-Stream-Id, and the prefix of each
+ * `id:` field). If the connection drops before the `done` event, the
+ * stream is resumed from the last event received instead of re-posting
+ * the message, which would start a second agent run.
+ */
+export async function streamChat(
+  apiUrl: string,
+  body: ChatRequest,
+  onEvent: (event: ChatEvent) => void
+): Promise<void> {
+  let streamId: string | null = null;
+  let lastEventId: string | null = null;
+  let finished = false;
+
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const response =
+        streamId === null
+          ? await fetch(`${apiUrl}/api/chat`, {
+              method: "POST",
+              headers: { "Content-Type": "application/json" },
+              body: JSON.stringify(body),
+            })
+          : await fetch(`${apiUrl}/api/chat/stream/${streamId}`, {
+              headers: lastEventId ? { "Last-Event-ID": lastEventId } : {},
+            });
+
+      if (!response.ok) {
+        throw new HttpError(`HTTP error! status: ${response.status}`);
+      }
+      streamId = response.headers.get("X-Stream-Id") ?? streamId;
+
+      const reader = response.body?.getReader();
+      if (!reader) throw new HttpError("No response body");
+
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() || "";
+
+        for (const event of events) {
+          for (const line of event.split("\n")) {
+            if (line.startsWith("id: ")) {
+              lastEventId = line.slice(4);
+              streamId = lastEventId.slice(0, lastEventId.lastIndexOf("."));
+            } else if (line.startsWith("data: ")) {
+              try {
+                const data: ChatEvent = JSON.parse(line.slice(6));
+                if (data.type === "done") finished = true;
+                onEvent(data);
+              } catch {
+                // Skip malformed JSON
+              }
+            }
+          }
+        }
+      }
+      if (finished || streamId === null) return;
+      throw new Error("Stream ended before the response was complete");
+    } catch (error) {
+      // Only a stream the server knows about can be resumed.
+      if (
+        error instanceof HttpError ||
+        streamId === null ||
+        attempt >= MAX_RESUMES
+      ) {
+        throw error;
+      }
+      await sleep(1000 * (attempt + 1));
+    }
+  }
+}